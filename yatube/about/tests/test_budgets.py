@@ -0,0 +1,28 @@
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from about import urls
+from core.budgets import Budget, url_names
+
+# Бюджеты страниц: SQL-запросов, мс на SQL, мс на отрисовку.
+BUDGETS = {
+    'about:author': (0, 50, 300),
+    'about:tech': (0, 50, 300),
+}
+
+
+class AboutBudgetTests(TestCase):
+    """Статические страницы не ходят в базу."""
+
+    def test_every_url_has_budget(self):
+        """Для каждого адреса about.urls объявлен бюджет."""
+        self.assertEqual(set(BUDGETS), url_names(urls))
+
+    def test_pages_fit_budgets(self):
+        """Страницы не выходят за бюджет запросов и времени."""
+        client = Client()
+        for name, budget in BUDGETS.items():
+            with self.subTest(view=name):
+                with Budget(name, *budget):
+                    response = client.get(reverse(name))
+                self.assertLess(response.status_code, 400)
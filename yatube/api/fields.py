@@ -0,0 +1,114 @@
+"""Поля ресурсов API и выбор полей параметром fields=.
+
+Поле описывается колонками для only(), связями для select_related
+и функцией, достающей значение из объекта. Запрос с fields=id,text
+читает из базы только эти колонки и не присоединяет таблицы
+ненужных вложенных объектов.
+"""
+from collections import namedtuple
+
+Field = namedtuple('Field', 'columns related value')
+
+
+def column(name, convert=None):
+    def value(obj):
+        result = getattr(obj, name)
+        return convert(result) if convert and result is not None else result
+    return Field((name,), (), value)
+
+
+def isoformat(date):
+    return date.isoformat()
+
+
+def embedded_user(name):
+    return Field(
+        (name, f'{name}__id', f'{name}__username'),
+        (name,),
+        lambda obj: {'id': getattr(obj, name).id,
+                     'username': getattr(obj, name).username},
+    )
+
+
+def group_as_dict(group):
+    if group is None:
+        return None
+    return {'id': group.id, 'slug': group.slug, 'title': group.title}
+
+
+def post_image(post):
+    if not post.image:
+        return None
+    return {'url': post.image.url, 'renditions': post.renditions}
+
+
+POST_FIELDS = {
+    'id': column('id'),
+    'text': column('text'),
+    'pub_date': column('pub_date', isoformat),
+    'author': embedded_user('author'),
+    'group': Field(('group', 'group__id', 'group__slug', 'group__title'),
+                   ('group',), lambda post: group_as_dict(post.group)),
+    'image': Field(('image', 'thumbnails'), (), post_image),
+    'comments_count': column('comments_count'),
+    'version': column('version'),
+}
+# Нужны всегда: по ним строятся курсор и ETag.
+POST_REQUIRED = ('id', 'pub_date', 'version', 'comments_count')
+
+COMMENT_FIELDS = {
+    'id': column('id'),
+    'post': column('post_id'),
+    'text': column('text'),
+    'created': column('created', isoformat),
+    'author': embedded_user('author'),
+}
+COMMENT_REQUIRED = ('id', 'post', 'created')
+
+GROUP_FIELDS = {
+    'id': column('id'),
+    'slug': column('slug'),
+    'title': column('title'),
+    'description': column('description'),
+}
+GROUP_REQUIRED = ('id',)
+
+FOLLOW_FIELDS = {
+    'id': column('id'),
+    'author': embedded_user('author'),
+}
+FOLLOW_REQUIRED = ('id',)
+
+
+class FieldsError(ValueError):
+    pass
+
+
+def parse_fields(value, available):
+    """Имена полей из параметра fields=; пустой параметр - все поля."""
+    if not value:
+        return list(available)
+    names = [name.strip() for name in value.split(',') if name.strip()]
+    unknown = [name for name in names if name not in available]
+    if unknown:
+        raise FieldsError(
+            f'Неизвестные поля: {", ".join(unknown)}. '
+            f'Доступны: {", ".join(available)}'
+        )
+    return names
+
+
+def narrow(queryset, available, names, required=()):
+    """queryset, читающий только колонки выбранных и обязательных полей
+    и присоединяющий только выбранные вложенные объекты."""
+    columns, related = [], []
+    for name in (*required, *names):
+        columns.extend(available[name].columns)
+        related.extend(available[name].related)
+    if related:
+        queryset = queryset.select_related(*dict.fromkeys(related))
+    return queryset.only(*dict.fromkeys(columns))
+
+
+def as_dict(obj, available, names):
+    return {name: available[name].value(obj) for name in names}
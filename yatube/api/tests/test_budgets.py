@@ -0,0 +1,81 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from api import urls
+from core.budgets import Budget, url_names
+from posts.models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+# Бюджеты адресов API: SQL-запросов, мс на SQL, мс на отрисовку.
+BUDGETS = {
+    'api:root': (0, 50, None),
+    'api:posts': (1, 100, None),
+    'api:post_detail': (1, 50, None),
+    'api:post_comments': (2, 50, None),
+    'api:groups': (1, 50, None),
+    'api:group_detail': (1, 50, None),
+    'api:follows': (3, 50, None),
+    'api:follow_detail': (10, 100, None),
+}
+
+
+class ApiBudgetTests(TestCase):
+    """Каждый адрес API укладывается в свой бюджет."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.author = User.objects.create_user(username='author')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание'
+        )
+        for number in range(25):
+            post = Post.objects.create(
+                text=f'Тестовое сообщение {number}',
+                author=cls.author,
+                group=cls.group,
+            )
+            Comment.objects.create(text=f'Комментарий {number}', post=post,
+                                   author=cls.user)
+        cls.post = post
+        Follow.objects.create(user=cls.user, author=cls.author)
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.user)
+        cache.clear()
+
+    def get_requests(self):
+        return {
+            'api:root': ('get', reverse('api:root')),
+            'api:posts': ('get', reverse('api:posts')),
+            'api:post_detail': (
+                'get', reverse('api:post_detail', args=[self.post.id])),
+            'api:post_comments': (
+                'get', reverse('api:post_comments', args=[self.post.id])),
+            'api:groups': ('get', reverse('api:groups')),
+            'api:group_detail': (
+                'get', reverse('api:group_detail', args=[self.group.slug])),
+            'api:follows': ('get', reverse('api:follows')),
+            'api:follow_detail': (
+                'delete', reverse('api:follow_detail', args=['author'])),
+        }
+
+    def test_every_url_has_budget(self):
+        """Для каждого адреса api.urls объявлен бюджет."""
+        self.assertEqual(set(BUDGETS), url_names(urls))
+
+    def test_pages_fit_budgets(self):
+        """Адреса не выходят за бюджет запросов и времени."""
+        for name, (method, url) in self.get_requests().items():
+            with self.subTest(view=name):
+                cache.clear()
+                with Budget(name, *BUDGETS[name]):
+                    response = getattr(self.client, method)(url)
+                self.assertLess(response.status_code, 400)
@@ -0,0 +1,169 @@
+import json
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+class ApiTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.author = User.objects.create_user(username='author')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание'
+        )
+        for number in range(25):
+            cls.post = Post.objects.create(
+                text=f'Тестовое сообщение {number}',
+                author=cls.author,
+                group=cls.group,
+            )
+        Comment.objects.create(text='Комментарий', post=cls.post,
+                               author=cls.user)
+
+    def setUp(self):
+        self.guest_client = Client()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+        self.author_client = Client()
+        self.author_client.force_login(self.author)
+        cache.clear()
+
+    def patch(self, client, data, **extra):
+        return client.patch(
+            reverse('api:post_detail', args=[self.post.id]),
+            json.dumps(data), content_type='application/json', **extra,
+        )
+
+    def test_posts_embed_author_and_group_in_one_query(self):
+        """Список постов со вложенными автором и группой - один запрос."""
+        with self.assertNumQueries(1):
+            response = self.guest_client.get(reverse('api:posts'))
+        first = response.json()['results'][0]
+        self.assertEqual(first['author']['username'], 'author')
+        self.assertEqual(first['group']['slug'], 'test-slug')
+
+    def test_fields_narrow_select(self):
+        """fields= сужает SELECT и не присоединяет лишние таблицы."""
+        with CaptureQueriesContext(connection) as queries:
+            response = self.guest_client.get(reverse('api:posts'),
+                                             {'fields': 'id,text'})
+        sql = queries.captured_queries[-1]['sql']
+        self.assertNotIn('JOIN', sql)
+        self.assertNotIn('"group_id"', sql)
+        self.assertEqual(set(response.json()['results'][0]), {'id', 'text'})
+        response = self.guest_client.get(reverse('api:posts'),
+                                         {'fields': 'id,secret'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_cursor_walks_all_posts(self):
+        """Курсор проходит все посты без повторов."""
+        ids, cursor = [], ''
+        while cursor is not None:
+            data = self.guest_client.get(
+                reverse('api:posts'),
+                {'fields': 'id', 'limit': 10, 'cursor': cursor},
+            ).json()
+            ids += [post['id'] for post in data['results']]
+            cursor = data['next_cursor']
+        self.assertEqual(ids, list(Post.objects.values_list('id', flat=True)))
+
+    def test_conditional_get(self):
+        """Неизменившийся пост отдаётся как 304, после нового
+        комментария и правки - заново."""
+        url = reverse('api:post_detail', args=[self.post.id])
+        response = self.guest_client.get(url)
+        self.assertFalse(response.has_header('Last-Modified'))
+        etag = response['ETag']
+        self.assertEqual(
+            self.guest_client.get(url, HTTP_IF_NONE_MATCH=etag).status_code,
+            304)
+        Comment.objects.create(text='Новый', post=self.post, author=self.user)
+        response = self.guest_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['comments_count'],
+                         self.post.comments.count())
+        etag = response['ETag']
+        self.patch(self.author_client, {'text': 'Правка'})
+        response = self.guest_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['text'], 'Правка')
+        self.assertFalse(response.has_header('Last-Modified'))
+
+    def test_list_etag_changes_with_comments(self):
+        """ETag списка меняется вместе со счётчиком комментариев."""
+        url = reverse('api:posts')
+        etag = self.guest_client.get(url)['ETag']
+        self.assertEqual(
+            self.guest_client.get(url, HTTP_IF_NONE_MATCH=etag).status_code,
+            304)
+        Comment.objects.create(text='Ещё', post=self.post, author=self.user)
+        self.assertEqual(
+            self.guest_client.get(url, HTTP_IF_NONE_MATCH=etag).status_code,
+            200)
+
+    def test_post_writes(self):
+        """Создавать посты может вошедший, править - только автор
+        и только актуальную версию."""
+        self.assertEqual(
+            self.guest_client.post(reverse('api:posts'),
+                                   {'text': 'Новый'}).status_code,
+            401)
+        response = self.authorized_client.post(
+            reverse('api:posts'),
+            json.dumps({'text': 'Новый', 'group': self.group.id}),
+            content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['author']['username'], 'auth')
+        self.assertEqual(
+            self.patch(self.authorized_client, {'text': 'Чужая'}).status_code,
+            403)
+        etag = self.guest_client.get(
+            reverse('api:post_detail', args=[self.post.id]))['ETag']
+        self.assertEqual(self.patch(self.author_client, {'text': 'Первая'},
+                                    HTTP_IF_MATCH=etag).status_code, 200)
+        self.assertEqual(self.patch(self.author_client, {'text': 'Вторая'},
+                                    HTTP_IF_MATCH=etag).status_code, 412)
+        self.assertEqual(self.patch(self.author_client, {'text': ''})
+                             .status_code, 400)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.text, 'Первая')
+
+    def test_comments(self):
+        """Комментарии листаются и добавляются через API."""
+        url = reverse('api:post_comments', args=[self.post.id])
+        response = self.authorized_client.post(url, {'text': 'Новый'})
+        self.assertEqual(response.status_code, 201)
+        texts = [comment['text'] for comment in
+                 self.guest_client.get(url).json()['results']]
+        self.assertEqual(texts, ['Новый', 'Комментарий'])
+        self.assertEqual(
+            self.guest_client.get(
+                reverse('api:post_comments', args=[0])).status_code,
+            404)
+
+    def test_follows(self):
+        """Подписка, список подписок и отписка."""
+        response = self.authorized_client.post(
+            reverse('api:follows'), {'author': 'author'})
+        self.assertEqual(response.status_code, 201)
+        data = self.authorized_client.get(reverse('api:follows')).json()
+        self.assertEqual(data['results'][0]['author']['username'], 'author')
+        response = self.authorized_client.delete(
+            reverse('api:follow_detail', args=['author']))
+        self.assertEqual(response.status_code, 204)
+        self.assertFalse(Follow.objects.filter(user=self.user).exists())
+        self.assertEqual(
+            self.guest_client.get(reverse('api:follows')).status_code, 401)
@@ -0,0 +1,344 @@
+"""JSON API для мобильных клиентов: посты, группы, комментарии
+и подписки.
+
+Вход - по сессии сайта, пишущие запросы проверяют CSRF как обычно:
+токен из куки csrftoken (её ставит GET /api/v1/) передаётся
+в заголовке X-CSRFToken. Тело пишущих запросов - JSON или форма.
+
+Списки листаются курсором (?cursor=, ?limit=), поля выбираются
+параметром fields=. Каждый ответ с данными несёт ETag: с If-None-Match
+неизменившийся ресурс отдаётся как 304 без сборки JSON. Last-Modified
+нет: у постов не хранится время изменения счётчиков и вложенных
+автора и группы, а по дате публикации клиент получал бы 304
+с устаревшим comments_count. PATCH и
+DELETE поста с If-Match получают 412, если пост уже изменили.
+"""
+import hashlib
+import json
+from functools import wraps
+
+from django.http import Http404, HttpResponse, JsonResponse
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from django.utils.cache import (get_conditional_response, patch_cache_control,
+                                quote_etag)
+from django.views.decorators.csrf import ensure_csrf_cookie
+
+from posts import write_queue
+from posts.forms import CommentForm, PostForm
+from posts.models import Comment, Follow, Group, Post, User
+from posts.utilities import CommentPaginator, CursorPaginator
+
+from .fields import (COMMENT_FIELDS, COMMENT_REQUIRED, FOLLOW_FIELDS,
+                     FOLLOW_REQUIRED, GROUP_FIELDS, GROUP_REQUIRED,
+                     POST_FIELDS, POST_REQUIRED, FieldsError, as_dict,
+                     narrow, parse_fields)
+
+PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+
+class ApiError(Exception):
+    def __init__(self, status, message, details=None):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+        self.details = details
+
+    def response(self):
+        body = {'error': self.message}
+        if self.details is not None:
+            body['details'] = self.details
+        return json_response(body, status=self.status)
+
+
+def json_response(data, status=200):
+    return JsonResponse(data, status=status,
+                        json_dumps_params={'ensure_ascii': False})
+
+
+def api_view(*methods):
+    """Вью API: отвечает 405 на чужие методы и JSON на ошибки."""
+    allowed = (*methods, 'HEAD') if 'GET' in methods else methods
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in allowed:
+                response = ApiError(405, 'Метод не поддерживается').response()
+                response['Allow'] = ', '.join(allowed)
+                return response
+            try:
+                return view(request, *args, **kwargs)
+            except ApiError as error:
+                return error.response()
+            except Http404:
+                return ApiError(404, 'Не найдено').response()
+        return wrapper
+    return decorator
+
+
+def require_user(request):
+    if not request.user.is_authenticated:
+        raise ApiError(401, 'Нужно войти')
+    return request.user
+
+
+def request_data(request):
+    if request.content_type != 'application/json':
+        return request.POST
+    try:
+        data = json.loads(request.body or b'{}')
+    except ValueError:
+        raise ApiError(400, 'Тело запроса - не JSON')
+    if not isinstance(data, dict):
+        raise ApiError(400, 'Тело запроса должно быть объектом')
+    return data
+
+
+def get_fields(request, available):
+    try:
+        return parse_fields(request.GET.get('fields'), available)
+    except FieldsError as error:
+        raise ApiError(400, str(error))
+
+
+def page_size(request):
+    value = request.GET.get('limit')
+    if value is None:
+        return PAGE_SIZE
+    if not value.isdigit() or not 1 <= int(value) <= MAX_PAGE_SIZE:
+        raise ApiError(400, f'limit - число от 1 до {MAX_PAGE_SIZE}')
+    return int(value)
+
+
+def id_page(queryset, request):
+    """Страница по возрастанию id; курсор - id последнего объекта."""
+    limit = page_size(request)
+    cursor = request.GET.get('cursor')
+    if cursor:
+        if not cursor.isdigit():
+            raise ApiError(400, 'Испорченный курсор')
+        queryset = queryset.filter(id__gt=int(cursor))
+    objects = list(queryset.order_by('id')[:limit + 1])
+    next_cursor = str(objects[limit - 1].id) if len(objects) > limit else None
+    return objects[:limit], next_cursor
+
+
+def make_etag(*parts):
+    return quote_etag(hashlib.md5(repr(parts).encode()).hexdigest())
+
+
+def conditional(request, etag, build):
+    """304, если у клиента уже эта версия, иначе ответ build()."""
+    response = get_conditional_response(request, etag)
+    if response is None:
+        response = build()
+    response['ETag'] = etag
+    return response
+
+
+def list_response(objects, available, names, next_cursor,
+                  previous_cursor=None):
+    return json_response({
+        'results': [as_dict(obj, available, names) for obj in objects],
+        'next_cursor': next_cursor,
+        'previous_cursor': previous_cursor,
+    })
+
+
+def post_revision(post, names):
+    """Всё, от чего зависит представление поста: текст и картинку
+    покрывает версия, вложенные автор и группа - их собственные
+    значения."""
+    embedded = [POST_FIELDS[name].value(post) for name in names
+                if name in ('author', 'group')]
+    return post.id, post.version, post.comments_count, embedded
+
+
+def post_etag(post, names):
+    return make_etag(names, post_revision(post, names))
+
+
+def read_post(post_id, names):
+    return get_object_or_404(
+        narrow(Post.objects.all(), POST_FIELDS, names, POST_REQUIRED),
+        id=post_id,
+    )
+
+
+def post_response(post_id, status=200):
+    names = list(POST_FIELDS)
+    post = read_post(post_id, names)
+    response = json_response(as_dict(post, POST_FIELDS, names), status)
+    response['ETag'] = post_etag(post, names)
+    return response
+
+
+def form_errors(form):
+    return ApiError(400, 'Неверные данные', form.errors.get_json_data())
+
+
+@api_view('GET')
+@ensure_csrf_cookie
+def root(request):
+    return json_response({
+        name: request.build_absolute_uri(reverse(f'api:{name}'))
+        for name in ('posts', 'groups', 'follows')
+    })
+
+
+@api_view('GET', 'POST')
+def posts(request):
+    if request.method == 'POST':
+        return create_post(request)
+    names = get_fields(request, POST_FIELDS)
+    queryset = Post.objects.all()
+    if request.GET.get('author'):
+        queryset = queryset.filter(author__username=request.GET['author'])
+    if request.GET.get('group'):
+        queryset = queryset.filter(group__slug=request.GET['group'])
+    page = CursorPaginator(
+        narrow(queryset, POST_FIELDS, names, POST_REQUIRED),
+        page_size(request),
+    ).get_page(request.GET.get('cursor'))
+    etag = make_etag(names, [post_revision(post, names) for post in page],
+                     page.has_next(), page.has_previous())
+    return conditional(request, etag, lambda: list_response(
+        page, POST_FIELDS, names, page.next_cursor, page.previous_cursor))
+
+
+def create_post(request):
+    user = require_user(request)
+    form = PostForm(request_data(request), files=request.FILES or None)
+    if not form.is_valid():
+        raise form_errors(form)
+    post = form.save(commit=False)
+    post.author = user
+    post.save()
+    response = post_response(post.id, status=201)
+    response['Location'] = reverse('api:post_detail', args=[post.id])
+    return response
+
+
+@api_view('GET', 'PATCH', 'DELETE')
+def post_detail(request, post_id):
+    """Пост. If-Match у PATCH и DELETE сверяется с ETag полного
+    представления поста (GET без fields=)."""
+    if request.method in ('GET', 'HEAD'):
+        names = get_fields(request, POST_FIELDS)
+        post = read_post(post_id, names)
+        return conditional(
+            request, post_etag(post, names),
+            lambda: json_response(as_dict(post, POST_FIELDS, names)),
+        )
+    user = require_user(request)
+    names = list(POST_FIELDS)
+    post = read_post(post_id, names)
+    if post.author_id != user.id:
+        raise ApiError(403, 'Менять пост может только автор')
+    precondition = get_conditional_response(request, post_etag(post, names))
+    if precondition is not None:
+        return precondition
+    if request.method == 'DELETE':
+        post.delete()
+        return HttpResponse(status=204)
+    data = {'text': post.text, 'group': post.group_id}
+    data.update({key: value for key, value in request_data(request).items()
+                 if key in data})
+    form = PostForm(data, instance=post)
+    if not form.is_valid():
+        raise form_errors(form)
+    form.save()
+    return post_response(post.id)
+
+
+@api_view('GET', 'POST')
+def post_comments(request, post_id):
+    post = get_object_or_404(Post.objects.only('id'), id=post_id)
+    if request.method == 'POST':
+        user = require_user(request)
+        form = CommentForm(request_data(request))
+        if not form.is_valid():
+            raise form_errors(form)
+        comment = write_queue.add_comment(user, post,
+                                          form.cleaned_data['text'])
+        if comment is None:
+            return json_response({'status': 'queued'}, status=202)
+        return json_response(
+            as_dict(comment, COMMENT_FIELDS, list(COMMENT_FIELDS)), 201)
+    names = get_fields(request, COMMENT_FIELDS)
+    page = CommentPaginator(
+        narrow(Comment.objects.filter(post_id=post_id), COMMENT_FIELDS,
+               names, COMMENT_REQUIRED),
+        page_size(request),
+    ).get_page(request.GET.get('cursor'))
+    # Комментарии не правятся: хватает id и вложенного автора.
+    etag = make_etag(names, [
+        (comment.id, comment.author.username if 'author' in names else None)
+        for comment in page
+    ], page.has_next(), page.has_previous())
+    return conditional(request, etag, lambda: list_response(
+        page, COMMENT_FIELDS, names, page.next_cursor, page.previous_cursor))
+
+
+@api_view('GET')
+def groups(request):
+    names = get_fields(request, GROUP_FIELDS)
+    objects, next_cursor = id_page(
+        narrow(Group.objects.all(), GROUP_FIELDS, names, GROUP_REQUIRED),
+        request,
+    )
+    etag = make_etag(names, [as_dict(group, GROUP_FIELDS, names)
+                             for group in objects], next_cursor)
+    return conditional(request, etag, lambda: list_response(
+        objects, GROUP_FIELDS, names, next_cursor))
+
+
+@api_view('GET')
+def group_detail(request, slug):
+    names = get_fields(request, GROUP_FIELDS)
+    group = get_object_or_404(
+        narrow(Group.objects.all(), GROUP_FIELDS, names, GROUP_REQUIRED),
+        slug=slug,
+    )
+    data = as_dict(group, GROUP_FIELDS, names)
+    return conditional(request, make_etag(names, data),
+                       lambda: json_response(data))
+
+
+@api_view('GET', 'POST')
+def follows(request):
+    """Подписки текущего пользователя. Подписка через очередь записи
+    отвечает 202: в списке она появится после разбора очереди."""
+    user = require_user(request)
+    if request.method == 'POST':
+        username = request_data(request).get('author')
+        author = get_object_or_404(User, username=username or '')
+        if author == user:
+            raise ApiError(400, 'Нельзя подписаться на себя')
+        follow = write_queue.follow(user, author)
+        if follow is None:
+            return json_response({'status': 'queued'}, status=202)
+        return json_response(
+            as_dict(follow, FOLLOW_FIELDS, list(FOLLOW_FIELDS)), 201)
+    names = get_fields(request, FOLLOW_FIELDS)
+    objects, next_cursor = id_page(
+        narrow(Follow.objects.filter(user=user), FOLLOW_FIELDS, names,
+               FOLLOW_REQUIRED),
+        request,
+    )
+    etag = make_etag(names, [as_dict(follow, FOLLOW_FIELDS, names)
+                             for follow in objects], next_cursor)
+    response = conditional(request, etag, lambda: list_response(
+        objects, FOLLOW_FIELDS, names, next_cursor))
+    patch_cache_control(response, private=True)
+    return response
+
+
+@api_view('DELETE')
+def follow_detail(request, username):
+    user = require_user(request)
+    author = get_object_or_404(User, username=username)
+    write_queue.unfollow(user, author)
+    return HttpResponse(status=204)
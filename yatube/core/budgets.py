@@ -0,0 +1,134 @@
+"""Бюджеты страниц для тестов: сколько SQL-запросов может сделать
+страница, сколько времени на них уйти и сколько - на отрисовку шаблона.
+
+    with Budget('posts:index', queries=4, sql_ms=50, render_ms=200):
+        self.client.get(reverse('posts:index'))
+
+Budget работает и как декоратор. При превышении тест падает
+с AssertionError, в котором перечислены все запросы страницы, а
+повторяющиеся (обычно это N+1) собраны вместе.
+"""
+import re
+import time
+from collections import Counter
+from contextlib import ContextDecorator
+
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.template.backends.django import Template
+from django.test.utils import CaptureQueriesContext
+
+LITERAL_RE = re.compile(r"'(?:[^']|'')*'|\b\d+\b")
+
+
+def normalize_sql(sql):
+    """Запрос без значений: запросы N+1 различаются только ими."""
+    return LITERAL_RE.sub('?', sql)
+
+
+class RenderTimer:
+    """Время отрисовки шаблонов. Засекается только внешний вызов
+    Template.render: вложенные шаблоны входят в его время."""
+
+    def __init__(self):
+        self.seconds = 0
+        self.depth = 0
+        self.original = None
+
+    def start(self):
+        self.original = Template.render
+        timer, original = self, self.original
+
+        def render(template, context=None, request=None):
+            timer.depth += 1
+            started = time.perf_counter()
+            try:
+                return original(template, context, request)
+            finally:
+                timer.depth -= 1
+                if not timer.depth:
+                    timer.seconds += time.perf_counter() - started
+
+        Template.render = render
+
+    def stop(self):
+        Template.render = self.original
+
+
+class Budget(ContextDecorator):
+    """Бюджет страницы view_name. Любой из пределов можно не задавать."""
+
+    def __init__(self, view_name, queries=None, sql_ms=None, render_ms=None,
+                 using=DEFAULT_DB_ALIAS):
+        self.view_name = view_name
+        self.max_queries = queries
+        self.max_sql_ms = sql_ms
+        self.max_render_ms = render_ms
+        self.using = using
+
+    def __enter__(self):
+        self.capture = CaptureQueriesContext(connections[self.using])
+        self.capture.__enter__()
+        self.timer = RenderTimer()
+        self.timer.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.timer.stop()
+        self.capture.__exit__(exc_type, exc_value, traceback)
+        if exc_type is None:
+            self.check()
+        return False
+
+    @property
+    def queries(self):
+        return self.capture.captured_queries
+
+    @property
+    def sql_ms(self):
+        return sum(float(query['time']) for query in self.queries) * 1000
+
+    @property
+    def render_ms(self):
+        return self.timer.seconds * 1000
+
+    def check(self):
+        problems = []
+        if (self.max_queries is not None
+                and len(self.queries) > self.max_queries):
+            problems.append(f'SQL-запросов {len(self.queries)}, '
+                            f'бюджет {self.max_queries}')
+        if self.max_sql_ms is not None and self.sql_ms > self.max_sql_ms:
+            problems.append(f'время SQL {self.sql_ms:.1f} мс, '
+                            f'бюджет {self.max_sql_ms} мс')
+        if (self.max_render_ms is not None
+                and self.render_ms > self.max_render_ms):
+            problems.append(f'отрисовка {self.render_ms:.1f} мс, '
+                            f'бюджет {self.max_render_ms} мс')
+        if problems:
+            raise AssertionError(
+                f'{self.view_name}: бюджет превышен: '
+                + '; '.join(problems) + '\n' + self.report()
+            )
+
+    def report(self):
+        """Запросы страницы по порядку и повторы среди них."""
+        lines = [
+            f'{number}. [{float(query["time"]) * 1000:.1f} мс] '
+            f'{query["sql"]}'
+            for number, query in enumerate(self.queries, start=1)
+        ]
+        repeated = Counter(normalize_sql(query['sql'])
+                           for query in self.queries)
+        repeated = [(sql, count) for sql, count in repeated.most_common()
+                    if count > 1]
+        if repeated:
+            lines.append('Повторяются:')
+            lines.extend(f'{count} x {sql}' for sql, count in repeated)
+        return '\n'.join(lines)
+
+
+def url_names(urlconf_module):
+    """Полные имена всех адресов модуля urls: 'приложение:имя'."""
+    namespace = urlconf_module.app_name
+    return {f'{namespace}:{pattern.name}'
+            for pattern in urlconf_module.urlpatterns if pattern.name}
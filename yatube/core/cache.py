@@ -0,0 +1,156 @@
+import pickle
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+from django.utils.module_loading import import_string
+
+PICKLED = b'p'
+COMPRESSED = b'z'
+
+
+def create_cache(config):
+    """Создаёт бэкенд кэша по словарю в формате settings.CACHES."""
+    backend = import_string(config['BACKEND'])
+    return backend(config.get('LOCATION', ''), config)
+
+
+class TieredCache(BaseCache):
+    """Двухуровневый кэш: небольшой LRU в памяти процесса перед общим
+    для всех процессов бэкендом (memcached, redis, файлы).
+
+    Значения сериализуются pickle с последним протоколом, большие
+    сжимаются zlib. Целые числа хранятся как есть, чтобы incr/decr
+    выполнял общий бэкенд. Локальная копия живёт LOCAL_TIMEOUT секунд,
+    столько же процесс может не видеть чужие изменения ключа.
+
+    OPTIONS:
+        SHARED - настройки общего бэкенда в формате settings.CACHES;
+        LOCAL_MAX_ENTRIES - размер локального LRU;
+        LOCAL_TIMEOUT - время жизни локальной копии в секундах;
+        COMPRESS_MIN_LENGTH - с какого размера значения сжимаются.
+    """
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self.shared = create_cache(options['SHARED'])
+        self._local = OrderedDict()
+        self._local_max_entries = options.get('LOCAL_MAX_ENTRIES', 1000)
+        self._local_timeout = options.get('LOCAL_TIMEOUT', 2)
+        self._compress_min_length = options.get('COMPRESS_MIN_LENGTH', 1024)
+        self._lock = threading.Lock()
+
+    def encode(self, value):
+        if isinstance(value, int) and not isinstance(value, bool):
+            return value
+        data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        if len(data) >= self._compress_min_length:
+            return COMPRESSED + zlib.compress(data)
+        return PICKLED + data
+
+    @staticmethod
+    def decode(data):
+        if not isinstance(data, bytes):
+            return data
+        if data[:1] == COMPRESSED:
+            return pickle.loads(zlib.decompress(data[1:]))
+        return pickle.loads(data[1:])
+
+    def _local_get(self, key):
+        with self._lock:
+            entry = self._local.get(key)
+            if entry is None:
+                return None
+            expires, data = entry
+            if expires < time.monotonic():
+                del self._local[key]
+                return None
+            self._local.move_to_end(key)
+            return data
+
+    def _local_set(self, key, data):
+        with self._lock:
+            self._local[key] = (time.monotonic() + self._local_timeout, data)
+            self._local.move_to_end(key)
+            while len(self._local) > self._local_max_entries:
+                self._local.popitem(last=False)
+
+    def _local_delete(self, key):
+        with self._lock:
+            self._local.pop(key, None)
+
+    def get(self, key, default=None, version=None):
+        local_key = self.make_key(key, version)
+        data = self._local_get(local_key)
+        if data is None:
+            data = self.shared.get(key, version=version)
+            if data is None:
+                return default
+            self._local_set(local_key, data)
+        return self.decode(data)
+
+    def get_many(self, keys, version=None):
+        found, missed = {}, []
+        for key in keys:
+            data = self._local_get(self.make_key(key, version))
+            if data is None:
+                missed.append(key)
+            else:
+                found[key] = data
+        if missed:
+            shared = self.shared.get_many(missed, version=version)
+            for key, data in shared.items():
+                self._local_set(self.make_key(key, version), data)
+            found.update(shared)
+        return {key: self.decode(data) for key, data in found.items()}
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        data = self.encode(value)
+        self.shared.set(key, data, timeout, version=version)
+        self._local_set(self.make_key(key, version), data)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        encoded = {key: self.encode(value) for key, value in data.items()}
+        failed = self.shared.set_many(encoded, timeout, version=version)
+        for key, value in encoded.items():
+            if key not in failed:
+                self._local_set(self.make_key(key, version), value)
+        return failed
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        data = self.encode(value)
+        added = self.shared.add(key, data, timeout, version=version)
+        if added:
+            self._local_set(self.make_key(key, version), data)
+        return added
+
+    def incr(self, key, delta=1, version=None):
+        self._local_delete(self.make_key(key, version))
+        return self.shared.incr(key, delta, version=version)
+
+    def decr(self, key, delta=1, version=None):
+        self._local_delete(self.make_key(key, version))
+        return self.shared.decr(key, delta, version=version)
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        return self.shared.touch(key, timeout, version=version)
+
+    def delete(self, key, version=None):
+        self._local_delete(self.make_key(key, version))
+        self.shared.delete(key, version=version)
+
+    def has_key(self, key, version=None):
+        if self._local_get(self.make_key(key, version)) is not None:
+            return True
+        return self.shared.has_key(key, version=version)
+
+    def clear(self):
+        with self._lock:
+            self._local.clear()
+        self.shared.clear()
+
+    def close(self, **kwargs):
+        self.shared.close(**kwargs)
@@ -0,0 +1,66 @@
+"""Дыры в общих страницах - части, которые зависят от зрителя.
+
+Кэш страниц хранит одну копию страницы для всех: тело рендерится как
+для гостя, а на месте частей зрителя (шапка, кнопки подписки и правки,
+форма комментария) тег hole оставляет метку. fill_holes на каждый
+запрос заменяет метки маленькими шаблонами с контекстом запроса. Вне
+кэша страниц тег рендерит дыру сразу.
+
+Дыра регистрируется именем: шаблон и функция, которая по запросу
+и параметрам метки достраивает контекст шаблона. Параметры метки -
+простые значения, они хранятся в закэшированной странице.
+"""
+import base64
+import json
+import re
+
+from django.template.loader import render_to_string
+
+MARKER = re.compile(r'<!--hole:([A-Za-z0-9_-]+)-->')
+BINARY_MARKER = re.compile(MARKER.pattern.encode())
+
+_holes = {}
+
+
+def register(name, template_name, get_context=None):
+    """get_context(request, **params) возвращает словарь для шаблона
+    в дополнение к параметрам."""
+    _holes[name] = (template_name, get_context)
+
+
+def marker(name, params):
+    payload = json.dumps([name, params], separators=(',', ':'))
+    token = base64.urlsafe_b64encode(payload.encode()).rstrip(b'=')
+    return f'<!--hole:{token.decode()}-->'
+
+
+def render_hole(name, params, request):
+    template_name, get_context = _holes[name]
+    context = dict(params)
+    if get_context is not None:
+        context.update(get_context(request, **params))
+    return render_to_string(template_name, context, request)
+
+
+def is_deferred(request):
+    """Рендерится ли сейчас общая страница с метками вместо дыр."""
+    return getattr(request, 'defer_holes', False)
+
+
+def fill_holes(content, request):
+    """Заполняет метки страницы (str или bytes) для зрителя request."""
+    binary = isinstance(content, bytes)
+
+    def replace(match):
+        token = match.group(1)
+        if binary:
+            token = token.decode()
+        name, params = json.loads(
+            base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+        html = render_hole(name, params, request)
+        return html.encode() if binary else html
+    return (BINARY_MARKER if binary else MARKER).sub(replace, content)
+
+
+register('header_user', 'holes/header_user.html')
+register('switcher', 'holes/switcher.html')
@@ -0,0 +1,68 @@
+import multiprocessing
+import random
+import shutil
+import tempfile
+
+from django.core.management.base import BaseCommand
+
+from core.cache import create_cache
+
+VALUE = 'x' * 4096
+
+
+def run_worker(config, worker, requests, keys):
+    """Имитирует процесс сайта: читает страницы с перекосом
+    популярности, а при промахе "рендерит" и кладёт их в кэш."""
+    cache = create_cache(config)
+    rnd = random.Random(worker)
+    hits = 0
+    for _ in range(requests):
+        key = f'page:{min(int(rnd.paretovariate(0.3)), keys)}'
+        if cache.get(key) is None:
+            cache.set(key, VALUE, None)
+        else:
+            hits += 1
+    return hits
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает долю попаданий в кэш у N процессов с отдельными '
+            'кэшами в памяти и с двухуровневым кэшем над общим бэкендом.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4)
+        parser.add_argument('--requests', type=int, default=5000)
+        parser.add_argument('--keys', type=int, default=500)
+
+    def handle(self, *args, **options):
+        workers = options['workers']
+        requests = options['requests']
+        location = tempfile.mkdtemp()
+        configs = {
+            'locmem в каждом процессе': {
+                'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            },
+            'LRU + общий файловый кэш': {
+                'BACKEND': 'core.cache.TieredCache',
+                'OPTIONS': {
+                    'SHARED': {
+                        'BACKEND': ('django.core.cache.backends.filebased.'
+                                    'FileBasedCache'),
+                        'LOCATION': location,
+                    },
+                },
+            },
+        }
+        context = multiprocessing.get_context('fork')
+        try:
+            for name, config in configs.items():
+                with context.Pool(workers) as pool:
+                    hits = pool.starmap(run_worker, [
+                        (config, worker, requests, options['keys'])
+                        for worker in range(workers)
+                    ])
+                ratio = sum(hits) / (workers * requests)
+                self.stdout.write(f'{name}: попаданий {ratio:.1%} '
+                                  f'({workers} процесса(ов))')
+        finally:
+            shutil.rmtree(location, ignore_errors=True)
@@ -0,0 +1,119 @@
+import multiprocessing
+import os
+import random
+import shutil
+import sqlite3
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.sqlite import pragma_statements
+
+# Профили соединения: PRAGMA и живёт ли соединение между запросами.
+PROFILES = {
+    'django': ({}, False),
+    'pragmas': (settings.SQLITE_PRAGMAS, False),
+    'tuned': (settings.SQLITE_PRAGMAS, True),
+}
+READ_SQL = ('SELECT id, author_id, text, pub_date FROM post '
+            'WHERE author_id = ? ORDER BY pub_date DESC LIMIT 10')
+WRITE_SQL = 'INSERT INTO post (author_id, text, pub_date) VALUES (?, ?, ?)'
+
+
+def create_database(path, rows):
+    connection = sqlite3.connect(path)
+    connection.executescript(
+        'CREATE TABLE post (id INTEGER PRIMARY KEY, author_id INTEGER, '
+        'text TEXT, pub_date REAL);'
+        'CREATE INDEX post_author ON post (author_id, pub_date);'
+    )
+    connection.executemany(WRITE_SQL, (
+        (number % 1000, 'Текст поста ' * 20, number) for number in range(rows)
+    ))
+    connection.commit()
+    connection.close()
+
+
+def connect(path, pragmas):
+    # Как в Django 2.2: автокоммит, явные BEGIN, ожидание по умолчанию 5 с.
+    connection = sqlite3.connect(path, isolation_level=None)
+    for statement in pragma_statements(pragmas):
+        connection.execute(statement)
+    return connection
+
+
+def run_worker(path, profile, seconds, write_share, seed):
+    """Имитирует процесс сайта: каждая итерация - "запрос" на чтение
+    страницы или запись поста. Возвращает (чтений, записей, ошибок)."""
+    pragmas, persistent = PROFILES[profile]
+    rnd = random.Random(seed)
+    reads = writes = errors = 0
+    connection = connect(path, pragmas) if persistent else None
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        current = connection or connect(path, pragmas)
+        try:
+            if rnd.random() < write_share:
+                current.execute('BEGIN')
+                current.execute(WRITE_SQL, (rnd.randrange(1000), 'Новый пост',
+                                            time.time()))
+                current.execute('COMMIT')
+                writes += 1
+            else:
+                current.execute(READ_SQL, (rnd.randrange(1000),)).fetchall()
+                reads += 1
+        except sqlite3.OperationalError:
+            errors += 1
+            if current.in_transaction:
+                current.execute('ROLLBACK')
+        finally:
+            if connection is None:
+                current.close()
+    return reads, writes, errors
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает пропускную способность SQLite при одновременных '
+            'чтении и записи из нескольких процессов: соединение Django '
+            'по умолчанию, с PRAGMA из SQLITE_PRAGMAS и с PRAGMA '
+            'и постоянным соединением (CONN_MAX_AGE).')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=8)
+        parser.add_argument('--seconds', type=float, default=5)
+        parser.add_argument('--write-share', type=float, default=0.1,
+                            help='Доля запросов на запись')
+        parser.add_argument('--rows', type=int, default=100000)
+        parser.add_argument('--directory',
+                            help='Где создать базу; лучше на том же '
+                                 'диске, что и рабочая')
+        parser.add_argument('--profiles', nargs='+', choices=PROFILES,
+                            default=list(PROFILES))
+
+    def handle(self, *args, **options):
+        directory = tempfile.mkdtemp(dir=options['directory'])
+        try:
+            for profile in options['profiles']:
+                self.bench(profile, os.path.join(directory,
+                                                 f'{profile}.sqlite3'),
+                           options)
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+
+    def bench(self, profile, path, options):
+        create_database(path, options['rows'])
+        with multiprocessing.Pool(options['workers']) as pool:
+            results = pool.starmap(run_worker, [
+                (path, profile, options['seconds'], options['write_share'],
+                 seed)
+                for seed in range(options['workers'])
+            ])
+        reads, writes, errors = map(sum, zip(*results))
+        seconds = options['seconds']
+        self.stdout.write(
+            f'{profile}: {(reads + writes) / seconds:.0f} запросов/с '
+            f'(чтений {reads / seconds:.0f}/с, записей '
+            f'{writes / seconds:.0f}/с), ошибок {errors}'
+        )
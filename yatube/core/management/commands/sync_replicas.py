@@ -0,0 +1,46 @@
+import os
+import sqlite3
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS
+
+
+def replica_path(name):
+    """Путь к файлу реплики из NAME вида file:<путь>?mode=ro."""
+    if name.startswith('file:'):
+        name = name[len('file:'):]
+    return name.split('?', 1)[0]
+
+
+class Command(BaseCommand):
+    help = ('Копирует основную базу SQLite в файлы реплик из '
+            'YATUBE_DB_REPLICAS онлайн-бэкапом SQLite: сайт при этом '
+            'продолжает работать. Для локальной проверки чтения '
+            'с реплик; запуск по расписанию задаёт их отставание.')
+
+    def handle(self, *args, **options):
+        primary = settings.DATABASES[DEFAULT_DB_ALIAS]
+        if primary['ENGINE'] != 'django.db.backends.sqlite3':
+            raise CommandError('Команда копирует только базы SQLite')
+        if not settings.DATABASE_REPLICAS:
+            raise CommandError('Реплики не заданы: YATUBE_DB_REPLICAS пуст')
+        source = sqlite3.connect(primary['NAME'])
+        try:
+            for alias in settings.DATABASE_REPLICAS:
+                path = replica_path(settings.DATABASES[alias]['NAME'])
+                # Копия пишется рядом и подменяет реплику целиком, чтобы
+                # читающие процессы не увидели её наполовину.
+                temporary = f'{path}.tmp'
+                target = sqlite3.connect(temporary)
+                try:
+                    source.backup(target)
+                    # Реплика открывается только на чтение, а такой
+                    # процесс не может завести файлы WAL.
+                    target.execute('PRAGMA journal_mode = delete')
+                finally:
+                    target.close()
+                os.replace(temporary, path)
+                self.stdout.write(f'{alias}: {path}')
+        finally:
+            source.close()
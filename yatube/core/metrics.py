@@ -0,0 +1,265 @@
+"""Метрики запросов в памяти процесса и их выдача в текстовом формате
+Prometheus.
+
+Для выбранной доли запросов (METRICS_SAMPLE_RATE) MetricsMiddleware
+записывает по имени вью время ответа, число и время SQL-запросов,
+время отрисовки шаблонов, попадания и промахи кэша и размер ответа.
+Общее число запросов считается для всех. У каждого процесса сайта
+свои гистограммы: Prometheus опрашивает процессы по отдельности
+и складывает их сам.
+"""
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+from django.db import connections
+from django.template.backends.django import Template
+from django.utils.module_loading import import_string
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+QUERIES_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+SIZE_BUCKETS = (1024, 4096, 16384, 65536, 262144, 1048576)
+
+HISTOGRAMS = (
+    ('duration', 'yatube_request_duration_seconds',
+     'Время ответа', DURATION_BUCKETS),
+    ('sql_queries', 'yatube_sql_queries',
+     'SQL-запросов на ответ', QUERIES_BUCKETS),
+    ('sql_duration', 'yatube_sql_duration_seconds',
+     'Время SQL-запросов ответа', DURATION_BUCKETS),
+    ('render_duration', 'yatube_render_duration_seconds',
+     'Время отрисовки шаблонов', DURATION_BUCKETS),
+    ('response_size', 'yatube_response_size_bytes',
+     'Размер ответа', SIZE_BUCKETS),
+)
+COUNTERS = (
+    ('requests', 'yatube_requests_total', 'Все запросы, без выборки'),
+    ('cache_hits', 'yatube_cache_hits_total', 'Попадания в кэш'),
+    ('cache_misses', 'yatube_cache_misses_total', 'Промахи кэша'),
+)
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        for number, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[number] += 1
+                break
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        total = 0
+        for bound, count in zip(self.buckets, self.counts):
+            total += count
+            yield bound, total
+
+
+class Registry:
+    """Гистограммы и счётчики процесса с разбивкой по вью."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.histograms = {name: {} for name, *_ in HISTOGRAMS}
+            self.counters = {name: {} for name, *_ in COUNTERS}
+
+    def count(self, view):
+        with self.lock:
+            requests = self.counters['requests']
+            requests[view] = requests.get(view, 0) + 1
+
+    def record(self, view, stats):
+        """stats - RequestStats одного ответа из выборки."""
+        with self.lock:
+            for name, _, _, buckets in HISTOGRAMS:
+                histogram = self.histograms[name].get(view)
+                if histogram is None:
+                    histogram = self.histograms[name][view] = Histogram(
+                        buckets)
+                histogram.observe(getattr(stats, name))
+            for name in ('cache_hits', 'cache_misses'):
+                counter = self.counters[name]
+                counter[view] = counter.get(view, 0) + getattr(stats, name)
+
+    def exposition(self):
+        """Все метрики в текстовом формате Prometheus 0.0.4."""
+        lines = [
+            '# HELP yatube_metrics_sample_rate Доля измеряемых запросов',
+            '# TYPE yatube_metrics_sample_rate gauge',
+            f'yatube_metrics_sample_rate {settings.METRICS_SAMPLE_RATE}',
+        ]
+        with self.lock:
+            for name, metric, help_text in COUNTERS:
+                lines += [f'# HELP {metric} {help_text}',
+                          f'# TYPE {metric} counter']
+                for view, value in sorted(self.counters[name].items()):
+                    lines.append(f'{metric}{{view="{escape(view)}"}} {value}')
+            for name, metric, help_text, _ in HISTOGRAMS:
+                lines += [f'# HELP {metric} {help_text}',
+                          f'# TYPE {metric} histogram']
+                for view, histogram in sorted(self.histograms[name].items()):
+                    label = f'view="{escape(view)}"'
+                    for bound, total in histogram.cumulative():
+                        lines.append(
+                            f'{metric}_bucket{{{label},le="{bound}"}} {total}')
+                    lines += [
+                        f'{metric}_bucket{{{label},le="+Inf"}} '
+                        f'{histogram.count}',
+                        f'{metric}_sum{{{label}}} {histogram.sum}',
+                        f'{metric}_count{{{label}}} {histogram.count}',
+                    ]
+        return '\n'.join(lines) + '\n'
+
+
+def escape(value):
+    return (value.replace('\\', '\\\\').replace('"', '\\"')
+                 .replace('\n', '\\n'))
+
+
+registry = Registry()
+
+
+class RequestStats:
+    """Замеры одного запроса. Пока запрос измеряется, его RequestStats
+    лежит в current.stats потока, и перехватчики шаблонов и кэша
+    добавляют туда свои замеры."""
+
+    def __init__(self):
+        self.duration = 0
+        self.sql_queries = 0
+        self.sql_duration = 0
+        self.render_duration = 0
+        self.response_size = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.depth = 0
+        # SQL-запросы приходят и из потоков пула (posts.concurrency).
+        self.lock = threading.Lock()
+
+    def __call__(self, execute, sql, params, many, context):
+        """Обёртка connection.execute_wrapper для SQL-запросов."""
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            with self.lock:
+                self.sql_duration += elapsed
+                self.sql_queries += 1
+
+
+current = threading.local()
+# Замеры SQL измеряемого запроса; в отличие от current переходят
+# вместе с контекстом в потоки пула.
+sql_stats = ContextVar('sql_stats', default=None)
+MISSING = object()
+_installed = False
+
+
+def current_stats():
+    """Замеры внешнего вызова в измеряемом запросе, иначе None.
+    Вложенные вызовы (шаблон в шаблоне, кэш внутри кэша) не в счёт."""
+    stats = getattr(current, 'stats', None)
+    if stats is None or stats.depth:
+        return None
+    return stats
+
+
+@contextmanager
+def count_queries(stats):
+    """Считает в stats SQL-запросы всех баз (default и реплик)
+    текущего потока."""
+    token = sql_stats.set(stats)
+    try:
+        with ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(
+                    connections[alias].execute_wrapper(stats))
+            yield
+    finally:
+        sql_stats.reset(token)
+
+
+def timed_render(render):
+    @wraps(render)
+    def wrapper(template, context=None, request=None):
+        stats = current_stats()
+        if stats is None:
+            return render(template, context, request)
+        stats.depth += 1
+        started = time.perf_counter()
+        try:
+            return render(template, context, request)
+        finally:
+            stats.depth -= 1
+            stats.render_duration += time.perf_counter() - started
+    return wrapper
+
+
+def counted_get(get):
+    @wraps(get)
+    def wrapper(cache, key, default=None, version=None):
+        stats = current_stats()
+        if stats is None:
+            return get(cache, key, default, version)
+        stats.depth += 1
+        try:
+            value = get(cache, key, MISSING, version)
+        finally:
+            stats.depth -= 1
+        if value is MISSING:
+            stats.cache_misses += 1
+            return default
+        stats.cache_hits += 1
+        return value
+    return wrapper
+
+
+def counted_get_many(get_many):
+    @wraps(get_many)
+    def wrapper(cache, keys, version=None):
+        stats = current_stats()
+        if stats is None:
+            return get_many(cache, keys, version)
+        keys = list(keys)
+        stats.depth += 1
+        try:
+            found = get_many(cache, keys, version)
+        finally:
+            stats.depth -= 1
+        stats.cache_hits += len(found)
+        stats.cache_misses += len(set(keys)) - len(found)
+        return found
+    return wrapper
+
+
+def install():
+    """Ставит перехватчики отрисовки шаблонов и чтения из кэша.
+    Без измеряемого запроса в потоке они сразу передают вызов дальше."""
+    global _installed
+    if _installed:
+        return
+    _installed = True
+    Template.render = timed_render(Template.render)
+    backends = set()
+    for config in settings.CACHES.values():
+        backends.add(import_string(config['BACKEND']))
+        shared = config.get('OPTIONS', {}).get('SHARED')
+        if shared:
+            backends.add(import_string(shared['BACKEND']))
+    for backend in backends:
+        backend.get = counted_get(backend.get)
+        backend.get_many = counted_get_many(backend.get_many)
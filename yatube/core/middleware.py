@@ -0,0 +1,46 @@
+import random
+import time
+
+from django.conf import settings
+
+from . import metrics
+
+
+class MetricsMiddleware:
+    """Записывает метрики запроса в core.metrics.registry.
+
+    Ставится первым в MIDDLEWARE, чтобы время ответа включало
+    остальные middleware. Подробные замеры делаются для доли
+    METRICS_SAMPLE_RATE запросов: без выборки выполняются только
+    счётчик запросов и один вызов random().
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        metrics.install()
+
+    def __call__(self, request):
+        if random.random() >= settings.METRICS_SAMPLE_RATE:
+            response = self.get_response(request)
+            metrics.registry.count(self.view_name(request))
+            return response
+        stats = metrics.RequestStats()
+        metrics.current.stats = stats
+        started = time.perf_counter()
+        try:
+            with metrics.count_queries(stats):
+                response = self.get_response(request)
+        finally:
+            metrics.current.stats = None
+        stats.duration = time.perf_counter() - started
+        if not response.streaming:
+            stats.response_size = len(response.content)
+        view = self.view_name(request)
+        metrics.registry.count(view)
+        metrics.registry.record(view, stats)
+        return response
+
+    @staticmethod
+    def view_name(request):
+        match = getattr(request, 'resolver_match', None)
+        return match.view_name if match else 'unresolved'
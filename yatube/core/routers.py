@@ -0,0 +1,100 @@
+"""Чтение с реплик базы и запись в основную базу.
+
+Реплики - алиасы settings.DATABASE_REPLICAS. Читать с них можно только
+внутри запроса, который ReplicaMiddleware признал читающим; вне
+запросов (команды, задачи) и в пишущих запросах всё идёт в default.
+После пишущего запроса пользователь получает куку
+REPLICA_STICKY_COOKIE и REPLICA_STICKY_SECONDS читает из default,
+чтобы сразу видеть свои записи, даже если реплика отстаёт.
+
+Сессии, пользователи и типы содержимого всегда читаются из default:
+отставание реплики не должно разлогинивать только что вошедшего.
+Страницы для общего кэша (posts.page_cache) строятся внутри
+primary_reads: копия с отстающей реплики жила бы до следующего
+сдвига поколения.
+"""
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+PRIMARY_APPS = ('sessions', 'auth', 'contenttypes')
+
+_replicas_allowed = ContextVar('replicas_allowed', default=False)
+
+
+def primary_db(view):
+    """Помечает вью, которая пишет в базу и на GET-запрос
+    (подписка и отписка по ссылке)."""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        return view(request, *args, **kwargs)
+    wrapper.writes_to_db = True
+    return wrapper
+
+
+@contextmanager
+def primary_reads():
+    """Внутри блока всё чтение идёт в default."""
+    token = _replicas_allowed.set(False)
+    try:
+        yield
+    finally:
+        _replicas_allowed.reset(token)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        replicas = settings.DATABASE_REPLICAS
+        if model._meta.app_label in PRIMARY_APPS:
+            return DEFAULT_DB_ALIAS
+        if replicas and _replicas_allowed.get():
+            return random.choice(replicas)
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплики - копии основной базы, объекты из них связываются
+        # между собой.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
+
+
+class ReplicaMiddleware:
+    """Решает для каждого запроса, можно ли читать с реплик: да, если
+    вью только читает, а пользователь недавно ничего не записывал."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.writes_to_db = request.method not in SAFE_METHODS
+        request.replica_token = None
+        try:
+            response = self.get_response(request)
+        finally:
+            if request.replica_token is not None:
+                _replicas_allowed.reset(request.replica_token)
+        if request.writes_to_db:
+            response.set_cookie(
+                settings.REPLICA_STICKY_COOKIE, '1',
+                max_age=settings.REPLICA_STICKY_SECONDS, httponly=True,
+            )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if getattr(view_func, 'writes_to_db', False):
+            request.writes_to_db = True
+        if (request.writes_to_db or not settings.DATABASE_REPLICAS
+                or settings.REPLICA_STICKY_COOKIE in request.COOKIES):
+            return None
+        request.replica_token = _replicas_allowed.set(True)
+        return None
@@ -0,0 +1,23 @@
+"""Настройки SQLite, которые выполняются на каждом новом соединении.
+
+Django 2.2 открывает SQLite в режиме журнала отката: запись блокирует
+чтение, а под нагрузкой запросы падают с "database is locked".
+PRAGMAS из настроек базы (settings.DATABASES[...]['PRAGMAS']) задают
+WAL, ожидание блокировки, mmap и размер кэша страниц.
+"""
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+
+def pragma_statements(pragmas):
+    return [f'PRAGMA {name} = {value}' for name, value in pragmas.items()]
+
+
+@receiver(connection_created)
+def apply_pragmas(sender, connection, **kwargs):
+    if connection.vendor != 'sqlite':
+        return
+    statements = pragma_statements(connection.settings_dict.get('PRAGMAS', {}))
+    with connection.cursor() as cursor:
+        for statement in statements:
+            cursor.execute(statement)
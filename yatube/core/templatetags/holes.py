@@ -0,0 +1,16 @@
+from django import template
+from django.utils.safestring import mark_safe
+
+from core.holes import is_deferred, marker, render_hole
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def hole(context, name, **params):
+    """Часть страницы для зрителя: метка, если страница рендерится
+    для кэша (core.holes), иначе сразу готовый HTML."""
+    request = context.get('request')
+    if context.get('defer_holes') or is_deferred(request):
+        return mark_safe(marker(name, params))
+    return render_hole(name, params, request)
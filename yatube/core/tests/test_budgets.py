@@ -0,0 +1,30 @@
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+
+from core.budgets import Budget, normalize_sql
+
+User = get_user_model()
+
+
+class BudgetTests(TestCase):
+    def test_exceeded_budget_lists_queries(self):
+        """При превышении в ошибке перечислены запросы и их повторы."""
+        with self.assertRaises(AssertionError) as raised:
+            with Budget('N+1', queries=1):
+                for pk in (1, 2, 3):
+                    User.objects.filter(pk=pk).first()
+        message = str(raised.exception)
+        self.assertIn('N+1: бюджет превышен: SQL-запросов 3, бюджет 1',
+                      message)
+        self.assertIn('3. [', message)
+        self.assertIn('Повторяются:\n3 x SELECT', message)
+
+    def test_within_budget(self):
+        """Запросы в пределах бюджета не роняют тест."""
+        with Budget('users', queries=1, sql_ms=1000) as budget:
+            list(User.objects.all())
+        self.assertEqual(len(budget.queries), 1)
+
+    def test_normalize_sql(self):
+        self.assertEqual(normalize_sql("WHERE id = 12 AND name = 'a''b'"),
+                         'WHERE id = ? AND name = ?')
@@ -0,0 +1,64 @@
+import shutil
+import tempfile
+
+from django.test import SimpleTestCase
+
+from core.cache import COMPRESSED, TieredCache
+
+
+def make_tiered_cache(location, **options):
+    options.setdefault('SHARED', {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': location,
+    })
+    return TieredCache('', {'OPTIONS': options})
+
+
+class TieredCacheTests(SimpleTestCase):
+    """Общий уровень - файловый кэш во временной папке: два экземпляра
+    TieredCache ведут себя как два процесса сайта."""
+
+    def setUp(self):
+        self.location = tempfile.mkdtemp()
+        self.worker_1 = make_tiered_cache(self.location)
+        self.worker_2 = make_tiered_cache(self.location)
+
+    def tearDown(self):
+        shutil.rmtree(self.location, ignore_errors=True)
+
+    def test_value_is_shared_between_workers(self):
+        """Значение, записанное одним процессом, видно другому."""
+        self.worker_1.set('page', {'content': 'Текст'})
+        self.assertEqual(self.worker_2.get('page'), {'content': 'Текст'})
+        self.assertEqual(self.worker_2.get_many(['page', 'missing']),
+                         {'page': {'content': 'Текст'}})
+        self.worker_2.delete('page')
+        self.assertIsNone(self.worker_2.get('page'))
+
+    def test_large_values_are_compressed(self):
+        """Большие значения сжимаются, маленькие - нет."""
+        big = 'пост ' * 1000
+        self.assertTrue(self.worker_1.encode(big).startswith(COMPRESSED))
+        self.assertFalse(self.worker_1.encode('пост').startswith(COMPRESSED))
+        self.worker_1.set('big', big)
+        self.assertEqual(self.worker_2.get('big'), big)
+
+    def test_counters_go_to_shared_backend(self):
+        """incr выполняется общим уровнем и сбрасывает локальную копию."""
+        self.worker_1.set('generation', 1)
+        self.assertEqual(self.worker_2.get('generation'), 1)
+        self.worker_1.incr('generation')
+        self.worker_2.incr('generation')
+        self.assertEqual(self.worker_2.get('generation'), 3)
+
+    def test_local_copy_expires(self):
+        """Локальная копия живёт LOCAL_TIMEOUT и вытесняется по LRU."""
+        worker = make_tiered_cache(self.location, LOCAL_TIMEOUT=0)
+        worker.set('key', 'old')
+        self.worker_2.set('key', 'new')
+        self.assertEqual(worker.get('key'), 'new')
+
+        worker = make_tiered_cache(self.location, LOCAL_MAX_ENTRIES=1)
+        worker.set('first', 1)
+        worker.set('second', 2)
+        self.assertEqual(list(worker._local), [worker.make_key('second')])
@@ -0,0 +1,38 @@
+from django.contrib.auth import get_user_model
+from django.template import Context, Template
+from django.test import RequestFactory, TestCase
+
+from core import holes
+
+User = get_user_model()
+
+
+class HolesTests(TestCase):
+    def setUp(self):
+        holes.register('test_hole', 'holes/header_user.html',
+                       lambda request, view_name: {'user': request.user})
+        self.request = RequestFactory().get('/')
+        self.request.user = User(username='auth', id=1)
+
+    def test_marker_is_filled_for_viewer(self):
+        """Метка заполняется шаблоном дыры с контекстом зрителя."""
+        content = f'<p>{holes.marker("test_hole", {"view_name": None})}</p>'
+        filled = holes.fill_holes(content, self.request)
+        self.assertIn('Выйти', filled)
+        self.assertNotIn('<!--hole:', filled)
+        self.assertEqual(holes.fill_holes(content.encode(), self.request),
+                         filled.encode())
+
+    def test_tag_defers_only_for_shared_render(self):
+        """Тег hole оставляет метку только для общей копии, а метку
+        из пользовательского текста подделать нельзя."""
+        template = Template(
+            "{% load holes %}{{ text }}{% hole 'test_hole' view_name='' %}")
+        forged = holes.marker('test_hole', {'view_name': ''})
+        context = {'request': self.request, 'text': forged}
+        self.assertNotIn('<!--hole:', template.render(Context(context)))
+        self.request.defer_holes = True
+        rendered = template.render(Context(context))
+        self.assertEqual(rendered.count('<!--hole:'), 1)
+        self.assertEqual(holes.fill_holes(rendered, self.request).count(
+            'Выйти'), 1)
@@ -0,0 +1,88 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection, connections
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from core.metrics import RequestStats, count_queries, registry
+from posts.concurrency import run_concurrently
+from posts.models import Post
+
+User = get_user_model()
+
+
+def select_one():
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT 1')
+
+
+@override_settings(METRICS_TOKEN='secret')
+class MetricsTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        Post.objects.create(text='Тестовый пост', author=cls.user)
+
+    def setUp(self):
+        self.client = Client()
+        registry.reset()
+        cache.clear()
+
+    @override_settings(METRICS_SAMPLE_RATE=1)
+    def test_sampled_request_is_measured(self):
+        """Измеренный запрос попадает во все метрики своей вью."""
+        self.client.get(reverse('posts:index'))
+        self.client.get(reverse('posts:index'))
+        text = self.client.get(
+            reverse('metrics'), HTTP_AUTHORIZATION='Bearer secret'
+        ).content.decode()
+        self.assertIn('yatube_requests_total{view="posts:index"} 2', text)
+        for metric in ('request_duration_seconds', 'sql_queries',
+                       'sql_duration_seconds', 'render_duration_seconds',
+                       'response_size_bytes'):
+            with self.subTest(metric=metric):
+                self.assertIn(
+                    f'yatube_{metric}_count{{view="posts:index"}} 2', text)
+        # Первый запрос строит страницу, второй берёт её из кэша.
+        self.assertIn('yatube_cache_hits_total{view="posts:index"}', text)
+        self.assertIn('yatube_cache_misses_total{view="posts:index"}', text)
+        self.assertNotIn('yatube_cache_hits_total{view="posts:index"} 0',
+                         text)
+        self.assertNotIn('yatube_sql_queries_count{view="metrics"}', text)
+
+    @override_settings(METRICS_SAMPLE_RATE=0)
+    def test_unsampled_request_is_only_counted(self):
+        """Вне выборки запрос только считается."""
+        self.client.get(reverse('posts:index'))
+        text = registry.exposition()
+        self.assertIn('yatube_requests_total{view="posts:index"} 1', text)
+        self.assertNotIn('yatube_request_duration_seconds_count', text)
+
+    def test_metrics_are_internal(self):
+        """Чужим адресам и запросам без токена страница метрик
+           не отдаётся, а без токена в настройках - никому."""
+        url = reverse('metrics')
+        response = self.client.get(url, REMOTE_ADDR='203.0.113.5',
+                                   HTTP_AUTHORIZATION='Bearer secret')
+        self.assertEqual(response.status_code, 404)
+        for header in ('', 'Bearer wrong'):
+            with self.subTest(header=header):
+                response = self.client.get(url, HTTP_AUTHORIZATION=header)
+                self.assertEqual(response.status_code, 404)
+        with self.settings(METRICS_TOKEN=''):
+            response = self.client.get(url, HTTP_AUTHORIZATION='Bearer ')
+            self.assertEqual(response.status_code, 404)
+
+    @override_settings(POSTS_LOOKUP_WORKERS=2)
+    def test_queries_of_all_databases_and_pool_are_counted(self):
+        """Считаются запросы к каждой базе и из потоков пула."""
+        stats = RequestStats()
+        with count_queries(stats):
+            for alias in connections:
+                with self.subTest(alias=alias):
+                    self.assertIn(stats,
+                                  connections[alias].execute_wrappers)
+            run_concurrently(select_one, select_one)
+        # Новое соединение потока добавляет свои запросы настройки.
+        self.assertGreaterEqual(stats.sql_queries, 2)
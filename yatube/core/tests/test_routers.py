@@ -0,0 +1,92 @@
+from django.contrib.auth import get_user_model
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from core.routers import ReplicaRouter, _replicas_allowed
+from posts.models import Follow, Post
+
+User = get_user_model()
+
+
+@override_settings(DATABASE_REPLICAS=['replica'])
+class ReplicaRouterTests(TestCase):
+    """Базы-реплики в тестах нет: проверяется, куда роутер отправил
+    бы чтение внутри вью."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.user = User.objects.create_user(username='auth')
+        Follow.objects.create(user=cls.user, author=cls.author)
+        Post.objects.create(text='Тестовый пост', author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.user)
+        self.seen = []
+        router = ReplicaRouter()
+        original = router.db_for_read
+
+        def db_for_read(model, **hints):
+            database = original(model, **hints)
+            if model is Post:
+                self.seen.append(database)
+            return 'default'
+
+        router.db_for_read = db_for_read
+        self.router = router
+
+    def get(self, url, method='get', data=None):
+        self.seen.clear()
+        with self.settings(DATABASE_ROUTERS=[self.router]):
+            return getattr(self.client, method)(url, data)
+
+    def test_outside_requests_reads_go_to_primary(self):
+        """Вне запроса (команды, задачи) чтение идёт в default."""
+        self.assertFalse(_replicas_allowed.get())
+        self.assertEqual(ReplicaRouter().db_for_read(Post), 'default')
+        self.assertEqual(ReplicaRouter().db_for_write(Post), 'default')
+
+    def test_read_views_use_replicas_until_user_writes(self):
+        """Читающие вью читают с реплики, а после записи пользователь
+        некоторое время читает из основной базы."""
+        index = reverse('posts:follow_index')
+        self.get(index)
+        self.assertEqual(set(self.seen), {'replica'})
+
+        response = self.get(reverse('posts:post_create'), 'post',
+                            {'text': 'Новый пост'})
+        self.assertIn('db_primary', response.cookies)
+        self.get(index)
+        self.assertEqual(set(self.seen), {'default'})
+
+    def test_get_views_that_write_use_primary(self):
+        """Подписка по GET-ссылке читает и пишет в основную базу."""
+        response = self.get(reverse('posts:profile_follow',
+                                    args=[self.author.username]))
+        self.assertNotIn('replica', self.seen)
+        self.assertIn('db_primary', response.cookies)
+        self.client.cookies.pop('db_primary')
+        self.get(reverse('posts:follow_index'))
+        self.assertEqual(set(self.seen), {'replica'})
+
+    def test_cached_pages_are_built_from_primary(self):
+        """Страницы для общего кэша строятся из основной базы."""
+        self.get(reverse('posts:profile', args=[self.author.username]))
+        self.assertEqual(set(self.seen), {'default'})
+
+    def test_sessions_and_users_are_read_from_primary(self):
+        """Сессии и пользователи не читаются с реплик."""
+        token = _replicas_allowed.set(True)
+        try:
+            for model in (Session, User, Post):
+                with self.subTest(model=model):
+                    self.assertEqual(
+                        ReplicaRouter().db_for_read(model),
+                        'replica' if model is Post else 'default')
+        finally:
+            _replicas_allowed.reset(token)
@@ -0,0 +1,24 @@
+from django.conf import settings
+from django.db import connection
+from django.test import SimpleTestCase
+
+from core.sqlite import pragma_statements
+
+
+class SqlitePragmasTests(SimpleTestCase):
+    databases = {'default'}
+
+    def test_pragmas_are_applied_to_new_connections(self):
+        """Новое соединение получает PRAGMA из настроек базы."""
+        connection.close()
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(cursor.fetchone()[0],
+                             settings.SQLITE_PRAGMAS['busy_timeout'])
+            cursor.execute('PRAGMA cache_size')
+            self.assertEqual(cursor.fetchone()[0],
+                             settings.SQLITE_PRAGMAS['cache_size'])
+
+    def test_pragma_statements(self):
+        self.assertEqual(pragma_statements({'journal_mode': 'wal'}),
+                         ['PRAGMA journal_mode = wal'])
@@ -1,5 +1,11 @@
+import hmac
+
+from django.conf import settings
+from django.http import Http404, HttpResponse
 from django.shortcuts import render
 
+from .metrics import registry
+
 
 def page_not_found(request, exception):
     return render(request, 'core/404.html', {'path': request.path}, status=404)
@@ -15,3 +21,20 @@ def server_error(request):
 
 def permission_denied(request, exception):
     return render(request, 'core/403.html', status=403)
+
+
+def metrics(request):
+    """Метрики процесса для Prometheus: с адресов METRICS_ALLOWED_IPS
+    и с заголовком Authorization: Bearer METRICS_TOKEN. За обратным
+    прокси все запросы приходят с 127.0.0.1, поэтому одного адреса
+    мало; без токена в настройках страницы нет ни для кого."""
+    token = settings.METRICS_TOKEN
+    authorization = request.META.get('HTTP_AUTHORIZATION', '')
+    if (not token
+            or request.META.get('REMOTE_ADDR')
+            not in settings.METRICS_ALLOWED_IPS
+            or not hmac.compare_digest(authorization.encode(),
+                                       f'Bearer {token}'.encode())):
+        raise Http404
+    return HttpResponse(registry.exposition(),
+                        content_type='text/plain; version=0.0.4')
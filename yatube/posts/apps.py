@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class PostsConfig(AppConfig):
     name: str = 'posts'
     verbose_name: str = 'Управление постами'
+
+    def ready(self):
+        from . import holes, signals  # noqa: F401
@@ -0,0 +1,54 @@
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+
+from django.conf import settings
+from django.db import connections
+
+from core import metrics
+
+_executors = {}
+_executors_lock = Lock()
+
+
+def get_executor(workers):
+    with _executors_lock:
+        if workers not in _executors:
+            _executors[workers] = ThreadPoolExecutor(
+                max_workers=workers, thread_name_prefix='posts-lookup',
+            )
+        return _executors[workers]
+
+
+def _call(func):
+    stats = metrics.sql_stats.get()
+    try:
+        if stats is None:
+            return func()
+        # Запросы потока пула считаются в метриках запроса страницы.
+        with metrics.count_queries(stats):
+            return func()
+    finally:
+        # У каждого потока пула свои соединения с базами. Поток живёт
+        # дольше запроса, и открытое соединение держало бы транзакцию
+        # и место в пуле базы, пока поток простаивает.
+        for connection in connections.all():
+            connection.close()
+
+
+def run_concurrently(*funcs):
+    """Выполняет независимые запросы страницы в общем пуле потоков
+    размером settings.POSTS_LOOKUP_WORKERS и возвращает их результаты
+    по порядку. При 0 запросы выполняются последовательно.
+
+    Исключения (например, Http404) пробрасываются в вызывающий поток.
+    """
+    workers = settings.POSTS_LOOKUP_WORKERS
+    if not workers or len(funcs) < 2:
+        return [func() for func in funcs]
+    executor = get_executor(workers)
+    # Контекст запроса (например, можно ли читать с реплик,
+    # core.routers) переходит в потоки пула.
+    futures = [executor.submit(contextvars.copy_context().run, _call, func)
+               for func in funcs]
+    return [future.result() for future in futures]
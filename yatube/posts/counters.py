@@ -0,0 +1,80 @@
+from collections import defaultdict
+
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from users.models import Profile
+
+from .models import Comment, Follow, Post, User
+
+
+def _shift(queryset, delta, *fields):
+    queryset.update(**{field: F(field) + delta for field in fields})
+
+
+def post_added(post, delta=1):
+    _shift(Profile.objects.filter(user_id=post.author_id), delta,
+           'posts_count')
+
+
+def comment_added(comment, delta=1, **shifts):
+    """shifts - сдвиги других полей поста тем же UPDATE."""
+    Post.objects.filter(id=comment.post_id).update(
+        comments_count=F('comments_count') + delta,
+        **{field: F(field) + shift for field, shift in shifts.items()},
+    )
+
+
+def follow_added(follow, delta=1):
+    _shift(Profile.objects.filter(user_id=follow.author_id), delta,
+           'followers_count')
+    _shift(Profile.objects.filter(user_id=follow.user_id), delta,
+           'following_count')
+
+
+def shift_many(model, key, field, deltas, **scaled):
+    """Сдвигает field у строк model по словарю {значение key: сдвиг}.
+    Строки с одинаковым сдвигом обновляются одним UPDATE. scaled -
+    {поле: множитель}: эти поля сдвигаются тем же UPDATE на сдвиг,
+    умноженный на множитель."""
+    keys_by_delta = defaultdict(list)
+    for value, delta in deltas.items():
+        if delta:
+            keys_by_delta[delta].append(value)
+    for delta, values in keys_by_delta.items():
+        model.objects.filter(**{f'{key}__in': values}).update(
+            **{field: F(field) + delta},
+            **{other: F(other) + delta * factor
+               for other, factor in scaled.items()},
+        )
+
+
+def count_of(model, field, outer='pk'):
+    """Подзапрос: число строк model, у которых field равно
+    полю outer внешней строки."""
+    return Coalesce(
+        Subquery(
+            model.objects.filter(**{field: OuterRef(outer)})
+                         .order_by()
+                         .values(field)
+                         .annotate(total=Count('pk'))
+                         .values('total')
+        ),
+        0,
+    )
+
+
+def reconcile():
+    """Пересчитывает все счётчики заново одним UPDATE на таблицу."""
+    missing = User.objects.filter(profile__isnull=True).values_list(
+        'id', flat=True)
+    Profile.objects.bulk_create(
+        (Profile(user_id=user_id) for user_id in missing.iterator()),
+        batch_size=500,
+    )
+    Post.objects.update(comments_count=count_of(Comment, 'post'))
+    Profile.objects.update(
+        posts_count=count_of(Post, 'author', 'user_id'),
+        followers_count=count_of(Follow, 'author', 'user_id'),
+        following_count=count_of(Follow, 'user', 'user_id'),
+    )
@@ -0,0 +1,152 @@
+from django.conf import settings
+from django.db import connection
+
+from users.models import Profile
+
+from .models import FeedEntry, Follow, Post
+from .utilities import NUMBER_OF_SHOWN_POSTS, CursorPaginator, keyset_slice
+
+
+def get_celebrity_ids(author_ids):
+    """Авторы из author_ids, чьи посты не раскладываются по лентам."""
+    return set(
+        Profile.objects.filter(
+            user_id__in=author_ids,
+            followers_count__gte=settings.FEED_CELEBRITY_FOLLOWERS,
+        ).values_list('user_id', flat=True)
+    )
+
+
+def is_celebrity(author_id):
+    return bool(get_celebrity_ids([author_id]))
+
+
+def _bulk_insert(entries):
+    batch = []
+    for entry in entries:
+        batch.append(entry)
+        if len(batch) >= settings.FEED_BATCH_SIZE:
+            FeedEntry.objects.bulk_create(batch, ignore_conflicts=True)
+            batch = []
+    if batch:
+        FeedEntry.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+def fan_out_post(post):
+    """Раскладывает новый пост в ленты подписчиков автора."""
+    if is_celebrity(post.author_id):
+        return
+    followers = (Follow.objects.filter(author_id=post.author_id)
+                               .values_list('user_id', flat=True)
+                               .iterator())
+    _bulk_insert(
+        FeedEntry(user_id=user_id, post_id=post.id,
+                  author_id=post.author_id, pub_date=post.pub_date)
+        for user_id in followers
+    )
+
+
+def backfill(user_id, author_id):
+    """Добавляет в ленту подписчика уже опубликованные посты автора."""
+    posts = (Post.objects.filter(author_id=author_id)
+                         .values_list('id', 'pub_date')
+                         .iterator())
+    _bulk_insert(
+        FeedEntry(user_id=user_id, post_id=post_id,
+                  author_id=author_id, pub_date=pub_date)
+        for post_id, pub_date in posts
+    )
+
+
+def on_follow(user_id, author_id):
+    if not is_celebrity(author_id):
+        backfill(user_id, author_id)
+
+
+def on_unfollow(user_id, author_id, followers_before=None):
+    """followers_before - подписчиков автора до отписки (для пачки -
+    до всей пачки); по умолчанию на одного больше, чем сейчас."""
+    FeedEntry.objects.filter(user_id=user_id, author_id=author_id).delete()
+    followers_after = Profile.objects.filter(user_id=author_id).values_list(
+        'followers_count', flat=True).first() or 0
+    if followers_before is None:
+        followers_before = followers_after + 1
+    threshold = settings.FEED_CELEBRITY_FOLLOWERS
+    if followers_before >= threshold > followers_after:
+        # Автор только что перестал быть "знаменитостью": его посты
+        # больше не подмешиваются при чтении, раскладываем их заново.
+        followers = Follow.objects.filter(author_id=author_id)
+        for follower_id in followers.values_list('user_id', flat=True):
+            backfill(follower_id, author_id)
+
+
+def rebuild():
+    """Раскладывает по лентам посты всех подписок, например после
+    загрузки данных в обход сигналов. Уже разложенное не дублируется.
+
+    Одним INSERT ... SELECT: раскладка по каждой подписке отдельно
+    на миллионах записей ленты занимает десятки минут.
+    """
+    ops = connection.ops
+    table = ops.quote_name
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'{ops.insert_statement(ignore_conflicts=True)} '
+            f'{table(FeedEntry._meta.db_table)} '
+            f'(user_id, post_id, author_id, pub_date) '
+            f'SELECT follow.user_id, post.id, post.author_id, post.pub_date '
+            f'FROM {table(Follow._meta.db_table)} follow '
+            f'JOIN {table(Post._meta.db_table)} post '
+            f'ON post.author_id = follow.author_id '
+            f'LEFT JOIN {table(Profile._meta.db_table)} profile '
+            f'ON profile.user_id = follow.author_id '
+            f'WHERE COALESCE(profile.followers_count, 0) < %s'
+            f'{ops.ignore_conflicts_suffix_sql(ignore_conflicts=True)}',
+            [settings.FEED_CELEBRITY_FOLLOWERS],
+        )
+
+
+class FeedPaginator(CursorPaginator):
+    """Курсорный пагинатор ленты подписок.
+
+    Основная часть ленты - диапазон по индексу (user, -pub_date, -post)
+    в FeedEntry; посты "знаменитостей" берутся тем же ключом из Post
+    и сливаются с ней в памяти.
+    """
+    id_field = 'post_id'
+
+    def __init__(self, user, per_page, **kwargs):
+        self.user = user
+        super().__init__(
+            FeedEntry.objects.filter(user=user), per_page, **kwargs
+        )
+
+    def get_key(self, post):
+        return post.pub_date, post.id
+
+    def fetch(self, date, pk, backwards=False):
+        limit = self.per_page + 1
+        post_ids = keyset_slice(
+            self.object_list.values_list('post_id', flat=True),
+            ('pub_date', 'post_id'), date, pk, backwards, limit,
+        )
+        posts = Post.objects.select_related('author', 'group')
+        found = posts.in_bulk(list(post_ids))
+        celebrities = get_celebrity_ids(
+            Follow.objects.filter(user=self.user).values('author_id')
+        )
+        if celebrities:
+            found.update(
+                (post.id, post) for post in keyset_slice(
+                    posts.filter(author_id__in=celebrities),
+                    ('pub_date', 'id'), date, pk, backwards, limit,
+                )
+            )
+        objects = sorted(found.values(), key=self.get_key,
+                         reverse=not backwards)
+        return objects[:limit], date is not None
+
+
+def get_feed_page(request, user):
+    paginator = FeedPaginator(user, NUMBER_OF_SHOWN_POSTS)
+    return paginator.get_page(request.GET.get('cursor'))
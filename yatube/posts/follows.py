@@ -0,0 +1,39 @@
+from django.conf import settings
+from django.core.cache import cache
+
+from . import write_queue
+from .models import Follow
+
+
+def _follow_set_key(user_id):
+    return f'follow_set:{user_id}'
+
+
+def get_follow_set(user_id):
+    """id авторов, на которых подписан пользователь. Набор хранится
+    в кэше и сбрасывается сигналами подписки и отписки; подписки
+    и отписки из очереди записи учитываются сразу."""
+    key = _follow_set_key(user_id)
+    authors = cache.get(key)
+    if authors is None:
+        authors = frozenset(Follow.objects.filter(user_id=user_id)
+                                          .values_list('author_id', flat=True))
+        cache.set(key, authors, settings.FOLLOW_SET_CACHE_TIMEOUT)
+    pending = write_queue.pending_follows(user_id)
+    if pending:
+        authors = (
+            authors | {author for author, follow in pending.items() if follow}
+        ) - {author for author, follow in pending.items() if not follow}
+    return authors
+
+
+def invalidate_follow_set(user_id):
+    cache.delete(_follow_set_key(user_id))
+
+
+def viewer_follow_set(request):
+    """get_follow_set зрителя, один раз на запрос: он нужен каждой
+    карточке страницы."""
+    if not hasattr(request, 'follow_set'):
+        request.follow_set = get_follow_set(request.user.id)
+    return request.follow_set
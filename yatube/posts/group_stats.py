@@ -0,0 +1,187 @@
+"""Статистика активности групп по часовым корзинам.
+
+Сигналы постов и комментариев сдвигают счётчики корзины (группа, час):
+постов, комментариев и уникальных участников - авторов постов
+и комментариев. Итоги скользящего окна GROUP_STATS_WINDOW_HOURS
+по всем группам считаются из корзин по индексу часа и лежат в кэше
+GROUP_STATS_CACHE_TIMEOUT секунд: боковая панель популярных групп
+и статистика страницы группы стоят одного чтения из кэша.
+
+Корзины старше GROUP_STATS_RETENTION_HOURS удаляет, а по постам
+и комментариям пересобирает команда rebuild_group_stats.
+"""
+from collections import Counter, defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, F, Subquery, Sum
+from django.db.models.functions import TruncHour
+from django.utils import timezone
+
+from .models import Comment, GroupActivity, GroupActivityAuthor, Post
+
+STATS_KEY = 'group_stats:window'
+# Вес поста, комментария и участника в рейтинге популярных групп.
+POST_WEIGHT = 3
+COMMENT_WEIGHT = 1
+AUTHOR_WEIGHT = 2
+
+
+def hour_of(moment):
+    return moment.astimezone(timezone.utc).replace(minute=0, second=0,
+                                                   microsecond=0)
+
+
+def _authors_in(group_id, hour, author_model):
+    return Subquery(
+        author_model.objects.filter(group_id=group_id, hour=hour)
+                            .order_by()
+                            .values('group')
+                            .annotate(total=Count('pk'))
+                            .values('total')
+    )
+
+
+def record(events, activity_model=GroupActivity,
+           author_model=GroupActivityAuthor):
+    """Сдвигает корзины по событиям [(группа, время, автор, постов,
+    комментариев)]. События без группы пропускаются; отрицательные
+    сдвиги (удаления) не создают корзин и не убирают участников."""
+    deltas = defaultdict(lambda: [0, 0])
+    authors = set()
+    for group_id, moment, author_id, posts, comments in events:
+        if group_id is None:
+            continue
+        bucket = (group_id, hour_of(moment))
+        deltas[bucket][0] += posts
+        deltas[bucket][1] += comments
+        if posts > 0 or comments > 0:
+            authors.add((*bucket, author_id))
+    active = {(group_id, hour) for group_id, hour, _ in authors}
+    activity_model.objects.bulk_create(
+        [activity_model(group_id=group_id, hour=hour)
+         for group_id, hour in active],
+        ignore_conflicts=True,
+    )
+    author_model.objects.bulk_create(
+        [author_model(group_id=group_id, hour=hour, author_id=author)
+         for group_id, hour, author in authors],
+        ignore_conflicts=True,
+    )
+    for (group_id, hour), (posts, comments) in deltas.items():
+        changes = {'posts': F('posts') + posts,
+                   'comments': F('comments') + comments}
+        if (group_id, hour) in active:
+            changes['authors'] = _authors_in(group_id, hour, author_model)
+        # Событие старше перестройки корзин не уводит счётчик в минус.
+        activity_model.objects.filter(
+            group_id=group_id, hour=hour,
+            posts__gte=-min(posts, 0), comments__gte=-min(comments, 0),
+        ).update(**changes)
+
+
+def post_added(post, delta=1):
+    record([(post.group_id, post.pub_date, post.author_id, delta, 0)])
+
+
+def post_moved(post, previous_group_id):
+    """Пост перенесли из группы previous_group_id в свою нынешнюю.
+    Его комментарии остаются в корзинах прежней группы."""
+    record([(previous_group_id, post.pub_date, post.author_id, -1, 0),
+            (post.group_id, post.pub_date, post.author_id, 1, 0)])
+
+
+def comments_added(comments, groups, delta=1):
+    """Комментарии одной пачкой; groups - {пост: группа}."""
+    record([(groups.get(comment.post_id), comment.created, comment.author_id,
+             0, delta) for comment in comments])
+
+
+def window_start():
+    return (hour_of(timezone.now())
+            - timedelta(hours=settings.GROUP_STATS_WINDOW_HOURS - 1))
+
+
+def compute_window():
+    """Итоги окна: {'groups': {id группы: итоги}, 'trending': [...]}.
+    Участники окна - разные авторы за всё окно, а не сумма по часам,
+    поэтому они берутся из GroupActivityAuthor."""
+    since = window_start()
+    groups = {
+        row.pop('group_id'): row
+        for row in GroupActivity.objects.filter(hour__gte=since)
+                                        .values('group_id', 'group__slug',
+                                                'group__title')
+                                        .annotate(posts=Sum('posts'),
+                                                  comments=Sum('comments'))
+                                        .order_by()
+    }
+    authors = Counter(
+        group_id for group_id, _ in
+        GroupActivityAuthor.objects.filter(hour__gte=since)
+                                   .values_list('group_id', 'author_id')
+                                   .distinct()
+    )
+    for group_id, stats in groups.items():
+        stats['slug'] = stats.pop('group__slug')
+        stats['title'] = stats.pop('group__title')
+        stats['authors'] = authors[group_id]
+        stats['score'] = (stats['posts'] * POST_WEIGHT
+                          + stats['comments'] * COMMENT_WEIGHT
+                          + stats['authors'] * AUTHOR_WEIGHT)
+    trending = sorted(groups.values(),
+                      key=lambda stats: (-stats['score'], stats['slug']))
+    return {'groups': groups,
+            'trending': trending[:settings.GROUP_TRENDING_SIZE]}
+
+
+def window_stats():
+    """Итоги окна из кэша; пересчитываются не чаще раза
+    в GROUP_STATS_CACHE_TIMEOUT секунд."""
+    stats = cache.get(STATS_KEY)
+    if stats is None:
+        stats = compute_window()
+        cache.set(STATS_KEY, stats, settings.GROUP_STATS_CACHE_TIMEOUT)
+    return stats
+
+
+def viewer_window_stats(request):
+    """window_stats один раз на запрос: из него читают и панель
+    популярных групп, и статистика страницы группы."""
+    if not hasattr(request, 'group_window_stats'):
+        request.group_window_stats = window_stats()
+    return request.group_window_stats
+
+
+def rebuild(hours, post_model=Post, comment_model=Comment,
+            activity_model=GroupActivity, author_model=GroupActivityAuthor):
+    """Пересобирает корзины последних hours часов по постам
+    и комментариям и удаляет более старые. Нужен после импорта мимо
+    сигналов; миграция передаёт свои исторические модели.
+    Возвращает число корзин."""
+    since = hour_of(timezone.now()) - timedelta(hours=hours - 1)
+    activity_model.objects.all().delete()
+    author_model.objects.all().delete()
+    hour = TruncHour('pub_date', tzinfo=timezone.utc)
+    posts = (post_model.objects.filter(pub_date__gte=since,
+                                       group__isnull=False)
+                               .annotate(hour=hour)
+                               .values_list('group_id', 'hour', 'author_id')
+                               .annotate(total=Count('pk'))
+                               .order_by())
+    hour = TruncHour('created', tzinfo=timezone.utc)
+    comments = (comment_model.objects.filter(created__gte=since,
+                                             post__group__isnull=False)
+                                     .annotate(hour=hour)
+                                     .values_list('post__group_id', 'hour',
+                                                  'author_id')
+                                     .annotate(total=Count('pk'))
+                                     .order_by())
+    record([(group_id, moment, author_id, total, 0)
+            for group_id, moment, author_id, total in posts.iterator()]
+           + [(group_id, moment, author_id, 0, total)
+              for group_id, moment, author_id, total in comments.iterator()],
+           activity_model, author_model)
+    cache.delete(STATS_KEY)
+    return activity_model.objects.count()
@@ -0,0 +1,55 @@
+"""Дыры страниц постов (core.holes): всё, что зависит от зрителя,
+и статистика групп, которая свежее закэшированной страницы."""
+from django.conf import settings
+
+from core.holes import register
+
+from . import write_queue
+from .group_stats import viewer_window_stats
+from .follows import viewer_follow_set
+from .forms import CommentForm
+
+
+def post_controls(request, post_id, author_id, author, follow_buttons):
+    is_author = request.user.id == author_id
+    following = None
+    if follow_buttons and request.user.is_authenticated and not is_author:
+        following = author_id in viewer_follow_set(request)
+    return {'is_author': is_author, 'following': following}
+
+
+def profile_follow(request, author_id, author):
+    return {'following': request.user.is_authenticated
+            and author_id in viewer_follow_set(request)}
+
+
+def post_edit_link(request, post_id, author_id):
+    return {'is_author': request.user.id == author_id}
+
+
+def comment_form(request, post_id):
+    return {'form': CommentForm()}
+
+
+def pending_comments(request, post_id):
+    return {'pending_comments': write_queue.pending_comments(request.user.id,
+                                                             post_id)}
+
+
+def trending_groups(request):
+    return {'trending': viewer_window_stats(request)['trending']}
+
+
+def group_stats(request, group_id):
+    return {'stats': viewer_window_stats(request)['groups'].get(group_id),
+            'hours': settings.GROUP_STATS_WINDOW_HOURS}
+
+
+register('post_controls', 'holes/post_controls.html', post_controls)
+register('profile_follow', 'holes/profile_follow.html', profile_follow)
+register('post_edit_link', 'holes/post_edit_link.html', post_edit_link)
+register('comment_form', 'holes/comment_form.html', comment_form)
+register('pending_comments', 'holes/pending_comments.html',
+         pending_comments)
+register('trending_groups', 'holes/trending_groups.html', trending_groups)
+register('group_stats', 'holes/group_stats.html', group_stats)
@@ -0,0 +1,93 @@
+"""Рейтинг горячей ленты: свежесть, скорость комментариев и
+подписчики автора.
+
+Рейтинг хранится в индексированном поле Post.hot_score и не считается
+на запрос. Новый пост получает POST_WEIGHT и надбавку за подписчиков
+автора, каждый комментарий - COMMENT_WEIGHT. Команда decay_hot_scores
+раз в HOT_DECAY_INTERVAL_MINUTES умножает все рейтинги на один
+множитель с периодом полураспада HOT_HALF_LIFE_HOURS: вклад старых
+событий затухает, поэтому наверху посты со свежими комментариями.
+Порядок постов от одинакового множителя не меняется, так что лента
+листается по индексу (hot_score, id), как хронологическая по дате.
+"""
+import math
+from collections import defaultdict
+
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
+
+from users.models import Profile
+
+from .models import Comment, Post
+
+HOT_SCOPE = 'hot'
+POST_WEIGHT = 10
+COMMENT_WEIGHT = 1
+FOLLOWERS_WEIGHT = 1
+REBUILD_BATCH_SIZE = 500
+
+
+def followers_bonus(followers):
+    return FOLLOWERS_WEIGHT * math.log2(1 + followers)
+
+
+def initial_score(author_id):
+    """Рейтинг нового поста автора author_id."""
+    followers = (Profile.objects.filter(user_id=author_id)
+                                .values_list('followers_count', flat=True)
+                                .first()) or 0
+    return POST_WEIGHT + followers_bonus(followers)
+
+
+def decay_factor(minutes):
+    """Множитель затухания за minutes минут."""
+    return 0.5 ** (minutes / (settings.HOT_HALF_LIFE_HOURS * 60))
+
+
+def decay(minutes):
+    """Затухание за minutes минут. Рейтинги ниже HOT_SCORE_FLOOR
+    обнуляются, чтобы следующие проходы их не трогали. Возвращает
+    число обновлённых постов."""
+    floor = settings.HOT_SCORE_FLOOR
+    updated = Post.objects.filter(hot_score__gte=floor).update(
+        hot_score=F('hot_score') * decay_factor(minutes))
+    Post.objects.filter(hot_score__gt=0, hot_score__lt=floor).update(
+        hot_score=0)
+    return updated
+
+
+def _age_factor(moment, now):
+    return decay_factor(max((now - moment).total_seconds(), 0) / 60)
+
+
+def rebuild(post_model=Post, comment_model=Comment, profile_model=Profile):
+    """Считает рейтинги заново по постам, комментариям и нынешним
+    подписчикам авторов, как если бы затухание шло непрерывно.
+    Нужен после импорта постов мимо сигналов; миграция передаёт
+    свои исторические модели. Возвращает число постов с ненулевым
+    рейтингом."""
+    now = timezone.now()
+    comments = defaultdict(float)
+    for post_id, created in (comment_model.objects.order_by()
+                                                  .values_list('post_id',
+                                                               'created')
+                                                  .iterator()):
+        comments[post_id] += COMMENT_WEIGHT * _age_factor(created, now)
+    followers = dict(profile_model.objects.values_list('user_id',
+                                                       'followers_count'))
+    posts, hot = [], 0
+    for post in (post_model.objects.order_by('id')
+                                   .only('id', 'pub_date', 'author_id')
+                                   .iterator()):
+        score = ((POST_WEIGHT + followers_bonus(followers.get(post.author_id,
+                                                              0)))
+                 * _age_factor(post.pub_date, now) + comments[post.id])
+        post.hot_score = score if score >= settings.HOT_SCORE_FLOOR else 0
+        hot += post.hot_score > 0
+        posts.append(post)
+        if len(posts) == REBUILD_BATCH_SIZE:
+            post_model.objects.bulk_update(posts, ['hot_score'])
+            posts = []
+    post_model.objects.bulk_update(posts, ['hot_score'])
+    return hot
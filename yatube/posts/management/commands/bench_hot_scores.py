@@ -0,0 +1,78 @@
+import random
+import time
+from collections import Counter
+from types import SimpleNamespace
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts import counters, hot
+from posts.models import Post, User
+from posts.utilities import CursorPaginator, HotPaginator
+
+BENCH_USERNAME = 'bench-hot-scores'
+BATCH_SIZE = 200
+
+
+def timed(function, *args):
+    started = time.perf_counter()
+    function(*args)
+    return time.perf_counter() - started
+
+
+class Command(BaseCommand):
+    help = ('Измеряет скорость обновления рейтингов горячей ленты: '
+            'по комментарию, пачками из очереди записи и затуханием, '
+            'и стоимость страниц горячей и хронологической ленты. '
+            'Все изменения откатываются.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, default=10000)
+        parser.add_argument('--comments', type=int, default=2000)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        rnd = random.Random(options['seed'])
+        with transaction.atomic():
+            self.run(rnd, options['posts'], options['comments'])
+            transaction.set_rollback(True)
+
+    def run(self, rnd, posts, comments):
+        author = User.objects.create(username=BENCH_USERNAME)
+        Post.objects.bulk_create(
+            (Post(text=f'Пост {number}', author=author,
+                  hot_score=rnd.uniform(0, hot.POST_WEIGHT))
+             for number in range(posts)),
+            batch_size=500,
+        )
+        ids = list(Post.objects.filter(author=author)
+                               .values_list('id', flat=True))
+        targets = [rnd.choice(ids) for _ in range(comments)]
+
+        def one_by_one():
+            for post_id in targets:
+                counters.comment_added(SimpleNamespace(post_id=post_id),
+                                       hot_score=hot.COMMENT_WEIGHT)
+
+        def batched():
+            for start in range(0, len(targets), BATCH_SIZE):
+                batch = Counter(targets[start:start + BATCH_SIZE])
+                counters.shift_many(Post, 'id', 'comments_count', batch,
+                                    hot_score=hot.COMMENT_WEIGHT)
+
+        for name, function in (('по одному', one_by_one),
+                               (f'пачками по {BATCH_SIZE}', batched)):
+            elapsed = timed(function)
+            self.stdout.write(f'Комментарии {name}: '
+                              f'{comments / elapsed:.0f} обновлений/с')
+        elapsed = timed(hot.decay, 60)
+        self.stdout.write(f'Затухание {posts} рейтингов: '
+                          f'{elapsed * 1000:.1f} мс')
+        queryset = Post.objects.select_related('author', 'group')
+        for name, paginator_class in (('горячая', HotPaginator),
+                                      ('хронологическая', CursorPaginator)):
+            paginator = paginator_class(queryset, 10)
+            first = paginator.get_page(None)
+            elapsed = timed(paginator.get_page, first.next_cursor)
+            self.stdout.write(f'Лента {name}: страница по курсору '
+                              f'{elapsed * 1000:.2f} мс')
@@ -0,0 +1,101 @@
+import os
+import random
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from PIL import Image, ImageDraw, ImageFilter, ImageOps
+
+from posts.renditions import (FORMATS, available_formats, encode, load_image,
+                              variant_sizes)
+
+# Прежняя единственная миниатюра: JPEG 960x339 с качеством sorl
+# по умолчанию.
+BASELINE_QUALITY = 95
+
+
+def synthetic_corpus(count, seed):
+    """Картинки, похожие на фотографии: градиент, пятна и шум.
+    Плоские заливки жмутся нереально хорошо."""
+    rnd = random.Random(seed)
+    for _ in range(count):
+        width, height = rnd.choice(((1600, 1200), (1920, 1080), (1200, 1600)))
+        image = Image.linear_gradient('L').resize((width, height)).convert(
+            'RGB')
+        draw = ImageDraw.Draw(image)
+        for _ in range(30):
+            x, y = rnd.randrange(width), rnd.randrange(height)
+            radius = rnd.randrange(20, 300)
+            draw.ellipse((x, y, x + radius, y + radius),
+                         fill=tuple(rnd.randrange(256) for _ in range(3)))
+        image = image.filter(ImageFilter.GaussianBlur(3))
+        noise = Image.effect_noise((width, height), 24).convert('RGB')
+        yield Image.blend(image, noise, 0.15)
+
+
+def directory_corpus(directory, count):
+    names = sorted(os.listdir(directory))[:count]
+    for name in names:
+        with open(os.path.join(directory, name), 'rb') as stream:
+            try:
+                yield load_image(stream)
+            except OSError:
+                continue
+
+
+class Command(BaseCommand):
+    help = ('Замеряет размер и скорость кодирования вариантов картинок '
+            'из POST_IMAGE_RENDITIONS по ширинам и форматам и сравнивает '
+            'с прежней единственной миниатюрой JPEG.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rendition', default='card')
+        parser.add_argument('--directory',
+                            help='Каталог с картинками; без него - '
+                                 'синтетические')
+        parser.add_argument('--count', type=int, default=20)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        spec = settings.POST_IMAGE_RENDITIONS.get(options['rendition'])
+        if spec is None:
+            raise CommandError(f'Нет варианта {options["rendition"]}')
+        formats = available_formats(spec.get('formats', ('jpeg',)))
+        missing = set(spec.get('formats', ())) - set(formats)
+        if missing:
+            self.stdout.write('Pillow не умеет: ' + ', '.join(sorted(missing)))
+        corpus = (directory_corpus(options['directory'], options['count'])
+                  if options['directory']
+                  else synthetic_corpus(options['count'], options['seed']))
+        sizes = defaultdict(int)
+        seconds = defaultdict(float)
+        baseline = images = 0
+        for image in corpus:
+            images += 1
+            variants = variant_sizes(image, spec)
+            largest = ImageOps.fit(image, variants[-1], Image.LANCZOS)
+            baseline += len(encode(largest, 'jpeg', BASELINE_QUALITY))
+            for width, height in variants:
+                resized = largest.resize((width, height), Image.LANCZOS)
+                for file_format in formats:
+                    started = time.perf_counter()
+                    content = encode(resized, file_format,
+                                     settings.POST_IMAGE_QUALITY[file_format])
+                    seconds[file_format] += time.perf_counter() - started
+                    sizes[file_format, width] += len(content)
+        if not images:
+            raise CommandError('Нет картинок')
+        self.stdout.write(f'Картинок: {images}, прежняя миниатюра: '
+                          f'{baseline / images / 1024:.1f} КиБ')
+        for file_format in formats:
+            self.stdout.write(
+                f'{FORMATS[file_format][1]}: кодирование всех ширин '
+                f'{images / seconds[file_format]:.1f} картинок/с'
+            )
+            for (size_format, width), total in sorted(sizes.items()):
+                if size_format == file_format:
+                    self.stdout.write(
+                        f'  {width}w: {total / images / 1024:.1f} КиБ, '
+                        f'{total / baseline:.0%} прежней'
+                    )
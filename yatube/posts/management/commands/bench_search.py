@@ -0,0 +1,110 @@
+import itertools
+import os
+import random
+import sqlite3
+import statistics
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.search import FTS_TABLE
+
+SYLLABLES = ('ка', 'ло', 'ми', 'ра', 'ту', 'не', 'со', 'ви', 'да', 'пе',
+             'ро', 'зу', 'ба', 'ли', 'го', 'те')
+BATCH_SIZE = 10000
+
+
+def make_vocabulary(size, rnd):
+    words = set()
+    while len(words) < size:
+        words.add(''.join(rnd.choices(SYLLABLES, k=rnd.randint(2, 4))))
+    return sorted(words)
+
+
+def make_texts(count, vocabulary, rnd):
+    """Тексты со словами по закону Ципфа: есть и частые, и редкие."""
+    weights = [1 / rank for rank in range(1, len(vocabulary) + 1)]
+    for _ in range(count):
+        yield ' '.join(rnd.choices(vocabulary, weights, k=rnd.randint(5, 40)))
+
+
+def timed(db, sql, params, repeat):
+    latencies = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        db.execute(sql, params).fetchall()
+        latencies.append(time.perf_counter() - started)
+    return statistics.median(latencies)
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает поиск по тексту постов через LIKE \'%слово%\' '
+            'и через индекс FTS5 на синтетической базе SQLite '
+            'во временном файле.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, default=1000000)
+        parser.add_argument('--vocabulary', type=int, default=50000)
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--limit', type=int, default=10)
+
+    def handle(self, *args, **options):
+        rnd = random.Random(0)
+        vocabulary = make_vocabulary(options['vocabulary'], rnd)
+        handle, path = tempfile.mkstemp(suffix='.sqlite3')
+        os.close(handle)
+        db = sqlite3.connect(path)
+        try:
+            try:
+                db.execute(f'CREATE VIRTUAL TABLE {FTS_TABLE} '
+                           f"USING fts5(body, tokenize='unicode61')")
+            except sqlite3.OperationalError:
+                raise CommandError('SQLite собран без FTS5')
+            db.execute('CREATE TABLE posts_post '
+                       '(id INTEGER PRIMARY KEY, text TEXT NOT NULL)')
+            self.stdout.write(f'Создаю {options["posts"]} постов...')
+            texts = make_texts(options['posts'], vocabulary, rnd)
+            rows = list(itertools.islice(enumerate(texts), BATCH_SIZE))
+            while rows:
+                db.executemany('INSERT INTO posts_post VALUES (?, ?)', rows)
+                db.executemany(f'INSERT INTO {FTS_TABLE}(rowid, body) '
+                               f'VALUES (?, ?)', rows)
+                rows = list(itertools.islice(enumerate(texts, rows[-1][0] + 1),
+                                             BATCH_SIZE))
+            db.commit()
+            queries = {
+                'частое слово': vocabulary[0],
+                'среднее слово': vocabulary[len(vocabulary) // 100],
+                'редкое слово': vocabulary[-1],
+                'два слова': f'{vocabulary[1]} {vocabulary[50]}',
+            }
+            for name, query in queries.items():
+                words = query.split()
+                like = ('SELECT id FROM posts_post WHERE '
+                        + ' AND '.join(['text LIKE ?'] * len(words))
+                        + ' ORDER BY id DESC LIMIT ?')
+                like_time = timed(
+                    db, like,
+                    [f'%{word}%' for word in words] + [options['limit']],
+                    options['repeat'],
+                )
+                match = [' '.join(f'"{word}"' for word in words),
+                         options['limit']]
+                fts = (f'SELECT rowid FROM {FTS_TABLE} '
+                       f'WHERE {FTS_TABLE} MATCH ? ORDER BY {{}} LIMIT ?')
+                ranked_time = timed(db, fts.format('rank'), match,
+                                    options['repeat'])
+                newest_time = timed(db, fts.format('rowid DESC'), match,
+                                    options['repeat'])
+                # LIKE без ранжирования останавливается на первых limit
+                # совпадениях, поэтому сравнивать его честно с FTS5
+                # по свежести; ранжирование bm25 читает все совпадения.
+                self.stdout.write(
+                    f'{name} ({query}): LIKE {like_time * 1000:.1f} мс, '
+                    f'FTS5 по свежести {newest_time * 1000:.1f} мс, '
+                    f'FTS5 bm25 {ranked_time * 1000:.1f} мс'
+                )
+        finally:
+            db.close()
+            os.remove(path)
@@ -0,0 +1,66 @@
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from posts.models import Post
+
+NO_CACHE = {
+    'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'},
+}
+
+
+def get_paths():
+    post = (Post.objects.select_related('author', 'group')
+                        .filter(group__isnull=False)
+                        .first())
+    if post is None:
+        raise CommandError('В базе нет постов с группой, нечего измерять')
+    return [
+        reverse('posts:index'),
+        reverse('posts:group_list', args=[post.group.slug]),
+        reverse('posts:profile', args=[post.author.username]),
+        reverse('posts:post_detail', args=[post.id]),
+    ]
+
+
+def measure(paths, requests, concurrency):
+    def fetch(number):
+        client = Client()
+        started = time.perf_counter()
+        client.get(paths[number % len(paths)])
+        return time.perf_counter() - started
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as executor:
+        latencies = sorted(executor.map(fetch, range(requests)))
+    elapsed = time.perf_counter() - started
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+    return requests / elapsed, statistics.median(latencies), p99
+
+
+class Command(BaseCommand):
+    help = ('Нагружает страницы постов параллельными запросами и '
+            'сравнивает последовательные и параллельные запросы страницы '
+            '(POSTS_LOOKUP_WORKERS). Кэш страниц на время замера '
+            'отключается.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=400)
+        parser.add_argument('--concurrency', type=int, default=8)
+        parser.add_argument('--workers', type=int, default=4)
+
+    def handle(self, *args, **options):
+        paths = get_paths()
+        for workers in (0, options['workers']):
+            with override_settings(CACHES=NO_CACHE,
+                                   POSTS_LOOKUP_WORKERS=workers):
+                rps, median, p99 = measure(
+                    paths, options['requests'], options['concurrency'])
+            self.stdout.write(
+                f'POSTS_LOOKUP_WORKERS={workers}: {rps:.1f} запросов/с, '
+                f'медиана {median * 1000:.1f} мс, p99 {p99 * 1000:.1f} мс'
+            )
@@ -0,0 +1,32 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts import hot, page_cache
+
+
+class Command(BaseCommand):
+    help = ('Гасит рейтинги горячей ленты за прошедший интервал. '
+            'Запускается по расписанию раз в HOT_DECAY_INTERVAL_MINUTES; '
+            'с --rebuild считает рейтинги заново.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--minutes', type=float,
+            default=settings.HOT_DECAY_INTERVAL_MINUTES,
+            help='Сколько минут прошло с прошлого запуска',
+        )
+        parser.add_argument(
+            '--rebuild', action='store_true',
+            help='Пересчитать рейтинги по постам и комментариям',
+        )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            if options['rebuild']:
+                updated = hot.rebuild()
+            else:
+                updated = hot.decay(options['minutes'])
+        page_cache.bump(hot.HOT_SCOPE)
+        self.stdout.write(self.style.SUCCESS(
+            f'Обновлено рейтингов: {updated}'))
@@ -0,0 +1,89 @@
+import re
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from posts.models import Comment, FeedEntry, Follow, Post
+from posts.utilities import (NUMBER_OF_SHOWN_COMMENTS, NUMBER_OF_SHOWN_POSTS,
+                             keyset_slice)
+
+# Признаки плохого плана: полный просмотр таблицы или сортировка
+# во временной структуре вместо чтения по индексу.
+BAD_PLAN_PATTERNS = {
+    'sqlite': (
+        re.compile(r'\bSCAN (TABLE )?\w+(?! USING)(\s|$)'),
+        re.compile(r'TEMP B-TREE'),
+    ),
+    'postgresql': (
+        re.compile(r'Seq Scan'),
+        re.compile(r'\bSort\b'),
+    ),
+}
+
+
+def get_view_querysets(pk=1):
+    """Запросы, которые выполняют страницы постов. Для постраничных
+    запросов берётся и первая страница, и страница по курсору."""
+    limit = NUMBER_OF_SHOWN_POSTS + 1
+    posts = Post.objects.select_related('author', 'group')
+    feed = FeedEntry.objects.filter(user_id=pk).values_list('post_id')
+    pages = {
+        'index': posts,
+        'group_posts': posts.filter(group__slug='slug'),
+        'profile': posts.filter(author__username='username'),
+        'follow_index': feed,
+    }
+    querysets = {}
+    for name, queryset in pages.items():
+        fields = ('pub_date', 'post_id' if name == 'follow_index' else 'id')
+        for suffix, date in (('', None), (' (cursor)', timezone.now())):
+            querysets[name + suffix] = keyset_slice(
+                queryset, fields, date, pk, False, limit
+            )
+    for suffix, score in (('', None), (' (cursor)', 1.0)):
+        querysets['hot' + suffix] = keyset_slice(
+            posts, ('hot_score', 'id'), score, pk, False, limit
+        )
+    comments = Comment.objects.select_related('author').filter(post_id=pk)
+    for suffix, date in (('', None), (' (cursor)', timezone.now())):
+        querysets['post_detail comments' + suffix] = keyset_slice(
+            comments, ('created', 'id'), date, pk, False,
+            NUMBER_OF_SHOWN_COMMENTS + 1,
+        )
+    querysets.update({
+        'follow (user, author)': Follow.objects.filter(user_id=pk,
+                                                       author_id=pk),
+        'follow by user': Follow.objects.filter(user_id=pk),
+        'follow by author': Follow.objects.filter(author_id=pk)
+                                          .values_list('user_id'),
+    })
+    return querysets
+
+
+class Command(BaseCommand):
+    help = ('Выполняет EXPLAIN для запросов страниц постов и падает, '
+            'если какой-то из них читает таблицу целиком '
+            'или сортирует во временной структуре.')
+
+    def handle(self, *args, **options):
+        patterns = BAD_PLAN_PATTERNS.get(connection.vendor)
+        if patterns is None:
+            raise CommandError(
+                f'Проверка планов для {connection.vendor} не поддерживается'
+            )
+        failed = []
+        for name, queryset in get_view_querysets().items():
+            plan = queryset.explain()
+            bad = [line for line in plan.splitlines()
+                   if any(pattern.search(line) for pattern in patterns)]
+            if bad:
+                failed.append(name)
+                self.stdout.write(self.style.ERROR(f'{name}:'))
+                self.stdout.write(plan)
+            else:
+                self.stdout.write(self.style.SUCCESS(f'{name}: OK'))
+        if failed:
+            raise CommandError(
+                'Запросы без подходящего индекса: ' + ', '.join(failed)
+            )
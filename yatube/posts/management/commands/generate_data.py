@@ -0,0 +1,190 @@
+import itertools
+import os
+import random
+import shutil
+import tempfile
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from faker import Faker
+from PIL import Image, ImageDraw
+
+from posts.transfer import TABLES_BY_NAME, write_rows
+
+IMAGE_DIRECTORY = 'posts/synthetic'
+IMAGE_SIZE = (960, 540)
+
+
+def zipf_cum_weights(count, exponent=1.1):
+    """Накопленные веса закона Ципфа для random.choices: первый
+    элемент самый популярный, у длинного хвоста почти ничего."""
+    return list(itertools.accumulate(
+        1 / rank ** exponent for rank in range(1, count + 1)
+    ))
+
+
+def make_images(count, rnd):
+    """Картинки для постов в MEDIA_ROOT; возвращает их имена."""
+    os.makedirs(os.path.join(settings.MEDIA_ROOT, IMAGE_DIRECTORY),
+                exist_ok=True)
+    names = []
+    for number in range(count):
+        color = tuple(rnd.randrange(256) for _ in range(3))
+        image = Image.new('RGB', IMAGE_SIZE, color)
+        draw = ImageDraw.Draw(image)
+        for _ in range(5):
+            x, y = rnd.randrange(IMAGE_SIZE[0]), rnd.randrange(IMAGE_SIZE[1])
+            draw.ellipse((x, y, x + 200, y + 200),
+                         fill=tuple(rnd.randrange(256) for _ in range(3)))
+        name = f'{IMAGE_DIRECTORY}/{number}.png'
+        image.save(os.path.join(settings.MEDIA_ROOT, name))
+        names.append(name)
+    return names
+
+
+class Generator:
+    """Синтетические данные с перекосами, как на живом сайте: немногие
+    авторы пишут и собирают подписчиков больше всех (закон Ципфа),
+    посты сосредоточены в нескольких горячих группах, а на немногие
+    посты приходится шквал комментариев."""
+
+    def __init__(self, options):
+        self.options = options
+        self.rnd = random.Random(options['seed'])
+        fake = Faker('ru_RU')
+        fake.seed_instance(options['seed'])
+        self.fake = fake
+        self.words = fake.words(3000)
+        self.words_weights = zipf_cum_weights(len(self.words))
+        self.users_weights = zipf_cum_weights(options['users'])
+        self.groups_weights = zipf_cum_weights(options['groups'])
+        self.now = timezone.now()
+        self.post_dates = []
+
+    def text(self, low, high):
+        words = self.rnd.choices(self.words, cum_weights=self.words_weights,
+                                 k=self.rnd.randint(low, high))
+        return ' '.join(words).capitalize()
+
+    def popular_user(self):
+        return self.rnd.choices(range(1, self.options['users'] + 1),
+                                cum_weights=self.users_weights)[0]
+
+    def past(self, days):
+        return self.now - timedelta(seconds=self.rnd.uniform(0, days * 86400))
+
+    def users(self):
+        password = make_password(self.options['password'])
+        prefix = self.options['prefix']
+        for pk in range(1, self.options['users'] + 1):
+            yield (pk, f'{prefix}{pk}', password, self.fake.first_name(),
+                   self.fake.last_name(), '', False, True, False, None,
+                   self.past(self.options['days']))
+
+    def groups(self):
+        prefix = self.options['prefix']
+        for pk in range(1, self.options['groups'] + 1):
+            yield (pk, self.text(1, 3)[:200], f'{prefix}group-{pk}',
+                   self.text(5, 20))
+
+    def posts(self, images):
+        groups = range(1, self.options['groups'] + 1)
+        for pk in range(1, self.options['posts'] + 1):
+            group = None
+            if groups and self.rnd.random() < 0.7:
+                group = self.rnd.choices(
+                    groups, cum_weights=self.groups_weights)[0]
+            image = None
+            if images and self.rnd.random() < self.options['image_share']:
+                image = self.rnd.choice(images)
+            pub_date = self.past(self.options['days'])
+            self.post_dates.append(pub_date)
+            yield (pk, self.text(5, 60), pub_date, self.popular_user(),
+                   group, image, 1)
+
+    def comments(self):
+        posts = len(self.post_dates)
+        storm = self.rnd.sample(range(1, posts + 1),
+                                min(self.options['storm_posts'], posts))
+        for pk in range(1, self.options['comments'] + 1):
+            if storm and self.rnd.random() < self.options['storm_share']:
+                post = self.rnd.choice(storm)
+            else:
+                post = self.rnd.randint(1, posts)
+            pub_date = self.post_dates[post - 1]
+            created = pub_date + (self.now - pub_date) * self.rnd.random()
+            yield (pk, post, self.popular_user(), self.text(2, 20), created)
+
+    def follows(self):
+        users = self.options['users']
+        pk = itertools.count(1)
+        for user in range(1, users + 1):
+            wanted = min(users - 1, int(self.rnd.paretovariate(1.2)) * 3)
+            authors = set()
+            # Хвост распределения выпадает редко, поэтому число попыток
+            # ограничено: подписок может выйти чуть меньше wanted.
+            for _ in range(wanted * 10):
+                if len(authors) >= wanted:
+                    break
+                author = self.popular_user()
+                if author != user:
+                    authors.add(author)
+            for author in sorted(authors):
+                yield next(pk), user, author
+
+
+class Command(BaseCommand):
+    help = ('Создаёт синтетические данные с перекосами живого сайта: '
+            'степенное распределение подписчиков, горячие группы, посты '
+            'с картинками и шквалы комментариев. Данные пишутся в NDJSON '
+            'и загружаются командой yatube_import.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--groups', type=int, default=20)
+        parser.add_argument('--posts', type=int, default=20000)
+        parser.add_argument('--comments', type=int, default=50000)
+        parser.add_argument('--images', type=int, default=10,
+                            help='Сколько разных картинок сделать')
+        parser.add_argument('--image-share', type=float, default=0.2,
+                            help='Доля постов с картинкой')
+        parser.add_argument('--storm-posts', type=int, default=5,
+                            help='Сколько постов собирают шквал комментариев')
+        parser.add_argument('--storm-share', type=float, default=0.5,
+                            help='Доля комментариев под этими постами')
+        parser.add_argument('--days', type=int, default=365)
+        parser.add_argument('--prefix', default='load_',
+                            help='Приставка имён пользователей и слагов')
+        parser.add_argument('--password', default='yatube-load',
+                            help='Пароль всех созданных пользователей')
+        parser.add_argument('--workers', type=int, default=4)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        generator = Generator(options)
+        images = make_images(options['images'], generator.rnd)
+        directory = tempfile.mkdtemp()
+        sources = (
+            ('users', generator.users()),
+            ('groups', generator.groups()),
+            ('posts', generator.posts(images)),
+            ('comments', generator.comments()),
+            ('follows', generator.follows()),
+        )
+        try:
+            for name, rows in sources:
+                table = TABLES_BY_NAME[name]
+                with open(table.path(directory, 'ndjson'), 'w',
+                          encoding='utf-8') as stream:
+                    write_rows(stream, 'ndjson', table.fields, rows)
+            call_command('yatube_import', directory,
+                         workers=options['workers'], stdout=self.stdout)
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+        if images:
+            self.stdout.write('Миниатюры картинок делает команда '
+                              'generate_thumbnails')
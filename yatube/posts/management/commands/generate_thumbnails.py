@@ -0,0 +1,70 @@
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+from django.core.management.base import BaseCommand
+
+from posts import thumbnails
+from posts.renditions import init_worker, render_renditions
+from posts.models import Post
+
+BATCH_SIZE = 500
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = ('Делает миниатюры для картинок уже опубликованных постов, '
+            'у которых их ещё нет.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=4,
+            help='Число процессов; 0 - делать в текущем процессе',
+        )
+        parser.add_argument(
+            '--force', action='store_true',
+            help='Переделать миниатюры и у постов, где они уже есть',
+        )
+
+    def handle(self, *args, **options):
+        posts = Post.objects.exclude(image='').exclude(image__isnull=True)
+        if not options['force']:
+            posts = posts.filter(thumbnails='')
+        posts = list(posts.values_list('id', 'image'))
+        executor = None
+        if options['workers']:
+            executor = ProcessPoolExecutor(
+                max_workers=options['workers'],
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=init_worker,
+            )
+        done = failed = 0
+        try:
+            for start in range(0, len(posts), BATCH_SIZE):
+                batch = posts[start:start + BATCH_SIZE]
+                if executor is not None:
+                    results = [executor.submit(render_renditions, image).result
+                               for _, image in batch]
+                else:
+                    results = [partial(render_renditions, image)
+                               for _, image in batch]
+                for (post_id, image), result in zip(batch, results):
+                    # Битая или пропавшая картинка не останавливает
+                    # остальные: ошибка пишется в лог, как в
+                    # thumbnails.generate.
+                    try:
+                        renditions = result()
+                    except Exception:
+                        logger.exception(
+                            'Не удалось сделать миниатюры поста %s', post_id)
+                        failed += 1
+                        continue
+                    thumbnails.save_renditions(post_id, image, renditions)
+                    done += 1
+        finally:
+            if executor is not None:
+                executor.shutdown()
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово постов: {done}, с ошибками: {failed}'))
@@ -0,0 +1,258 @@
+import json
+import statistics
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+
+import requests
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.models import Group, Post
+from users.models import Profile
+
+from .bench_views import NO_CACHE
+
+Target = namedtuple('Target', 'method path data login')
+Result = namedtuple('Result', 'latency status queries')
+
+
+def get_targets():
+    """Адреса для нагрузки: самая горячая группа, самый популярный
+    автор, пост с наибольшим числом комментариев, а для ленты и правок -
+    пользователь с наибольшим числом подписок."""
+    group = (Group.objects.annotate(total=Count('posts'))
+                          .order_by('-total').first())
+    author = Profile.objects.select_related('user').order_by(
+        '-followers_count').first()
+    viewer = Profile.objects.select_related('user').order_by(
+        '-following_count').first()
+    post = Post.objects.order_by('-comments_count').first()
+    if None in (group, author, viewer, post):
+        raise CommandError('В базе мало данных, запустите generate_data')
+    author = author.user.username
+    targets = {
+        'index': Target('get', reverse('posts:index'), None, False),
+        'group_list': Target(
+            'get', reverse('posts:group_list', args=[group.slug]),
+            None, False),
+        'profile': Target(
+            'get', reverse('posts:profile', args=[author]), None, False),
+        'post_detail': Target(
+            'get', reverse('posts:post_detail', args=[post.id]),
+            None, False),
+        'follow_index': Target(
+            'get', reverse('posts:follow_index'), None, True),
+        'post_create': Target(
+            'post', reverse('posts:post_create'),
+            {'text': 'Пост из нагрузочного теста'}, True),
+        'add_comment': Target(
+            'post', reverse('posts:add_comment', args=[post.id]),
+            {'text': 'Комментарий из нагрузочного теста'}, True),
+        'profile_follow': Target(
+            'get', reverse('posts:profile_follow', args=[author]),
+            None, True),
+        'profile_unfollow': Target(
+            'get', reverse('posts:profile_unfollow', args=[author]),
+            None, True),
+    }
+    return targets, viewer.user
+
+
+class ClientRunner:
+    """Запросы через тестовый клиент Django в этом же процессе,
+    с подсчётом SQL-запросов на каждый запрос."""
+
+    def __init__(self, viewer):
+        self.viewer = viewer
+        self.local = threading.local()
+
+    def client(self):
+        if not hasattr(self.local, 'client'):
+            self.local.client = Client()
+            self.local.client.force_login(self.viewer)
+        return self.local.client
+
+    def __call__(self, target):
+        client = self.client()
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            response = getattr(client, target.method)(target.path,
+                                                      target.data)
+            latency = time.perf_counter() - started
+        return Result(latency, response.status_code, len(queries))
+
+
+class HttpRunner:
+    """Запросы по HTTP к запущенному серверу. SQL-запросы отсюда
+    не видны, поэтому их число не считается."""
+
+    def __init__(self, base_url, username, password):
+        self.base_url = base_url.rstrip('/')
+        self.username = username
+        self.password = password
+        self.local = threading.local()
+
+    def session(self):
+        if not hasattr(self.local, 'session'):
+            session = requests.Session()
+            if self.username:
+                login = self.base_url + reverse('users:login')
+                session.get(login)
+                response = session.post(login, {
+                    'username': self.username,
+                    'password': self.password,
+                    'csrfmiddlewaretoken': session.cookies.get('csrftoken'),
+                }, headers={'Referer': login})
+                if 'sessionid' not in session.cookies:
+                    raise CommandError(
+                        f'Не удалось войти как {self.username}: '
+                        f'{response.status_code}'
+                    )
+            self.local.session = session
+        return self.local.session
+
+    def __call__(self, target):
+        session = self.session()
+        data = target.data
+        if target.method == 'post':
+            data = dict(data, csrfmiddlewaretoken=session.cookies.get(
+                'csrftoken'))
+        started = time.perf_counter()
+        response = session.request(
+            target.method, self.base_url + target.path, data=data,
+            headers={'Referer': self.base_url + target.path},
+            allow_redirects=False,
+        )
+        return Result(time.perf_counter() - started, response.status_code,
+                      None)
+
+
+def percentile(latencies, share):
+    return latencies[min(len(latencies) - 1, int(len(latencies) * share))]
+
+
+def run(runner, target, requests_count, concurrency):
+    """Гоняет один адрес и сводит результаты."""
+    started = time.perf_counter()
+    if concurrency > 1:
+        with ThreadPoolExecutor(concurrency) as executor:
+            results = list(executor.map(
+                lambda _: runner(target), range(requests_count)))
+    else:
+        results = [runner(target) for _ in range(requests_count)]
+    elapsed = time.perf_counter() - started
+    latencies = sorted(result.latency for result in results)
+    queries = [result.queries for result in results
+               if result.queries is not None]
+    return {
+        'rps': requests_count / elapsed,
+        'p50': statistics.median(latencies) * 1000,
+        'p95': percentile(latencies, 0.95) * 1000,
+        'p99': percentile(latencies, 0.99) * 1000,
+        'queries': statistics.mean(queries) if queries else None,
+        'errors': sum(result.status >= 400 for result in results),
+    }
+
+
+def find_regressions(report, baseline, tolerance):
+    """Адреса, у которых p95 вырос больше чем на tolerance или
+    SQL-запросов стало больше, чем в сохранённом прогоне."""
+    regressions = []
+    for name, stats in report.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        if stats['p95'] > base['p95'] * (1 + tolerance):
+            regressions.append(
+                f'{name}: p95 {base["p95"]:.1f} -> {stats["p95"]:.1f} мс')
+        if (stats['queries'] is not None and base['queries'] is not None
+                and stats['queries'] > base['queries']):
+            regressions.append(
+                f'{name}: SQL-запросов {base["queries"]:.1f} -> '
+                f'{stats["queries"]:.1f}')
+        if stats['errors'] > base['errors']:
+            regressions.append(f'{name}: ошибок {stats["errors"]}')
+    return regressions
+
+
+class Command(BaseCommand):
+    help = ('Нагружает страницы и формы постов и для каждого адреса '
+            'печатает пропускную способность, перцентили задержки и '
+            'число SQL-запросов. Может сравнить прогон с сохранённым '
+            'и упасть при регрессии.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200,
+                            help='Запросов на каждый адрес')
+        parser.add_argument('--concurrency', type=int, default=4)
+        parser.add_argument('--views', nargs='+',
+                            help='Какие адреса нагружать; по умолчанию все')
+        parser.add_argument('--no-cache', action='store_true',
+                            help='Отключить кэш (только без --url)')
+        parser.add_argument('--url',
+                            help='Адрес запущенного сервера; без него '
+                                 'запросы идут через тестовый клиент')
+        parser.add_argument('--username', help='Пользователь для --url')
+        parser.add_argument('--password', default='yatube-load')
+        parser.add_argument('--save', help='Сохранить результаты в JSON')
+        parser.add_argument('--baseline',
+                            help='JSON прошлого прогона для сравнения')
+        parser.add_argument('--tolerance', type=float, default=0.2,
+                            help='Допустимый рост p95, доля')
+
+    def select_targets(self, options):
+        targets, viewer = get_targets()
+        if options['views']:
+            unknown = set(options['views']) - set(targets)
+            if unknown:
+                raise CommandError('Неизвестные адреса: '
+                                   + ', '.join(sorted(unknown)))
+            targets = {name: targets[name] for name in options['views']}
+        if not options['url']:
+            return targets, ClientRunner(viewer)
+        runner = HttpRunner(options['url'], options['username'],
+                            options['password'])
+        if not options['username']:
+            targets = {name: target for name, target in targets.items()
+                       if not target.login}
+        return targets, runner
+
+    def compare(self, report, path, tolerance):
+        with open(path) as stream:
+            baseline = json.load(stream)
+        regressions = find_regressions(report, baseline, tolerance)
+        if regressions:
+            raise CommandError('Регрессии:\n' + '\n'.join(regressions))
+        self.stdout.write(self.style.SUCCESS('Регрессий нет'))
+
+    def handle(self, *args, **options):
+        targets, runner = self.select_targets(options)
+        caches = nullcontext()
+        if options['no_cache'] and not options['url']:
+            caches = override_settings(CACHES=NO_CACHE)
+        report = {}
+        with caches:
+            for name, target in targets.items():
+                stats = run(runner, target, options['requests'],
+                            options['concurrency'])
+                report[name] = stats
+                queries = ('-' if stats['queries'] is None
+                           else f'{stats["queries"]:.1f}')
+                self.stdout.write(
+                    f'{name}: {stats["rps"]:.1f} запросов/с, '
+                    f'p50 {stats["p50"]:.1f} мс, p95 {stats["p95"]:.1f} мс, '
+                    f'p99 {stats["p99"]:.1f} мс, SQL-запросов {queries}, '
+                    f'ошибок {stats["errors"]}'
+                )
+        if options['save']:
+            with open(options['save'], 'w') as stream:
+                json.dump(report, stream, indent=2)
+        if options['baseline']:
+            self.compare(report, options['baseline'], options['tolerance'])
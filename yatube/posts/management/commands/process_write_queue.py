@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import write_queue
+
+
+class Command(BaseCommand):
+    help = ('Разбирает очередь записи подписок и комментариев внешнего '
+            'брокера (POSTS_WRITE_QUEUE_BROKER, например spool): '
+            'применяет операции пачками, пока не остановят.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true',
+                            help='Разобрать то, что уже в очереди, и выйти')
+
+    def handle(self, *args, **options):
+        broker = write_queue.get_broker()
+        if broker is None:
+            raise CommandError('Очередь записи выключена: '
+                               'POSTS_WRITE_QUEUE_BROKER пуст')
+        if isinstance(broker, write_queue.InProcessBroker):
+            raise CommandError('Очередь inprocess разбирает сам процесс '
+                               'сайта')
+        total = 0
+        while True:
+            applied = write_queue.process_once(broker)
+            total += applied
+            if options['once'] and not applied:
+                break
+        self.stdout.write(f'Применено операций: {total}')
@@ -0,0 +1,24 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts import group_stats
+
+
+class Command(BaseCommand):
+    help = ('Пересобирает часовые корзины активности групп по постам '
+            'и комментариям и удаляет корзины старше '
+            'GROUP_STATS_RETENTION_HOURS.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--hours', type=int,
+            default=settings.GROUP_STATS_RETENTION_HOURS,
+            help='Сколько последних часов пересобрать',
+        )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            buckets = group_stats.rebuild(options['hours'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Корзин активности групп: {buckets}'))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts import search
+
+
+class Command(BaseCommand):
+    help = ('Строит поисковый индекс заново по всем постам, комментариям '
+            'и группам. Нужен после смены POSTS_SEARCH_BACKEND.')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            indexed = search.rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            f'Проиндексировано документов ({search.get_backend().name}): '
+            f'{indexed}'
+        ))
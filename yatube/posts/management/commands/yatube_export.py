@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from posts.transfer import FORMATS, TABLES, export_table
+
+
+class Command(BaseCommand):
+    help = ('Выгружает пользователей, группы, посты, комментарии и '
+            'подписки в каталог, по файлу NDJSON или CSV на таблицу. '
+            'Строки читаются из базы пачками и сразу пишутся в файл.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('directory')
+        parser.add_argument('--format', choices=FORMATS, default='ndjson')
+        parser.add_argument('--batch-size', type=int, default=2000)
+        parser.add_argument(
+            '--tables', nargs='+', choices=[table.name for table in TABLES],
+            help='Какие таблицы выгрузить; по умолчанию все',
+        )
+
+    def handle(self, *args, **options):
+        for table in TABLES:
+            if options['tables'] and table.name not in options['tables']:
+                continue
+            export_table(table, options['directory'], options['format'],
+                         options['batch_size'])
+            self.stdout.write(f'{table.name}: выгружено')
+        self.stdout.write(self.style.SUCCESS('Выгрузка готова'))
@@ -0,0 +1,101 @@
+import multiprocessing
+import os
+import shutil
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections, transaction
+
+from posts import counters, feed, group_stats, hot, page_cache, search
+from posts.transfer import (FORMATS, TABLES, ImportState, OffsetMap,
+                            build_natural_map, get_offsets, import_part,
+                            reset_sequences)
+
+
+class Command(BaseCommand):
+    help = ('Загружает каталог, выгруженный yatube_export. Каждая '
+            'таблица делится между --workers процессами, строки '
+            'вставляются пачками по --batch-size. Прерванную загрузку '
+            'можно продолжить той же командой.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('directory')
+        parser.add_argument('--format', choices=FORMATS, default='ndjson')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--workers', type=int, default=4,
+            help='Число процессов на таблицу; 0 - в текущем процессе',
+        )
+        parser.add_argument(
+            '--state',
+            help='Каталог с отметками о загруженном; по умолчанию '
+                 '<directory>/.import-state',
+        )
+        parser.add_argument(
+            '--skip-derived', action='store_true',
+            help='Не пересчитывать счётчики, ленты, рейтинги горячей '
+                 'ленты, активность групп и поисковый индекс',
+        )
+
+    def handle(self, *args, **options):
+        directory = options['directory']
+        state_dir = options['state'] or os.path.join(directory,
+                                                     '.import-state')
+        state = ImportState(state_dir)
+        saved = state.load()
+        if saved is None:
+            saved = {
+                'format': options['format'],
+                'parts': max(options['workers'], 1),
+                'batch_size': options['batch_size'],
+                'offsets': get_offsets(),
+            }
+            state.save(saved)
+        else:
+            self.stdout.write('Продолжаю прерванную загрузку')
+        file_format, parts = saved['format'], saved['parts']
+        id_maps = {name: OffsetMap(offset)
+                   for name, offset in saved['offsets'].items()}
+        for table in TABLES:
+            if not os.path.exists(table.path(directory, file_format)):
+                continue
+            started = time.perf_counter()
+            if not state.is_done(table.name):
+                arguments = [
+                    (table.name, directory, file_format, state_dir, id_maps,
+                     part, parts, saved['batch_size'])
+                    for part in range(parts)
+                ]
+                if options['workers']:
+                    # Процессы не должны делить открытые соединения.
+                    connections.close_all()
+                    context = multiprocessing.get_context('fork')
+                    with context.Pool(parts) as pool:
+                        rows = sum(pool.starmap(import_part, arguments))
+                else:
+                    rows = sum(import_part(*item) for item in arguments)
+                state.mark_done(table.name)
+                self.stdout.write(
+                    f'{table.name}: {rows} строк за '
+                    f'{time.perf_counter() - started:.1f} с'
+                )
+            if table.natural_key:
+                id_maps[table.name] = build_natural_map(
+                    table, directory, file_format, saved['batch_size'])
+        reset_sequences()
+        if not options['skip_derived']:
+            with transaction.atomic():
+                counters.reconcile()
+                hot.rebuild()
+                group_stats.rebuild(settings.GROUP_STATS_WINDOW_HOURS)
+            feed.rebuild()
+            search.rebuild()
+            self.stdout.write('Счётчики, ленты, рейтинги горячей ленты, '
+                              'активность групп и поисковый индекс '
+                              'пересчитаны')
+        # Строки загружены мимо сигналов: закэшированные страницы
+        # об этом не знают.
+        page_cache.invalidate_all_pages()
+        shutil.rmtree(state_dir, ignore_errors=True)
+        self.stdout.write(self.style.SUCCESS('Загрузка готова'))
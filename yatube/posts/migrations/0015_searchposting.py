@@ -0,0 +1,68 @@
+# Generated by Django 2.2.16 on 2026-10-18 19:22
+
+from django.db import OperationalError, migrations, models
+
+# Ключ строки FTS5 совпадает с ключом документа в posts.search:
+# id << 2 | вид (0 - пост, 1 - комментарий, 2 - группа).
+FILL_FTS = (
+    "INSERT INTO posts_search_fts(rowid, body) "
+    "SELECT id << 2, text FROM posts_post",
+    "INSERT INTO posts_search_fts(rowid, body) "
+    "SELECT id << 2 | 1, text FROM posts_comment",
+    "INSERT INTO posts_search_fts(rowid, body) "
+    "SELECT id << 2 | 2, title || char(10) || description FROM posts_group",
+)
+
+
+def create_fts(apps, schema_editor):
+    """Создаёт таблицу FTS5, если база - SQLite, собранная с FTS5.
+    Иначе поиск работает по запасному индексу SearchPosting."""
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        try:
+            cursor.execute(
+                "CREATE VIRTUAL TABLE posts_search_fts "
+                "USING fts5(body, tokenize='unicode61')"
+            )
+        except OperationalError:
+            return
+        for sql in FILL_FTS:
+            cursor.execute(sql)
+
+
+def drop_fts(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute('DROP TABLE IF EXISTS posts_search_fts')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0014_post_thumbnails'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchPosting',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(help_text='Слово в нижнем регистре', max_length=64, verbose_name='Слово')),
+                ('doc', models.BigIntegerField(help_text='Ключ документа: id << 2 | вид (пост, комментарий, группа)', verbose_name='Документ')),
+                ('weight', models.FloatField(help_text='Доля слова среди слов документа', verbose_name='Вес')),
+            ],
+            options={
+                'verbose_name': 'Вхождение слова',
+                'verbose_name_plural': 'Вхождения слов',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='searchposting',
+            index=models.Index(fields=['doc'], name='search_doc_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='searchposting',
+            constraint=models.UniqueConstraint(fields=('term', 'doc'), name='unique_search_term_doc'),
+        ),
+        migrations.RunPython(create_fts, drop_fts),
+    ]
@@ -0,0 +1,69 @@
+# Generated by Django 2.2.16 on 2026-10-18 20:09
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def fill_current_window(apps, schema_editor):
+    from posts import group_stats
+    group_stats.rebuild(settings.GROUP_STATS_WINDOW_HOURS,
+                        apps.get_model('posts', 'Post'),
+                        apps.get_model('posts', 'Comment'),
+                        apps.get_model('posts', 'GroupActivity'),
+                        apps.get_model('posts', 'GroupActivityAuthor'))
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('posts', '0015_searchposting'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GroupActivityAuthor',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hour', models.DateTimeField(help_text='Начало часа корзины, UTC', verbose_name='Час')),
+                ('author', models.ForeignKey(help_text='Автор поста или комментария', on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Автор')),
+                ('group', models.ForeignKey(help_text='Группа, в которой автор был активен', on_delete=django.db.models.deletion.CASCADE, related_name='+', to='posts.Group', verbose_name='Группа')),
+            ],
+            options={
+                'verbose_name': 'Участник группы за час',
+                'verbose_name_plural': 'Участники групп за час',
+            },
+        ),
+        migrations.CreateModel(
+            name='GroupActivity',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hour', models.DateTimeField(help_text='Начало часа корзины, UTC', verbose_name='Час')),
+                ('posts', models.PositiveIntegerField(default=0, help_text='Постов группы за час', verbose_name='Постов')),
+                ('comments', models.PositiveIntegerField(default=0, help_text='Комментариев к постам группы за час', verbose_name='Комментариев')),
+                ('authors', models.PositiveIntegerField(default=0, help_text='Разных авторов постов и комментариев за час', verbose_name='Участников')),
+                ('group', models.ForeignKey(help_text='Группа, чья активность', on_delete=django.db.models.deletion.CASCADE, related_name='activity', to='posts.Group', verbose_name='Группа')),
+            ],
+            options={
+                'verbose_name': 'Активность группы',
+                'verbose_name_plural': 'Активность групп',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='groupactivityauthor',
+            index=models.Index(fields=['hour'], name='group_author_hour_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='groupactivityauthor',
+            constraint=models.UniqueConstraint(fields=('group', 'hour', 'author'), name='unique_group_activity_author'),
+        ),
+        migrations.AddIndex(
+            model_name='groupactivity',
+            index=models.Index(fields=['hour'], name='group_activity_hour_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='groupactivity',
+            constraint=models.UniqueConstraint(fields=('group', 'hour'), name='unique_group_activity_hour'),
+        ),
+        migrations.RunPython(fill_current_window, migrations.RunPython.noop),
+    ]
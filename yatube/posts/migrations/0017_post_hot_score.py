@@ -0,0 +1,31 @@
+# Generated by Django 2.2.16 on 2026-10-18 20:12
+
+from django.db import migrations, models
+
+
+def fill_hot_scores(apps, schema_editor):
+    from posts import hot
+    hot.rebuild(apps.get_model('posts', 'Post'),
+                apps.get_model('posts', 'Comment'),
+                apps.get_model('users', 'Profile'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0016_group_activity'),
+        ('users', '0001_profile'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='hot_score',
+            field=models.FloatField(default=0, editable=False, help_text='Рейтинг горячей ленты, обновляется сигналами и затухает командой decay_hot_scores', verbose_name='Рейтинг'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['-hot_score', '-id'], name='post_hot_score_idx'),
+        ),
+        migrations.RunPython(fill_hot_scores, migrations.RunPython.noop),
+    ]
@@ -1,5 +1,8 @@
+import json
+
 from django.contrib.auth import get_user_model
 from django.db import models
+from django.utils.functional import cached_property
 
 User = get_user_model()
 NUMBER_OF_FIRST_POST_CHARACTERS = 15
@@ -41,6 +44,24 @@ class Post(models.Model):
         default_related_name = 'posts'
         verbose_name = 'Пост'
         verbose_name_plural = 'Посты'
+        indexes = [
+            models.Index(
+                fields=['-pub_date', '-id'],
+                name='post_pub_date_idx',
+            ),
+            models.Index(
+                fields=['author', '-pub_date', '-id'],
+                name='post_author_pub_date_idx',
+            ),
+            models.Index(
+                fields=['group', '-pub_date', '-id'],
+                name='post_group_pub_date_idx',
+            ),
+            models.Index(
+                fields=['-hot_score', '-id'],
+                name='post_hot_score_idx',
+            ),
+        ]
 
     text = models.TextField(
         verbose_name='Текст поста',
@@ -72,10 +93,52 @@ class Post(models.Model):
         verbose_name='Картинка',
         help_text='Загрузите картинку',
     )
+    comments_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Комментариев',
+        help_text='Счётчик комментариев, обновляется сигналами',
+    )
+    hot_score = models.FloatField(
+        default=0,
+        editable=False,
+        verbose_name='Рейтинг',
+        help_text='Рейтинг горячей ленты, обновляется сигналами '
+                  'и затухает командой decay_hot_scores',
+    )
+    version = models.PositiveIntegerField(
+        default=1,
+        editable=False,
+        verbose_name='Версия',
+        help_text='Растёт при каждом изменении поста',
+    )
+    thumbnails = models.TextField(
+        blank=True,
+        default='',
+        editable=False,
+        verbose_name='Миниатюры',
+        help_text='JSON с адресами и размерами готовых миниатюр',
+    )
 
     def __str__(self):
         return self.text[:NUMBER_OF_FIRST_POST_CHARACTERS]
 
+    def save(self, *args, **kwargs):
+        # Счётчик и рейтинг меняют сигналы через F(), копия в объекте
+        # может быть устаревшей: при обновлении поста их не записываем.
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in ('comments_count', 'hot_score')
+            ]
+        super().save(*args, **kwargs)
+
+    @cached_property
+    def renditions(self):
+        """Готовые миниатюры картинки: {имя: {url, width, height}}."""
+        return json.loads(self.thumbnails) if self.thumbnails else {}
+
 
 class Comment(models.Model):
     class Meta:
@@ -83,6 +146,12 @@ class Comment(models.Model):
         default_related_name = 'comments'
         verbose_name = 'Комментарий'
         verbose_name_plural = 'Комментарии'
+        indexes = [
+            models.Index(
+                fields=['post', '-created', '-id'],
+                name='comment_post_created_idx',
+            ),
+        ]
 
     post = models.ForeignKey(
         Post,
@@ -120,6 +189,12 @@ class Follow(models.Model):
                 name='unique_author_user',
             )
         ]
+        indexes = [
+            models.Index(
+                fields=['author', 'user'],
+                name='follow_author_user_idx',
+            ),
+        ]
 
     user = models.ForeignKey(
         User,
@@ -139,3 +214,176 @@ class Follow(models.Model):
 
     def __str__(self):
         return f'{self.author} <- {self.user}'
+
+
+class FeedEntry(models.Model):
+    """Строка материализованной ленты подписок: пост автора,
+    разложенный подписчику в момент публикации."""
+    class Meta:
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Записи ленты'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'post'],
+                name='unique_feed_user_post',
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', '-pub_date', '-post'],
+                name='feed_user_pub_date_idx',
+            ),
+            models.Index(
+                fields=['user', 'author'],
+                name='feed_user_author_idx',
+            ),
+        ]
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        verbose_name='Подписчик',
+        help_text='Владелец ленты',
+        related_name='feed_entries',
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        verbose_name='Пост',
+        help_text='Пост в ленте',
+        related_name='feed_entries',
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        verbose_name='Автор',
+        help_text='Автор поста, копия post.author',
+        related_name='+',
+    )
+    pub_date = models.DateTimeField(
+        verbose_name='Дата создания',
+        help_text='Копия post.pub_date для сортировки ленты',
+    )
+
+    def __str__(self):
+        return f'{self.user} <- {self.post_id}'
+
+
+class SearchPosting(models.Model):
+    """Строка запасного обратного индекса поиска (posts.search),
+    когда база не умеет FTS5: слово, документ и вес слова в нём."""
+    class Meta:
+        verbose_name = 'Вхождение слова'
+        verbose_name_plural = 'Вхождения слов'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['term', 'doc'],
+                name='unique_search_term_doc',
+            )
+        ]
+        indexes = [
+            models.Index(fields=['doc'], name='search_doc_idx'),
+        ]
+
+    term = models.CharField(
+        max_length=64,
+        verbose_name='Слово',
+        help_text='Слово в нижнем регистре',
+    )
+    doc = models.BigIntegerField(
+        verbose_name='Документ',
+        help_text='Ключ документа: id << 2 | вид (пост, комментарий, группа)',
+    )
+    weight = models.FloatField(
+        verbose_name='Вес',
+        help_text='Доля слова среди слов документа',
+    )
+
+    def __str__(self):
+        return f'{self.term} -> {self.doc}'
+
+
+class GroupActivity(models.Model):
+    """Часовая корзина активности группы (posts.group_stats):
+    счётчики сдвигают сигналы постов и комментариев."""
+    class Meta:
+        verbose_name = 'Активность группы'
+        verbose_name_plural = 'Активность групп'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['group', 'hour'],
+                name='unique_group_activity_hour',
+            )
+        ]
+        indexes = [
+            models.Index(fields=['hour'], name='group_activity_hour_idx'),
+        ]
+
+    group = models.ForeignKey(
+        Group,
+        on_delete=models.CASCADE,
+        verbose_name='Группа',
+        help_text='Группа, чья активность',
+        related_name='activity',
+    )
+    hour = models.DateTimeField(
+        verbose_name='Час',
+        help_text='Начало часа корзины, UTC',
+    )
+    posts = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Постов',
+        help_text='Постов группы за час',
+    )
+    comments = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Комментариев',
+        help_text='Комментариев к постам группы за час',
+    )
+    authors = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Участников',
+        help_text='Разных авторов постов и комментариев за час',
+    )
+
+    def __str__(self):
+        return f'{self.group_id} @ {self.hour:%Y-%m-%d %H}:00'
+
+
+class GroupActivityAuthor(models.Model):
+    """Участник группы в часовой корзине: по этим строкам считаются
+    уникальные авторы за час и за окно."""
+    class Meta:
+        verbose_name = 'Участник группы за час'
+        verbose_name_plural = 'Участники групп за час'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['group', 'hour', 'author'],
+                name='unique_group_activity_author',
+            )
+        ]
+        indexes = [
+            models.Index(fields=['hour'], name='group_author_hour_idx'),
+        ]
+
+    group = models.ForeignKey(
+        Group,
+        on_delete=models.CASCADE,
+        verbose_name='Группа',
+        help_text='Группа, в которой автор был активен',
+        related_name='+',
+    )
+    hour = models.DateTimeField(
+        verbose_name='Час',
+        help_text='Начало часа корзины, UTC',
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        verbose_name='Автор',
+        help_text='Автор поста или комментария',
+        related_name='+',
+    )
+
+    def __str__(self):
+        return f'{self.author_id} в {self.group_id} @ {self.hour}'
@@ -0,0 +1,257 @@
+import hashlib
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.cache import (get_conditional_response, patch_cache_control,
+                                quote_etag)
+from django.utils.http import http_date
+
+from core.holes import fill_holes
+from core.routers import primary_reads
+
+from .models import Group, Post, User
+
+GLOBAL_SCOPE = 'all'
+
+
+def group_scope(slug):
+    return f'group:{slug}'
+
+
+def author_scope(username):
+    return f'author:{username}'
+
+
+def viewer_scope(user_id):
+    """Страницы, которые пользователь видит по-своему (кнопки
+    подписки в карточках)."""
+    return f'viewer:{user_id}'
+
+
+def _generation_key(scope):
+    # Слаги и имена пользователей бывают не ASCII, а memcached
+    # принимает только ASCII-ключи.
+    return f'generation:{hashlib.md5(scope.encode()).hexdigest()}'
+
+
+def get_generations(scopes):
+    """Текущие поколения областей. Поколение - время последнего
+    изменения области в наносекундах, из него же берётся
+    Last-Modified. Пропавший из кэша счётчик заводится заново
+    текущим временем, чтобы не совпасть со старым поколением
+    сохранённых страниц."""
+    keys = [_generation_key(scope) for scope in scopes]
+    generations = cache.get_many(keys)
+    for key in keys:
+        if key not in generations:
+            cache.add(key, time.time_ns(),
+                      settings.PAGE_GENERATION_TIMEOUT)
+            generations[key] = cache.get(key)
+    return tuple(generations[key] for key in keys)
+
+
+def bump(*scopes):
+    """Сдвигает поколения областей: закэшированные страницы
+    этих областей становятся устаревшими. Одновременные сдвиги
+    могут записаться в любом порядке - важно лишь, что новое
+    поколение не совпадает со старым."""
+    generation = time.time_ns()
+    cache.set_many({_generation_key(scope): generation
+                    for scope in set(scopes)},
+                   settings.PAGE_GENERATION_TIMEOUT)
+
+
+def _post_scopes_key(post_id):
+    return f'post_scopes:{post_id}'
+
+
+def post_scopes(post_id):
+    """Области, изменения которых видны на странице поста: правки
+    поста и комментарии сдвигают область автора. Имя автора и слаг
+    группы поста лежат в кэше, чтобы ответ 304 обходился без базы;
+    сбрасывает их forget_post_scopes."""
+    key = _post_scopes_key(post_id)
+    row = cache.get(key)
+    if row is None:
+        row = Post.objects.filter(id=post_id).order_by().values_list(
+            'author__username', 'group__slug').first()
+        if row is None:
+            return []
+        cache.set(key, row, settings.PAGE_CACHE_TIMEOUT)
+    username, slug = row
+    return [author_scope(username)] + ([group_scope(slug)] if slug else [])
+
+
+def forget_post_scopes(post_ids):
+    cache.delete_many([_post_scopes_key(post_id) for post_id in post_ids])
+
+
+def invalidate_post_pages(post, extra_group_ids=()):
+    """Сдвигает поколения страниц, на которых виден пост."""
+    group_ids = {post.group_id, *extra_group_ids} - {None}
+    slugs = Group.objects.filter(id__in=group_ids).values_list(
+        'slug', flat=True)
+    usernames = User.objects.filter(id=post.author_id).values_list(
+        'username', flat=True)
+    bump(
+        GLOBAL_SCOPE,
+        *map(group_scope, slugs),
+        *map(author_scope, usernames),
+    )
+
+
+def invalidate_all_pages():
+    """Сдвигает поколения всех страниц: нужен, когда данные
+    меняются мимо сигналов, например при загрузке yatube_import."""
+    bump(
+        GLOBAL_SCOPE,
+        *map(group_scope, Group.objects.values_list('slug', flat=True)),
+        *map(author_scope, User.objects.values_list('username', flat=True)),
+    )
+    forget_post_scopes(Post.objects.values_list('id', flat=True))
+
+
+def invalidate_follow_pages(*follows):
+    user_ids = {follow.user_id for follow in follows}
+    usernames = User.objects.filter(
+        id__in=user_ids | {follow.author_id for follow in follows}
+    ).values_list('username', flat=True)
+    bump(*map(author_scope, usernames), *map(viewer_scope, user_ids))
+
+
+def _page_key(request, view_name):
+    path = hashlib.md5(request.get_full_path().encode()).hexdigest()
+    return f'page:{view_name}:{path}'
+
+
+def page_validators(request, view_name, generations):
+    """ETag и Last-Modified страницы по поколениям её областей.
+
+    Last-Modified - только для гостей: страница вошедшего зависит
+    от него самого, а дата этого не отражает. У даты точность
+    в секунду, поэтому она не отдаётся, пока с последнего изменения
+    не прошла секунда: иначе следующее изменение в ту же секунду
+    не сдвинуло бы её.
+    """
+    etag = quote_etag(hashlib.md5(repr(
+        (view_name, request.get_full_path(), request.user.id, generations)
+    ).encode()).hexdigest())
+    last_modified = None
+    if (not request.user.is_authenticated and generations
+            and time.time_ns() - max(generations) >= 10 ** 9):
+        last_modified = max(generations) // 10 ** 9 + 1
+    return etag, last_modified
+
+
+def patch_page_headers(request, response, etag, last_modified):
+    """Валидаторы и Cache-Control: гостевую страницу без кук
+    могут держать общие кэши (CDN, обратный прокси), браузер
+    перепроверяет её каждый раз; страница вошедшего - только его."""
+    response['ETag'] = etag
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified)
+    if (request.user.is_authenticated or response.cookies
+            or request.META.get('CSRF_COOKIE_USED')):
+        patch_cache_control(response, private=True, no_cache=True)
+    else:
+        patch_cache_control(response, public=True, max_age=0,
+                            s_maxage=settings.PAGE_SHARED_MAX_AGE)
+    return response
+
+
+def _render_shared(view, request, args, kwargs):
+    """Рендерит страницу как для гостя, с метками на месте дыр
+    зрителя (core.holes): такую копию можно отдавать всем. Данные
+    читаются из основной базы: копия с отстающей реплики осталась бы
+    в кэше до следующего сдвига поколения."""
+    user = request.user
+    request.user, request.defer_holes = AnonymousUser(), True
+    try:
+        with primary_reads():
+            return view(request, *args, **kwargs)
+    finally:
+        request.user, request.defer_holes = user, False
+
+
+def _cached_page(request, key, generations):
+    """Сохранённая страница с дырами зрителя и признак, что она
+    устарела; (None, False), если страницу надо перестроить. Пока
+    страницу перестраивает другая копия процесса, отдаётся старая
+    версия."""
+    entry = cache.get(key)
+    if entry is None:
+        return None, False
+    cached_generations, content, content_type = entry
+    stale = cached_generations != generations
+    if stale and cache.add(f'{key}:lock', True,
+                           settings.PAGE_CACHE_LOCK_TIMEOUT):
+        return None, False
+    return HttpResponse(fill_holes(content, request),
+                        content_type=content_type), stale
+
+
+def _rebuild_page(view, request, args, kwargs, key, generations):
+    response = _render_shared(view, request, args, kwargs)
+    if not response.streaming:
+        if response.status_code == 200:
+            cache.set(
+                key,
+                (generations, response.content, response['Content-Type']),
+                settings.PAGE_CACHE_TIMEOUT,
+            )
+        response.content = fill_holes(response.content, request)
+    cache.delete(f'{key}:lock')
+    return response
+
+
+def cache_page_by_generation(get_scopes):
+    """Кэширует страницу, пока не сдвинулись поколения её областей.
+
+    get_scopes(**view_kwargs) возвращает области страницы или пустой
+    список, если страницы нет. Копия страницы одна на всех: части
+    зрителя заполняются в неё на каждый запрос (core.holes). Пока
+    одна копия процесса перестраивает устаревшую страницу, остальные
+    отдают сохранённую старую версию.
+
+    Валидаторы страницы для зрителя строятся по поколениям её
+    областей и области зрителя: на запрос с актуальным If-None-Match
+    или If-Modified-Since ответ 304 без сохранённой страницы и, если
+    get_scopes берёт области из кэша (post_scopes), без базы.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view(request, *args, **kwargs)
+            scopes = get_scopes(**kwargs)
+            if not scopes:
+                return view(request, *args, **kwargs)
+            viewer = ([viewer_scope(request.user.id)]
+                      if request.user.is_authenticated else [])
+            generations = get_generations([*scopes, *viewer])
+            etag, last_modified = page_validators(request, view.__name__,
+                                                  generations)
+            response = get_conditional_response(request, etag, last_modified)
+            if response is not None:
+                return patch_page_headers(request, response, etag,
+                                          last_modified)
+            generations = generations[:len(scopes)]
+            key = _page_key(request, view.__name__)
+            response, stale = _cached_page(request, key, generations)
+            if stale:
+                # Валидаторов у старой версии нет, чужим кэшам её
+                # держать нельзя.
+                patch_cache_control(response, no_cache=True)
+                return response
+            if response is None:
+                response = _rebuild_page(view, request, args, kwargs, key,
+                                         generations)
+            if response.status_code == 200 and not response.streaming:
+                patch_page_headers(request, response, etag, last_modified)
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,148 @@
+"""Генерация вариантов картинок постов в процессах пула.
+
+Каждый вариант из settings.POST_IMAGE_RENDITIONS нарезается в
+нескольких ширинах (widths) и форматах (formats): AVIF - если Pillow
+умеет его сохранять, WebP и JPEG как запасной. Шаблонный тег
+post_picture собирает из них <picture> с srcset.
+
+Модуль не импортирует модели: процесс пула загружает его до того,
+как init_worker настроит Django.
+"""
+import hashlib
+import io
+
+import django
+from django.conf import settings
+from PIL import Image, ImageOps
+
+try:
+    # Кодек AVIF для Pillow, если он установлен.
+    import pillow_avif  # noqa: F401
+except ImportError:
+    pass
+
+RENDITIONS_DIRECTORY = 'renditions'
+FORMATS = {
+    'avif': ('AVIF', 'image/avif'),
+    'webp': ('WEBP', 'image/webp'),
+    'jpeg': ('JPEG', 'image/jpeg'),
+}
+
+
+def init_worker():
+    django.setup()
+
+
+def available_formats(formats):
+    """Форматы из списка, которые Pillow умеет сохранять."""
+    Image.init()
+    return [name for name in formats if FORMATS[name][0] in Image.SAVE]
+
+
+def parse_geometry(geometry):
+    width, height = geometry.split('x')
+    return int(width), int(height)
+
+
+def load_image(stream):
+    image = Image.open(stream)
+    image.load()
+    image = ImageOps.exif_transpose(image)
+    if image.mode not in ('RGB', 'L'):
+        image = image.convert('RGB')
+    return image
+
+
+def variant_sizes(image, options):
+    """Ширины и высоты варианта. Без upscale ширины больше исходной
+    картинки пропускаются, но самая узкая остаётся всегда."""
+    width, height = parse_geometry(options['geometry'])
+    widths = sorted(set(options.get('widths', ())) | {width})
+    if not options.get('upscale'):
+        widths = [item for item in widths if item <= image.width] or widths[:1]
+    return [(item, round(item * height / width)) for item in widths]
+
+
+def encode(image, file_format, quality):
+    buffer = io.BytesIO()
+    image.save(buffer, FORMATS[file_format][0], quality=quality)
+    return buffer.getvalue()
+
+
+def make_variants(image, options):
+    """Кадрирует картинку под пропорции варианта и кодирует каждую
+    ширину в каждом доступном формате.
+
+    Возвращает [(формат, ширина, высота, байты)].
+    """
+    sizes = variant_sizes(image, options)
+    largest = ImageOps.fit(image, sizes[-1], Image.LANCZOS)
+    variants = []
+    for width, height in sizes:
+        resized = largest.resize((width, height), Image.LANCZOS)
+        for file_format in available_formats(options.get('formats',
+                                                         ('jpeg',))):
+            quality = settings.POST_IMAGE_QUALITY[file_format]
+            variants.append((file_format, width, height,
+                             encode(resized, file_format, quality)))
+    return variants
+
+
+def variant_name(image_name, name, options, file_format, width):
+    """Имя файла варианта; меняется вместе с настройками варианта."""
+    digest = hashlib.md5(
+        f'{image_name}:{sorted(options.items())}'.encode()
+    ).hexdigest()
+    return (f'{RENDITIONS_DIRECTORY}/{digest[:2]}/{digest}/'
+            f'{name}-{width}.{file_format}')
+
+
+def srcset(items):
+    return ', '.join(f'{url} {width}w' for url, width in items)
+
+
+def render_renditions(image_name):
+    """Генерирует все варианты из settings.POST_IMAGE_RENDITIONS.
+
+    Возвращает {имя: {'url', 'width', 'height', 'sizes', 'sources'}}:
+    url - самый широкий JPEG, sources - [{'type', 'srcset'}] от лучшего
+    формата к запасному, sizes - атрибут sizes для srcset. Принимает
+    и возвращает простые данные, чтобы их можно было передать между
+    процессами.
+    """
+    from django.core.files.base import ContentFile
+    from django.core.files.storage import default_storage
+
+    with default_storage.open(image_name) as stream:
+        image = load_image(stream)
+    renditions = {}
+    for name, options in settings.POST_IMAGE_RENDITIONS.items():
+        sources = {}
+        for file_format, width, height, content in make_variants(image,
+                                                                 options):
+            path = variant_name(image_name, name, options, file_format,
+                                width)
+            # Перегенерация пишет файл на то же место.
+            if default_storage.exists(path):
+                default_storage.delete(path)
+            url = default_storage.url(
+                default_storage.save(path, ContentFile(content)))
+            sources.setdefault(file_format, []).append((url, width, height))
+        if not sources:
+            # Pillow не умеет сохранять ни один формат варианта:
+            # post_picture покажет исходную картинку.
+            continue
+        fallback = sources.get('jpeg') or next(iter(sources.values()))
+        url, width, height = fallback[-1]
+        renditions[name] = {
+            'url': url,
+            'width': width,
+            'height': height,
+            'sizes': options.get('sizes', f'{width}px'),
+            'sources': [
+                {'type': FORMATS[file_format][1],
+                 'srcset': srcset(item[:2] for item in items)}
+                for file_format, items in sources.items()
+            ],
+        }
+    return renditions
@@ -0,0 +1,269 @@
+import base64
+import binascii
+import heapq
+import math
+import re
+from collections import Counter, namedtuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+
+from .models import Comment, Group, Post, SearchPosting
+from .utilities import CURSOR_SEPARATOR, NUMBER_OF_SHOWN_POSTS
+
+FTS_TABLE = 'posts_search_fts'
+KINDS = ('post', 'comment', 'group')
+TERM_RE = re.compile(r'\w+')
+TERM_MAX_LENGTH = 64
+MAX_QUERY_TERMS = 8
+DOCUMENTS_COUNT_KEY = 'search:documents'
+DOCUMENTS_COUNT_TIMEOUT = 10 * 60
+
+SearchHit = namedtuple('SearchHit', 'kind object score')
+
+
+def tokenize(text):
+    return [term[:TERM_MAX_LENGTH] for term in TERM_RE.findall(text.lower())]
+
+
+def doc_key(kind, pk):
+    """Ключ документа: id и вид в одном целом, он же rowid в FTS5."""
+    return pk << 2 | KINDS.index(kind)
+
+
+def split_doc_key(doc):
+    return KINDS[doc & 3], doc >> 2
+
+
+def document_of(instance):
+    """Вид, id и индексируемый текст объекта."""
+    if isinstance(instance, Post):
+        return 'post', instance.pk, instance.text
+    if isinstance(instance, Comment):
+        return 'comment', instance.pk, instance.text
+    return 'group', instance.pk, f'{instance.title}\n{instance.description}'
+
+
+class Fts5Backend:
+    """Индекс во встроенной таблице SQLite FTS5, ранжирование bm25."""
+    name = 'fts5'
+
+    def index(self, doc, text):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [doc])
+            cursor.execute(
+                f'INSERT INTO {FTS_TABLE}(rowid, body) VALUES (%s, %s)',
+                [doc, text],
+            )
+
+    def remove(self, doc):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [doc])
+
+    def clear(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE}')
+
+    def rebuild(self, batch_size):
+        # Одним INSERT ... SELECT на таблицу, без разбора строк в Python.
+        sources = (
+            ('post', Post, 'text'),
+            ('comment', Comment, 'text'),
+            ('group', Group, "title || char(10) || description"),
+        )
+        self.clear()
+        indexed = 0
+        with connection.cursor() as cursor:
+            for kind, model, body in sources:
+                cursor.execute(
+                    f'INSERT INTO {FTS_TABLE}(rowid, body) '
+                    f'SELECT id << 2 | {KINDS.index(kind)}, {body} '
+                    f'FROM {model._meta.db_table}'
+                )
+                indexed += cursor.rowcount
+        return indexed
+
+    def search(self, terms, after, limit):
+        # Слова из TERM_RE не содержат кавычек, поэтому в кавычках
+        # каждое ищется как есть, без синтаксиса запросов FTS5.
+        sql = f'SELECT rank, rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s'
+        params = [' '.join(f'"{term}"' for term in terms)]
+        if after is not None:
+            score, doc = after
+            sql += ' AND (rank > %s OR (rank = %s AND rowid > %s))'
+            params += [score, score, doc]
+        sql += ' ORDER BY rank, rowid LIMIT %s'
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params + [limit])
+            return cursor.fetchall()
+
+
+class InvertedIndexBackend:
+    """Запасной обратный индекс в таблице SearchPosting для баз без
+    FTS5. Документы, где есть все слова запроса, ранжируются по tf-idf
+    в Python; счёт со знаком минус, чтобы лучшие шли первыми, как у bm25.
+    """
+    name = 'inverted'
+
+    def index(self, doc, text):
+        terms = Counter(tokenize(text))
+        length = sum(terms.values()) or 1
+        with transaction.atomic():
+            SearchPosting.objects.filter(doc=doc).delete()
+            SearchPosting.objects.bulk_create(
+                SearchPosting(term=term, doc=doc, weight=count / length)
+                for term, count in terms.items()
+            )
+
+    def remove(self, doc):
+        SearchPosting.objects.filter(doc=doc).delete()
+
+    def clear(self):
+        SearchPosting.objects.all().delete()
+        cache.delete(DOCUMENTS_COUNT_KEY)
+
+    def rebuild(self, batch_size):
+        self.clear()
+        indexed = 0
+        for doc, text in iter_documents(batch_size):
+            self.index(doc, text)
+            indexed += 1
+        return indexed
+
+    def documents_count(self):
+        total = cache.get(DOCUMENTS_COUNT_KEY)
+        if total is None:
+            total = SearchPosting.objects.values('doc').distinct().count()
+            cache.set(DOCUMENTS_COUNT_KEY, total, DOCUMENTS_COUNT_TIMEOUT)
+        return total
+
+    def search(self, terms, after, limit):
+        postings = {term: {} for term in terms}
+        for term, doc, weight in SearchPosting.objects.filter(
+            term__in=terms
+        ).values_list('term', 'doc', 'weight'):
+            postings[term][doc] = weight
+        if not all(postings.values()):
+            return []
+        total = self.documents_count()
+        docs = set.intersection(*(set(found) for found in postings.values()))
+        scored = []
+        for doc in docs:
+            score = -sum(
+                postings[term][doc] * math.log(1 + total / len(postings[term]))
+                for term in terms
+            )
+            if after is None or (score, doc) > after:
+                scored.append((score, doc))
+        return heapq.nsmallest(limit, scored)
+
+
+BACKENDS = {
+    backend.name: backend for backend in (Fts5Backend, InvertedIndexBackend)
+}
+_fts_available = None
+
+
+def fts_available():
+    global _fts_available
+    if _fts_available is None:
+        _fts_available = (
+            connection.vendor == 'sqlite'
+            and FTS_TABLE in connection.introspection.table_names()
+        )
+    return _fts_available
+
+
+def get_backend():
+    """Бэкенд из POSTS_SEARCH_BACKEND; 'auto' - FTS5, если таблица
+    FTS5 есть в базе, иначе обратный индекс."""
+    name = settings.POSTS_SEARCH_BACKEND
+    if name == 'auto':
+        name = Fts5Backend.name if fts_available() else 'inverted'
+    return BACKENDS[name]()
+
+
+def index_object(instance):
+    kind, pk, text = document_of(instance)
+    get_backend().index(doc_key(kind, pk), text)
+
+
+def remove_object(instance):
+    kind, pk, _ = document_of(instance)
+    get_backend().remove(doc_key(kind, pk))
+
+
+def iter_documents(batch_size=500):
+    """Ключи и тексты всех постов, комментариев и групп."""
+    for model in (Post, Comment, Group):
+        for instance in model.objects.order_by('pk').iterator(batch_size):
+            kind, pk, text = document_of(instance)
+            yield doc_key(kind, pk), text
+
+
+def rebuild(batch_size=500):
+    """Строит индекс заново по всем постам, комментариям и группам.
+    Возвращает число документов."""
+    return get_backend().rebuild(batch_size)
+
+
+def encode_search_cursor(score, doc):
+    raw = CURSOR_SEPARATOR.join((repr(score), str(doc)))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_search_cursor(token):
+    """Распаковывает токен. Возвращает None, если токен испорчен."""
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode()).decode()
+        score, doc = raw.split(CURSOR_SEPARATOR)
+        score, doc = float(score), int(doc)
+    except (binascii.Error, UnicodeError, ValueError):
+        return None
+    if not math.isfinite(score):
+        return None
+    return score, doc
+
+
+def load_hits(rows):
+    """Достаёт объекты найденных документов пачкой на каждый вид.
+    Удалённые после индексации объекты пропускаются."""
+    ids = {kind: [] for kind in KINDS}
+    for _, doc in rows:
+        kind, pk = split_doc_key(doc)
+        ids[kind].append(pk)
+    objects = {
+        'post': Post.objects.select_related('author', 'group')
+                            .in_bulk(ids['post']),
+        'comment': Comment.objects.select_related('author', 'post')
+                                  .in_bulk(ids['comment']),
+        'group': Group.objects.in_bulk(ids['group']),
+    }
+    hits = []
+    for score, doc in rows:
+        kind, pk = split_doc_key(doc)
+        if pk in objects[kind]:
+            hits.append(SearchHit(kind, objects[kind][pk], -score))
+    return hits
+
+
+def find(query, cursor=None, limit=NUMBER_OF_SHOWN_POSTS):
+    """Ищет посты, комментарии и группы со всеми словами запроса.
+
+    Возвращает найденное по убыванию релевантности и курсор следующей
+    страницы (None, если страница последняя). Курсор - ключ
+    (счёт, документ) последней строки, страница по нему - тот же
+    запрос с условием "после ключа".
+    """
+    terms = list(dict.fromkeys(tokenize(query)))[:MAX_QUERY_TERMS]
+    if not terms:
+        return [], None
+    after = decode_search_cursor(cursor) if cursor else None
+    rows = get_backend().search(terms, after, limit + 1)
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_search_cursor(*rows[-1])
+    return load_hits(rows), next_cursor
@@ -0,0 +1,258 @@
+import threading
+from collections import Counter
+from contextlib import contextmanager
+
+from django.db.models import F
+from django.db.models.signals import (post_delete, post_save, pre_delete,
+                                      pre_save)
+from django.dispatch import receiver
+
+from users.models import Profile
+
+from . import (counters, feed, follows, group_stats, hot, page_cache, search,
+               thumbnails)
+from .models import Comment, Follow, Group, Post, User
+
+_batches = threading.local()
+# Поля автора и группы, которые видны в карточках постов.
+USER_IDENTITY = ('username', 'first_name', 'last_name')
+GROUP_IDENTITY = ('title', 'slug')
+
+
+class Batch:
+    """Отложенные последствия сохранения подписок и комментариев."""
+
+    def __init__(self):
+        self.follows = []
+        self.comments = []
+        self.comment_posts = Counter()
+
+    def add_follow(self, follow, delta):
+        self.follows.append((follow, delta))
+
+    def add_comment(self, comment):
+        self.comments.append(comment)
+        self.comment_posts[comment.post_id] += 1
+
+    def flush(self):
+        followers, following = Counter(), Counter()
+        for follow, delta in self.follows:
+            followers[follow.author_id] += delta
+            following[follow.user_id] += delta
+        unfollowed = {follow.author_id for follow, delta in self.follows
+                      if delta < 0}
+        followers_before = dict(
+            Profile.objects.filter(user_id__in=unfollowed)
+                           .values_list('user_id', 'followers_count')
+        ) if unfollowed else {}
+        counters.shift_many(Profile, 'user_id', 'followers_count', followers)
+        counters.shift_many(Profile, 'user_id', 'following_count', following)
+        for follow, delta in self.follows:
+            if delta > 0:
+                feed.on_follow(follow.user_id, follow.author_id)
+            else:
+                # Переход через порог "знаменитости" проверяется по
+                # счётчику до и после всей пачки, один раз на автора.
+                feed.on_unfollow(follow.user_id, follow.author_id,
+                                 followers_before.pop(follow.author_id, 0))
+        if self.follows:
+            instances = [follow for follow, _ in self.follows]
+            for user_id in {follow.user_id for follow in instances}:
+                follows.invalidate_follow_set(user_id)
+            page_cache.invalidate_follow_pages(*instances)
+        counters.shift_many(Post, 'id', 'comments_count', self.comment_posts,
+                            hot_score=hot.COMMENT_WEIGHT)
+        posts = list(Post.objects.filter(id__in=list(self.comment_posts)))
+        group_stats.comments_added(
+            self.comments, {post.id: post.group_id for post in posts})
+        for post in posts:
+            page_cache.invalidate_post_pages(post)
+
+
+def current_batch():
+    return getattr(_batches, 'current', None)
+
+
+@contextmanager
+def batched():
+    """Внутри блока последствия сохранения и удаления подписок и
+    новых комментариев копятся и применяются в конце пачкой: счётчик
+    каждой строки сдвигается одним UPDATE, страницы и наборы подписок
+    сбрасываются по разу."""
+    batch = _batches.current = Batch()
+    try:
+        yield batch
+    finally:
+        _batches.current = None
+    batch.flush()
+
+
+@receiver(pre_save, sender=Post)
+def post_changing(sender, instance, **kwargs):
+    previous = (None, '')
+    if instance._state.adding and not instance.hot_score:
+        instance.hot_score = hot.initial_score(instance.author_id)
+    elif not instance._state.adding:
+        instance.version += 1
+        previous = (
+            Post.objects.filter(id=instance.id)
+                        .values_list('group_id', 'image')
+                        .first()
+        ) or previous
+    instance._previous_group_id, previous_image = previous
+    instance._image_changed = (instance.image.name or '') != previous_image
+    if instance._image_changed:
+        instance.thumbnails = ''
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created, **kwargs):
+    if created:
+        counters.post_added(instance)
+        group_stats.post_added(instance)
+        feed.fan_out_post(instance)
+    elif instance._previous_group_id != instance.group_id:
+        group_stats.post_moved(instance, instance._previous_group_id)
+        page_cache.forget_post_scopes([instance.id])
+    page_cache.invalidate_post_pages(instance, [instance._previous_group_id])
+    search.index_object(instance)
+    if instance._image_changed and instance.image:
+        thumbnails.schedule(instance)
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    counters.post_added(instance, -1)
+    group_stats.post_added(instance, -1)
+    page_cache.forget_post_scopes([instance.id])
+    page_cache.invalidate_post_pages(instance)
+    search.remove_object(instance)
+
+
+@receiver(post_save, sender=Comment)
+def comment_saved(sender, instance, created, **kwargs):
+    batch = current_batch()
+    if created and batch is not None:
+        batch.add_comment(instance)
+    elif created:
+        counters.comment_added(instance, hot_score=hot.COMMENT_WEIGHT)
+        group_stats.comments_added(
+            [instance], {instance.post_id: instance.post.group_id})
+        page_cache.invalidate_post_pages(instance.post)
+    search.index_object(instance)
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    counters.comment_added(instance, -1)
+    search.remove_object(instance)
+    post = Post.objects.filter(id=instance.post_id).first()
+    if post is not None:
+        group_stats.comments_added([instance], {post.id: post.group_id}, -1)
+        page_cache.invalidate_post_pages(post)
+
+
+@receiver(post_save, sender=Follow)
+def follow_saved(sender, instance, created, **kwargs):
+    batch = current_batch()
+    if created and batch is not None:
+        batch.add_follow(instance, 1)
+    elif created:
+        counters.follow_added(instance)
+        feed.on_follow(instance.user_id, instance.author_id)
+        follows.invalidate_follow_set(instance.user_id)
+        page_cache.invalidate_follow_pages(instance)
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    batch = current_batch()
+    if batch is not None:
+        batch.add_follow(instance, -1)
+        return
+    counters.follow_added(instance, -1)
+    feed.on_unfollow(instance.user_id, instance.author_id)
+    follows.invalidate_follow_set(instance.user_id)
+    page_cache.invalidate_follow_pages(instance)
+
+
+def identity_of(instance, fields):
+    return tuple(getattr(instance, field) for field in fields)
+
+
+def forget_scopes_of(posts):
+    page_cache.forget_post_scopes(posts.values_list('id', flat=True))
+
+
+@receiver(pre_save, sender=Group)
+def group_changing(sender, instance, **kwargs):
+    instance._previous_identity = None if instance._state.adding else (
+        Group.objects.filter(id=instance.id)
+                     .values_list(*GROUP_IDENTITY)
+                     .first()
+    )
+
+
+@receiver(post_save, sender=Group)
+def group_saved(sender, instance, created, **kwargs):
+    scopes = [page_cache.group_scope(instance.slug)]
+    previous = instance._previous_identity
+    if not created and previous != identity_of(instance, GROUP_IDENTITY):
+        # Название и слаг группы видны в карточках её постов на всех
+        # лентах, слаг - ещё и в областях страниц этих постов.
+        posts = Post.objects.filter(group=instance)
+        forget_scopes_of(posts)
+        posts.update(version=F('version') + 1)
+        usernames = (User.objects.filter(posts__group=instance)
+                                 .values_list('username', flat=True)
+                                 .distinct())
+        scopes += [page_cache.GLOBAL_SCOPE,
+                   *map(page_cache.author_scope, usernames)]
+        if previous is not None:
+            scopes.append(page_cache.group_scope(previous[1]))
+    page_cache.bump(*scopes)
+    search.index_object(instance)
+
+
+@receiver(pre_delete, sender=Group)
+def group_deleting(sender, instance, **kwargs):
+    # Посты остаются без группы обновлением в обход сигналов.
+    forget_scopes_of(Post.objects.filter(group=instance))
+
+
+@receiver(pre_save, sender=User)
+def user_changing(sender, instance, update_fields=None, **kwargs):
+    instance._previous_identity = None
+    if instance._state.adding or (
+            update_fields is not None
+            and not set(update_fields) & set(USER_IDENTITY)):
+        return
+    instance._previous_identity = (
+        User.objects.filter(id=instance.id)
+                    .values_list(*USER_IDENTITY)
+                    .first()
+    )
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, **kwargs):
+    previous = instance._previous_identity
+    if created or previous in (None, identity_of(instance, USER_IDENTITY)):
+        return
+    # Имя автора видно в карточках его постов на всех лентах,
+    # а логин - ещё и в областях страниц этих постов.
+    posts = Post.objects.filter(author=instance)
+    forget_scopes_of(posts)
+    posts.update(version=F('version') + 1)
+    slugs = (Group.objects.filter(posts__author=instance)
+                          .values_list('slug', flat=True)
+                          .distinct())
+    page_cache.bump(page_cache.GLOBAL_SCOPE,
+                    page_cache.author_scope(previous[0]),
+                    page_cache.author_scope(instance.username),
+                    *map(page_cache.group_scope, slugs))
+
+
+@receiver(post_delete, sender=Group)
+def group_deleted(sender, instance, **kwargs):
+    search.remove_object(instance)
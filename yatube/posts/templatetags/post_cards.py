@@ -0,0 +1,49 @@
+from django import template
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import get_template
+from django.utils.safestring import mark_safe
+
+from core.holes import fill_holes, is_deferred
+
+register = template.Library()
+
+POST_CARD_TEMPLATE = 'includes/post.html'
+
+
+def post_card_key(post, follow_buttons=False):
+    """Ключ карточки. pub_date отличает пост от другого с тем же id
+    (например, после восстановления базы). Части зрителя в карточке -
+    дыры (core.holes), поэтому карточка одна на всех."""
+    return (f'post_card:{post.id}:{post.version}:{post.comments_count}:'
+            f'{post.pub_date.timestamp()}:{int(follow_buttons)}')
+
+
+@register.simple_tag(takes_context=True)
+def post_cards(context, posts, follow_buttons=False):
+    """Отрендеренные карточки постов.
+
+    Карточки достаются из кэша одним get_many, рендерятся только
+    отсутствующие. Дыры карточек заполняются здесь же, если сама
+    страница не рендерится для кэша страниц. follow_buttons -
+    показывать в карточках кнопки подписки на автора.
+    """
+    request = context.get('request')
+    posts = list(posts)
+    keys = [post_card_key(post, follow_buttons) for post in posts]
+    cards = cache.get_many(keys)
+    missed = {}
+    card_template = get_template(POST_CARD_TEMPLATE)
+    for key, post in zip(keys, posts):
+        if key not in cards:
+            missed[key] = card_template.render(
+                {'post': post, 'follow_buttons': follow_buttons,
+                 'defer_holes': True},
+                request,
+            )
+    if missed:
+        cache.set_many(missed, settings.POST_CARD_CACHE_TIMEOUT)
+        cards.update(missed)
+    if is_deferred(request):
+        return [mark_safe(cards[key]) for key in keys]
+    return [mark_safe(fill_holes(cards[key], request)) for key in keys]
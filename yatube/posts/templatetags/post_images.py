@@ -0,0 +1,36 @@
+from django import template
+from django.utils.html import format_html, format_html_join
+
+register = template.Library()
+
+JPEG = 'image/jpeg'
+
+
+@register.simple_tag
+def post_picture(post, name='card', css_class='card-img my-2'):
+    """<picture> с вариантом картинки поста: <source> на каждый
+    современный формат, JPEG - в srcset самого <img>. Пока варианты
+    не готовы - исходная картинка."""
+    rendition = post.renditions.get(name)
+    if not rendition:
+        return format_html('<img class="{}" src="{}">', css_class,
+                           post.image.url)
+    sizes = rendition.get('sizes', '')
+    sources = rendition.get('sources', [])
+    jpeg_srcset = ''.join(source['srcset'] for source in sources
+                          if source['type'] == JPEG)
+    return format_html(
+        '<picture>{}<img class="{}" src="{}"{} width="{}" height="{}" '
+        'loading="lazy" decoding="async"></picture>',
+        format_html_join(
+            '', '<source type="{}" srcset="{}" sizes="{}">',
+            ((source['type'], source['srcset'], sizes)
+             for source in sources if source['type'] != JPEG),
+        ),
+        css_class,
+        rendition['url'],
+        format_html(' srcset="{}" sizes="{}"', jpeg_srcset, sizes)
+        if jpeg_srcset else '',
+        rendition['width'],
+        rendition['height'],
+    )
@@ -0,0 +1,111 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from core.budgets import Budget, url_names
+from posts import urls
+from posts.models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+# Бюджеты страниц при пустом кэше: SQL-запросов, мс на SQL,
+# мс на отрисовку. Время с большим запасом - оно ловит только
+# грубые промахи, главное - число запросов.
+BUDGETS = {
+    'posts:index': (6, 100, 500),
+    'posts:hot': (6, 100, 500),
+    'posts:profile': (5, 100, 500),
+    'posts:group_list': (7, 100, 500),
+    'posts:post_create': (3, 50, 300),
+    'posts:post_detail': (5, 100, 500),
+    'posts:post_edit': (4, 50, 300),
+    'posts:post_comments': (1, 50, 300),
+    'posts:add_comment': (12, 100, None),
+    'posts:follow_index': (5, 100, 500),
+    'posts:search': (4, 100, 500),
+    'posts:search_api': (2, 100, None),
+    'posts:profile_follow': (4, 100, None),
+    'posts:profile_unfollow': (10, 100, None),
+}
+
+
+class PostsBudgetTests(TestCase):
+    """Каждая страница постов укладывается в свой бюджет."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.author = User.objects.create_user(username='author')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание'
+        )
+        for number in range(15):
+            post = Post.objects.create(
+                text=f'Тестовое сообщение {number}',
+                author=cls.author if number % 2 else cls.user,
+                group=cls.group,
+            )
+        cls.post = post
+        for number in range(25):
+            Comment.objects.create(
+                text=f'Комментарий {number}',
+                post=post,
+                author=cls.author if number % 2 else cls.user,
+            )
+        Follow.objects.create(user=cls.user, author=cls.author)
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.user)
+        cache.clear()
+
+    def get_requests(self):
+        post, author = self.post, self.author.username
+        return {
+            'posts:index': ('get', reverse('posts:index'), None),
+            'posts:hot': ('get', reverse('posts:hot'), None),
+            'posts:profile': (
+                'get', reverse('posts:profile', args=[author]), None),
+            'posts:group_list': (
+                'get', reverse('posts:group_list', args=[self.group.slug]),
+                None),
+            'posts:post_create': ('get', reverse('posts:post_create'), None),
+            'posts:post_detail': (
+                'get', reverse('posts:post_detail', args=[post.id]), None),
+            'posts:post_edit': (
+                'get', reverse('posts:post_edit', args=[post.id]), None),
+            'posts:post_comments': (
+                'get', reverse('posts:post_comments', args=[post.id]), None),
+            'posts:add_comment': (
+                'post', reverse('posts:add_comment', args=[post.id]),
+                {'text': 'Новый комментарий'}),
+            'posts:follow_index': (
+                'get', reverse('posts:follow_index'), None),
+            'posts:search': (
+                'get', reverse('posts:search'), {'q': 'тестовое'}),
+            'posts:search_api': (
+                'get', reverse('posts:search_api'), {'q': 'сообщение'}),
+            'posts:profile_follow': (
+                'get', reverse('posts:profile_follow', args=[author]), None),
+            'posts:profile_unfollow': (
+                'get', reverse('posts:profile_unfollow', args=[author]),
+                None),
+        }
+
+    def test_every_url_has_budget(self):
+        """Для каждого адреса posts.urls объявлен бюджет."""
+        self.assertEqual(set(BUDGETS), url_names(urls))
+
+    def test_pages_fit_budgets(self):
+        """Страницы не выходят за бюджет запросов и времени."""
+        for name, (method, url, data) in self.get_requests().items():
+            with self.subTest(view=name):
+                cache.clear()
+                queries, sql_ms, render_ms = BUDGETS[name]
+                with Budget(name, queries, sql_ms, render_ms):
+                    response = getattr(self.client, method)(url, data)
+                self.assertLess(response.status_code, 400)
@@ -0,0 +1,285 @@
+import json
+import os
+import shutil
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from posts import search
+from posts.models import (Comment, FeedEntry, Follow, Group, GroupActivity,
+                          Post)
+from posts.renditions import FORMATS, available_formats, render_renditions
+from posts.templatetags.post_images import post_picture
+from posts.transfer import RowLoader
+
+User = get_user_model()
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x01\x00\x01\x00\x00\x00\x00\x21\xf9\x04'
+    b'\x01\x0a\x00\x01\x00\x2c\x00\x00\x00\x00\x01\x00\x01\x00\x00\x02'
+    b'\x02\x4c\x01\x00\x3b'
+)
+
+
+class ExplainQueriesCommandTest(TestCase):
+    def test_view_queries_use_indexes(self):
+        """Запросы страниц постов читают данные по индексам."""
+        out = StringIO()
+        call_command('explain_queries', stdout=out)
+        self.assertNotIn('ERROR', out.getvalue())
+
+    def test_full_scan_is_reported(self):
+        """Запрос без подходящего индекса роняет команду."""
+        querysets = {'unindexed': Post.objects.order_by('text')}
+        with mock.patch(
+            'posts.management.commands.explain_queries.get_view_querysets',
+            return_value=querysets,
+        ):
+            with self.assertRaises(CommandError):
+                call_command('explain_queries', stdout=StringIO())
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class GenerateThumbnailsCommandTest(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def test_thumbnails_are_made_on_save_and_by_command(self):
+        """Миниатюры делаются при сохранении поста с картинкой,
+           а для старых постов - командой generate_thumbnails."""
+        user = User.objects.create_user(username='author')
+        post = Post.objects.create(
+            text='Тестовый пост',
+            author=user,
+            image=SimpleUploadedFile('small.gif', SMALL_GIF, 'image/gif'),
+        )
+        post.refresh_from_db()
+        card = post.renditions['card']
+        self.assertEqual((card['width'], card['height']), (960, 339))
+
+        Post.objects.filter(id=post.id).update(thumbnails='')
+        call_command('generate_thumbnails', workers=0, stdout=StringIO())
+        post.refresh_from_db()
+        self.assertEqual(post.renditions['card'], card)
+
+    def test_broken_image_does_not_stop_command(self):
+        """Пропавшая картинка одного поста не мешает следующим:
+           посты идут от новых к старым, битый пост - первым."""
+        user = User.objects.create_user(username='author')
+        post, broken = (
+            Post.objects.create(
+                text=f'Тестовый пост {number}',
+                author=user,
+                image=SimpleUploadedFile(f'small{number}.gif', SMALL_GIF,
+                                         'image/gif'),
+            )
+            for number in range(2)
+        )
+        Post.objects.update(thumbnails='')
+        os.remove(os.path.join(TEMP_MEDIA_ROOT, broken.image.name))
+        out = StringIO()
+        with self.assertLogs('posts.management.commands.generate_thumbnails',
+                             'ERROR'):
+            call_command('generate_thumbnails', workers=0, stdout=out)
+        self.assertIn('Готово постов: 1, с ошибками: 1', out.getvalue())
+        post.refresh_from_db()
+        self.assertIn('card', post.renditions)
+
+    def test_picture_has_srcset_per_format(self):
+        """Вариант нарезан во всех ширинах и доступных форматах,
+           post_picture собирает из них <picture>."""
+        user = User.objects.create_user(username='author')
+        post = Post.objects.create(
+            text='Тестовый пост',
+            author=user,
+            image=SimpleUploadedFile('small.gif', SMALL_GIF, 'image/gif'),
+        )
+        post.refresh_from_db()
+        card = post.renditions['card']
+        spec = settings.POST_IMAGE_RENDITIONS['card']
+        types = [source['type'] for source in card['sources']]
+        self.assertEqual(types, [FORMATS[name][1] for name in
+                                 available_formats(spec['formats'])])
+        for source in card['sources']:
+            self.assertEqual(source['srcset'].count('w,') + 1,
+                             len(spec['widths']))
+        html = post_picture(post)
+        self.assertIn('<picture>', html)
+        self.assertIn('type="image/webp"', html)
+        self.assertIn(f'sizes="{spec["sizes"]}"', html)
+        self.assertIn('width="960" height="339"', html)
+
+    def test_rendition_without_formats_is_skipped(self):
+        """Вариант, ни один формат которого Pillow не сохраняет,
+           пропускается, и карточка показывает исходную картинку."""
+        user = User.objects.create_user(username='author')
+        post = Post.objects.create(
+            text='Тестовый пост',
+            author=user,
+            image=SimpleUploadedFile('small.gif', SMALL_GIF, 'image/gif'),
+        )
+        with mock.patch('posts.renditions.available_formats',
+                        return_value=[]):
+            renditions = render_renditions(post.image.name)
+        self.assertEqual(renditions, {})
+        post.thumbnails = ''
+        self.assertIn(f'src="{post.image.url}"', post_picture(post))
+
+    def test_bench_renditions_reports_formats(self):
+        """bench_renditions сравнивает форматы с прежней миниатюрой."""
+        out = StringIO()
+        call_command('bench_renditions', count=1, stdout=out)
+        self.assertIn('image/webp', out.getvalue())
+        self.assertIn('прежней', out.getvalue())
+
+
+class TransferCommandsTest(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        author = User.objects.create_user(username='author')
+        reader = User.objects.create_user(username='reader')
+        group = Group.objects.create(title='Группа', slug='group',
+                                     description='Описание')
+        for number in range(3):
+            post = Post.objects.create(text=f'Пост {number}', author=author,
+                                       group=group if number else None)
+        Comment.objects.create(text='Комментарий', author=reader, post=post)
+        Follow.objects.create(user=reader, author=author)
+
+    def snapshot(self):
+        return {
+            'posts': list(Post.objects.order_by('pub_date').values_list(
+                'text', 'pub_date', 'author__username', 'group__slug',
+                'comments_count')),
+            'comments': list(Comment.objects.values_list(
+                'text', 'created', 'post__text', 'author__username')),
+            'follows': list(Follow.objects.values_list(
+                'user__username', 'author__username')),
+            'feed': FeedEntry.objects.count(),
+            'activity': list(GroupActivity.objects.values_list(
+                'group__slug', 'hour', 'posts', 'comments', 'authors')),
+            'posts_count': User.objects.get(
+                username='author').profile.posts_count,
+        }
+
+    def export_and_clear(self, file_format):
+        call_command('yatube_export', self.directory, format=file_format,
+                     stdout=StringIO())
+        expected = self.snapshot()
+        User.objects.all().delete()
+        Group.objects.all().delete()
+        return expected
+
+    def test_round_trip(self):
+        """Выгруженное загружается обратно вместе со связями,
+           датами, счётчиками, лентами, рейтингами горячей ленты,
+           активностью групп и поисковым индексом."""
+        for file_format in ('ndjson', 'csv'):
+            with self.subTest(file_format=file_format):
+                expected = self.export_and_clear(file_format)
+                call_command('yatube_import', self.directory,
+                             format=file_format, workers=0, batch_size=2,
+                             stdout=StringIO())
+                self.assertEqual(self.snapshot(), expected)
+                self.assertEqual(len(search.find('Пост')[0]), 3)
+                self.assertFalse(Post.objects.filter(hot_score=0).exists())
+
+    def test_import_refreshes_cached_pages(self):
+        """После загрузки закэшированные страницы показывают
+           загруженные посты."""
+        self.export_and_clear('ndjson')
+        self.assertNotContains(self.client.get(reverse('posts:index')),
+                               'Пост 1')
+        call_command('yatube_import', self.directory, workers=0,
+                     stdout=StringIO())
+        for url in (reverse('posts:index'),
+                    reverse('posts:group_list', args=['group'])):
+            with self.subTest(url=url):
+                self.assertContains(self.client.get(url), 'Пост 1')
+
+    def test_interrupted_import_resumes(self):
+        """Прерванная загрузка продолжается без повторов."""
+        expected = self.export_and_clear('ndjson')
+        insert = RowLoader.insert
+        calls = []
+
+        def failing_insert(loader, batch):
+            calls.append(batch)
+            if len(calls) == 3:
+                raise RuntimeError('Прервано')
+            insert(loader, batch)
+
+        with mock.patch.object(RowLoader, 'insert', failing_insert):
+            with self.assertRaises(RuntimeError):
+                call_command('yatube_import', self.directory, workers=0,
+                             batch_size=1, stdout=StringIO())
+        self.assertEqual(User.objects.count(), 2)
+        self.assertEqual(Post.objects.count(), 0)
+
+        out = StringIO()
+        call_command('yatube_import', self.directory, workers=0,
+                     stdout=out)
+        self.assertIn('Продолжаю', out.getvalue())
+        self.assertEqual(self.snapshot(), expected)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class LoadCommandsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        call_command('generate_data', users=30, groups=3, posts=200,
+                     comments=300, images=1, storm_posts=1, workers=0,
+                     stdout=StringIO())
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def test_generated_data_is_skewed(self):
+        """Данные с перекосами: шквал комментариев под одним постом,
+           горячая группа и картинки у части постов."""
+        self.assertEqual(User.objects.count(), 30)
+        self.assertEqual(Post.objects.count(), 200)
+        top = Post.objects.order_by('-comments_count')[0].comments_count
+        self.assertGreater(top, 100)
+        groups = [Post.objects.filter(group__slug=f'load_group-{pk}').count()
+                  for pk in (1, 3)]
+        self.assertGreater(groups[0], groups[1])
+        self.assertTrue(Post.objects.exclude(image=None).exists())
+        self.assertTrue(FeedEntry.objects.exists())
+
+    def test_loadtest_reports_every_view(self):
+        """loadtest печатает задержки и SQL-запросы каждого адреса
+           и падает, если запросов стало больше, чем в прошлом прогоне."""
+        out = StringIO()
+        baseline = os.path.join(TEMP_MEDIA_ROOT, 'baseline.json')
+        call_command('loadtest', requests=2, concurrency=1, save=baseline,
+                     stdout=out)
+        for name in ('index', 'group_list', 'profile', 'post_detail',
+                     'follow_index', 'post_create', 'add_comment',
+                     'profile_follow', 'profile_unfollow'):
+            self.assertIn(f'{name}: ', out.getvalue())
+        self.assertIn('ошибок 0', out.getvalue())
+
+        with open(baseline) as stream:
+            report = json.load(stream)
+        report['post_detail']['queries'] = 1
+        with open(baseline, 'w') as stream:
+            json.dump(report, stream)
+        with self.assertRaisesMessage(CommandError, 'post_detail'):
+            call_command('loadtest', requests=2, concurrency=1,
+                         views=['post_detail'], baseline=baseline,
+                         stdout=StringIO())
@@ -0,0 +1,107 @@
+from datetime import timedelta
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from posts import group_stats
+from posts.models import Comment, Group, GroupActivity, Post
+
+User = get_user_model()
+
+
+@override_settings(GROUP_STATS_WINDOW_HOURS=24, GROUP_TRENDING_SIZE=2)
+class GroupStatsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='auth')
+        cls.author = User.objects.create_user(username='author')
+        cls.group = Group.objects.create(title='Первая', slug='first')
+        cls.other = Group.objects.create(title='Вторая', slug='second')
+        cls.quiet = Group.objects.create(title='Третья', slug='third')
+
+    def setUp(self):
+        cache.clear()
+
+    def bucket(self, group):
+        return GroupActivity.objects.get(group=group)
+
+    def test_counters_follow_posts_and_comments(self):
+        """Посты и комментарии сдвигают корзину группы, участники
+           считаются без повторов."""
+        post = Post.objects.create(text='Пост', author=self.user,
+                                   group=self.group)
+        Post.objects.create(text='Ещё пост', author=self.user,
+                            group=self.group)
+        Comment.objects.create(text='Комментарий', post=post,
+                               author=self.author)
+        Comment.objects.create(text='Ещё', post=post, author=self.author)
+        bucket = self.bucket(self.group)
+        self.assertEqual((bucket.posts, bucket.comments, bucket.authors),
+                         (2, 2, 2))
+        post.delete()
+        bucket = self.bucket(self.group)
+        self.assertEqual((bucket.posts, bucket.comments), (1, 0))
+
+    def test_moved_post_changes_groups(self):
+        """Перенос поста в другую группу переносит его в статистике."""
+        post = Post.objects.create(text='Пост', author=self.user,
+                                   group=self.group)
+        post.group = self.other
+        post.save()
+        self.assertEqual(self.bucket(self.group).posts, 0)
+        self.assertEqual(self.bucket(self.other).posts, 1)
+
+    def test_trending_order_and_cache(self):
+        """Популярные группы упорядочены по рейтингу окна, а итоги
+           окна читаются из кэша."""
+        Post.objects.create(text='Пост', author=self.user, group=self.other)
+        for number in range(2):
+            Post.objects.create(text=f'Пост {number}', author=self.user,
+                                group=self.group)
+        GroupActivity.objects.create(
+            group=self.quiet, posts=100,
+            hour=group_stats.hour_of(timezone.now() - timedelta(days=2)))
+        trending = group_stats.window_stats()['trending']
+        self.assertEqual([group['slug'] for group in trending],
+                         ['first', 'second'])
+        self.assertEqual(trending[0]['posts'], 2)
+        Post.objects.create(text='Новый', author=self.user, group=self.quiet)
+        with self.assertNumQueries(0):
+            group_stats.window_stats()
+
+    def test_pages_show_stats(self):
+        """Главная показывает популярные группы, страница группы -
+           свою статистику, в том числе из закэшированной страницы."""
+        Post.objects.create(text='Пост', author=self.user, group=self.group)
+        client = Client()
+        for _ in range(2):
+            response = client.get(reverse('posts:index'))
+            self.assertContains(response, 'Популярные группы')
+            self.assertContains(
+                response, reverse('posts:group_list', args=['first']))
+        response = client.get(reverse('posts:group_list', args=['first']))
+        self.assertContains(response, 'постов: 1')
+
+    def test_rebuild_command(self):
+        """rebuild_group_stats пересобирает корзины по постам
+           и комментариям и отбрасывает старые."""
+        post = Post.objects.create(text='Пост', author=self.user,
+                                   group=self.group)
+        Comment.objects.create(text='Комментарий', post=post,
+                               author=self.author)
+        old = Post.objects.create(text='Старый', author=self.user,
+                                  group=self.other)
+        Post.objects.filter(id=old.id).update(
+            pub_date=timezone.now() - timedelta(days=30))
+        GroupActivity.objects.update(posts=10, comments=10, authors=10)
+        call_command('rebuild_group_stats', stdout=StringIO())
+        bucket = self.bucket(self.group)
+        self.assertEqual((bucket.posts, bucket.comments, bucket.authors),
+                         (1, 1, 2))
+        self.assertFalse(GroupActivity.objects.filter(
+            group=self.other).exists())
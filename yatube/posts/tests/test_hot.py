@@ -0,0 +1,103 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from posts import hot
+from posts.models import Comment, Follow, Post
+from posts.utilities import CURSOR_NEXT, encode_cursor
+
+User = get_user_model()
+
+
+@override_settings(HOT_HALF_LIFE_HOURS=1, HOT_SCORE_FLOOR=1)
+class HotFeedTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='auth')
+        cls.author = User.objects.create_user(username='author')
+        Follow.objects.create(user=cls.user, author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+
+    def score(self, post):
+        return Post.objects.get(id=post.id).hot_score
+
+    def test_score_follows_posts_and_comments(self):
+        """Новый пост получает рейтинг с надбавкой за подписчиков,
+           каждый комментарий добавляет к нему, а правка не сбрасывает."""
+        post = Post.objects.create(text='Пост', author=self.author)
+        self.assertEqual(self.score(post), hot.POST_WEIGHT + 1)
+        Comment.objects.create(text='Комментарий', post=post,
+                               author=self.user)
+        self.assertEqual(self.score(post),
+                         hot.POST_WEIGHT + 1 + hot.COMMENT_WEIGHT)
+        post.text = 'Правка'
+        post.save()
+        self.assertEqual(self.score(post),
+                         hot.POST_WEIGHT + 1 + hot.COMMENT_WEIGHT)
+
+    def test_decay_command(self):
+        """decay_hot_scores гасит рейтинги с периодом полураспада
+           и обнуляет те, что ниже порога."""
+        warm = Post.objects.create(text='Тёплый', author=self.user,
+                                   hot_score=8)
+        cold = Post.objects.create(text='Остывший', author=self.user,
+                                   hot_score=3)
+        call_command('decay_hot_scores', minutes=60, stdout=StringIO())
+        self.assertEqual(self.score(warm), 4)
+        self.assertEqual(self.score(cold), 1.5)
+        call_command('decay_hot_scores', minutes=60, stdout=StringIO())
+        self.assertEqual(self.score(warm), 2)
+        self.assertEqual(self.score(cold), 0)
+
+    def test_rebuild_command(self):
+        """decay_hot_scores --rebuild считает рейтинги заново."""
+        post = Post.objects.create(text='Пост', author=self.author)
+        Comment.objects.create(text='Комментарий', post=post,
+                               author=self.user)
+        Post.objects.update(hot_score=0)
+        call_command('decay_hot_scores', rebuild=True, stdout=StringIO())
+        self.assertAlmostEqual(self.score(post),
+                               hot.POST_WEIGHT + 1 + hot.COMMENT_WEIGHT,
+                               places=2)
+
+    def test_hot_page_orders_by_score(self):
+        """Горячая лента упорядочена по рейтингу и листается курсором."""
+        posts = [Post.objects.create(text=f'Пост {number}',
+                                     author=self.user, hot_score=number % 7)
+                 for number in range(1, 14)]
+        client = Client()
+        response = client.get(reverse('posts:hot'))
+        first_page = list(response.context['page_obj'])
+        expected = sorted(posts, key=lambda post: (-post.hot_score,
+                                                   -post.id))
+        self.assertEqual(first_page, expected[:10])
+        response = client.get(reverse('posts:hot'), {
+            'cursor': response.context['page_obj'].next_cursor})
+        self.assertEqual(list(response.context['page_obj']), expected[10:])
+
+    def test_hot_page_rejects_non_finite_cursor(self):
+        """Курсор с nan или бесконечностью считается испорченным:
+           отдаётся первая страница."""
+        post = Post.objects.create(text='Пост', author=self.user,
+                                   hot_score=1)
+        for value in ('nan', 'inf', '-inf'):
+            with self.subTest(value=value):
+                cursor = encode_cursor(CURSOR_NEXT, float(value), post.id)
+                response = Client().get(reverse('posts:hot'),
+                                        {'cursor': cursor})
+                self.assertEqual(list(response.context['page_obj']),
+                                 [post])
+
+    def test_bench_hot_scores_leaves_no_data(self):
+        """bench_hot_scores печатает замеры и откатывает свои данные."""
+        out = StringIO()
+        call_command('bench_hot_scores', posts=50, comments=20, stdout=out)
+        self.assertIn('обновлений/с', out.getvalue())
+        self.assertIn('Лента горячая', out.getvalue())
+        self.assertFalse(Post.objects.exists())
@@ -1,6 +1,10 @@
+from io import StringIO
+
 from django.contrib.auth import get_user_model
+from django.core.management import call_command
 from django.test import TestCase
 
+from users.models import Profile
 from ..models import Group, Post, Comment, Follow
 
 User = get_user_model()
@@ -141,3 +145,42 @@ class PostModelTest(TestCase):
                     self.follow._meta.get_field(field).help_text,
                     expected_value
                 )
+
+    def test_counters_follow_writes(self):
+        """Счётчики меняются при создании и удалении записей."""
+        profile = Profile.objects.get(user=self.user)
+        follower_profile = Profile.objects.get(user=self.follower)
+        self.assertEqual(profile.posts_count, 1)
+        self.assertEqual(profile.followers_count, 1)
+        self.assertEqual(follower_profile.following_count, 1)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comments_count, 1)
+
+        post = Post.objects.create(author=self.user, text='Второй пост')
+        Comment.objects.create(post=post, author=self.follower, text='Да')
+        Follow.objects.filter(user=self.follower).delete()
+        profile.refresh_from_db()
+        follower_profile.refresh_from_db()
+        post.refresh_from_db()
+        self.assertEqual(profile.posts_count, 2)
+        self.assertEqual(profile.followers_count, 0)
+        self.assertEqual(follower_profile.following_count, 0)
+        self.assertEqual(post.comments_count, 1)
+
+        post.delete()
+        profile.refresh_from_db()
+        self.assertEqual(profile.posts_count, 1)
+
+    def test_reconcile_counters(self):
+        """reconcile_counters восстанавливает испорченные счётчики."""
+        Profile.objects.update(posts_count=100, followers_count=100)
+        Post.objects.update(comments_count=100)
+        Profile.objects.filter(user=self.follower).delete()
+        call_command('reconcile_counters', stdout=StringIO())
+        profile = Profile.objects.get(user=self.user)
+        self.assertEqual(profile.posts_count, 1)
+        self.assertEqual(profile.followers_count, 1)
+        self.assertEqual(
+            Profile.objects.get(user=self.follower).following_count, 1)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comments_count, 1)
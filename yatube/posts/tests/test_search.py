@@ -0,0 +1,101 @@
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from posts import search
+from posts.models import Comment, Group, Post
+
+User = get_user_model()
+
+
+class SearchTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='author')
+        self.group = Group.objects.create(
+            title='Кошки',
+            slug='cats',
+            description='Всё про котов и кошек',
+        )
+        self.post = Post.objects.create(
+            text='Рыжий кот спит на диване',
+            author=self.user,
+            group=self.group,
+        )
+        self.comment = Comment.objects.create(
+            text='Мой кот тоже спит весь день',
+            author=self.user,
+            post=self.post,
+        )
+
+    def found(self, query, **kwargs):
+        hits, _ = search.find(query, **kwargs)
+        return [(hit.kind, hit.object.id) for hit in hits]
+
+    def check_index(self):
+        self.assertEqual(
+            sorted(self.found('кот спит')),
+            [('comment', self.comment.id), ('post', self.post.id)],
+        )
+        self.assertEqual(self.found('котов'), [('group', self.group.id)])
+        self.assertEqual(self.found('кот собака'), [])
+
+        self.post.text = 'Рыжая собака спит'
+        self.post.save()
+        self.assertEqual(self.found('собака'), [('post', self.post.id)])
+        self.assertEqual(self.found('рыжий'), [])
+
+        self.post.delete()
+        self.assertEqual(self.found('спит'), [])
+
+    def test_fts5_index_follows_changes(self):
+        """Индекс FTS5 обновляется при изменении и удалении объектов."""
+        self.assertEqual(search.get_backend().name, 'fts5')
+        self.check_index()
+
+    def test_inverted_index_follows_changes(self):
+        """Запасной обратный индекс ищет так же, как FTS5."""
+        with override_settings(POSTS_SEARCH_BACKEND='inverted'):
+            self.assertEqual(search.rebuild(), 3)
+            self.check_index()
+
+    def test_cursor_pagination(self):
+        """Страницы по курсору идут по убыванию релевантности
+           без пропусков и повторов."""
+        for backend in ('fts5', 'inverted'):
+            with override_settings(POSTS_SEARCH_BACKEND=backend):
+                search.rebuild()
+                for number in range(5):
+                    Post.objects.create(
+                        text='слово ' * (number + 1) + 'шум ' * 5,
+                        author=self.user,
+                    )
+                expected = self.found('слово', limit=10)
+                pages, cursor = [], None
+                while True:
+                    hits, cursor = search.find('слово', cursor, limit=2)
+                    pages.append([(hit.kind, hit.object.id) for hit in hits])
+                    if cursor is None:
+                        break
+                self.assertEqual([len(page) for page in pages], [2, 2, 1])
+                self.assertEqual(sum(pages, []), expected)
+                self.assertEqual(
+                    search.find('слово', limit=10)[0][0].object.text,
+                    'слово ' * 5 + 'шум ' * 5,
+                )
+                Post.objects.filter(text__startswith='слово').delete()
+
+    def test_search_pages(self):
+        """Страница поиска и API отдают найденное."""
+        response = self.client.get(reverse('posts:search'), {'q': 'котов'})
+        self.assertEqual(response.context['hits'][0].object, self.group)
+        self.assertContains(response, 'Всё про котов и кошек')
+
+        response = self.client.get(reverse('posts:search_api'),
+                                   {'q': 'кот', 'cursor': 'испорчен'})
+        results = response.json()['results']
+        self.assertEqual(
+            sorted((result['kind'], result['url']) for result in results),
+            [('comment', reverse('posts:post_detail', args=[self.post.id])),
+             ('post', reverse('posts:post_detail', args=[self.post.id]))],
+        )
+        self.assertIsNone(response.json()['next_cursor'])
@@ -1,14 +1,22 @@
 import tempfile
 import shutil
+import time
+from unittest import mock
 from django.contrib.auth import get_user_model
-from django.test import TestCase, Client, override_settings
+from django.test import (TestCase, TransactionTestCase, Client,
+                         override_settings)
 from django.urls import reverse
 from django import forms
 from django.conf import settings
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 
-from posts.models import Group, Post, Comment, Follow
+from posts.models import Group, Post, Comment, Follow, FeedEntry
+from posts.page_cache import author_scope, group_scope, post_scopes
+from posts.templatetags.post_cards import post_card_key
+from posts.utilities import NUMBER_OF_SHOWN_COMMENTS
 
 User = get_user_model()
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
@@ -153,7 +161,7 @@ class PostsPagesTests(TestCase):
                 form_field = response.context['form'].fields[value]
                 self.assertIsInstance(form_field, expected)
 
-        comment = response.context.get('comments').first()
+        comment = response.context.get('comments')[0]
         self.assertEqual(comment, self.comment)
         self.assertEqual(comment.text, self.comment.text)
         self.assertEqual(comment.post, self.comment.post)
@@ -201,6 +209,96 @@ class PostsPagesTests(TestCase):
                 response = self.guest_client.get(reverse_name + '?page=2')
                 self.assertEqual(len(response.context['page_obj']), 3)
 
+    def test_cursor_paginator_on_pages(self):
+        """Курсоры ведут вперёд и назад без COUNT-запроса."""
+        reverse_name = reverse('posts:group_list',
+                               kwargs={'slug': self.group.slug})
+        with CaptureQueriesContext(connection) as queries:
+            response = self.guest_client.get(reverse_name)
+        self.assertFalse(any('COUNT(' in query['sql']
+                             for query in queries.captured_queries))
+        first_page = response.context['page_obj']
+        self.assertEqual(len(first_page), 10)
+        self.assertFalse(first_page.has_previous())
+        self.assertTrue(first_page.has_next())
+
+        response = self.guest_client.get(
+            reverse_name, {'cursor': first_page.next_cursor})
+        second_page = response.context['page_obj']
+        self.assertEqual(len(second_page), 3)
+        self.assertTrue(second_page.has_previous())
+        self.assertFalse(second_page.has_next())
+
+        response = self.guest_client.get(
+            reverse_name, {'cursor': second_page.previous_cursor})
+        self.assertEqual(list(response.context['page_obj']),
+                         list(first_page))
+
+        response = self.guest_client.get(reverse_name, {'cursor': '%%%'})
+        self.assertEqual(list(response.context['page_obj']),
+                         list(first_page))
+
+    def test_comments_are_paged_by_cursor(self):
+        """На странице поста первая страница комментариев без
+           лишних полей, остальные подгружаются по курсору."""
+        Comment.objects.bulk_create(
+            Comment(text=f'Комментарий {i}', post=self.post, author=self.user)
+            for i in range(NUMBER_OF_SHOWN_COMMENTS)
+        )
+        with CaptureQueriesContext(connection) as queries:
+            response = self.guest_client.get(
+                reverse('posts:post_detail', args=[self.post.id]))
+        comments_sql = [query['sql'] for query in queries.captured_queries
+                        if 'FROM "posts_comment"' in query['sql']]
+        self.assertEqual(len(comments_sql), 1)
+        self.assertNotIn('"posts_post"', comments_sql[0])
+        self.assertNotIn('"auth_user"."password"', comments_sql[0])
+        comments = response.context['comments']
+        self.assertEqual(len(comments), NUMBER_OF_SHOWN_COMMENTS)
+        self.assertContains(response, 'data-more-comments')
+
+        older = reverse('posts:post_comments', args=[self.post.id])
+        response = self.guest_client.get(
+            older, {'cursor': comments.next_cursor})
+        self.assertTemplateUsed(response, 'includes/comments.html')
+        self.assertEqual(list(response.context['comments']), [self.comment])
+        self.assertNotContains(response, 'data-more-comments')
+
+        response = self.guest_client.get(
+            older, {'cursor': comments.next_cursor, 'format': 'json'})
+        self.assertEqual(response.json(), {
+            'comments': [{
+                'id': self.comment.id,
+                'author': self.user.username,
+                'text': self.comment.text,
+                'created': self.comment.created.isoformat(),
+            }],
+            'next_cursor': None,
+        })
+
+    def test_post_cards_are_cached_by_version(self):
+        """Карточки постов берутся из кэша, правка поста
+           меняет его версию и карточку."""
+        reverse_name = reverse('posts:group_list',
+                               kwargs={'slug': self.group.slug})
+        self.guest_client.get(reverse_name)
+        post = Post.objects.get(id=self.post.id)
+        key = post_card_key(post, follow_buttons=True)
+        self.assertIn(post.text, cache.get(key))
+
+        response = self.guest_client.get(reverse_name)
+        self.assertNotIn('includes/post.html',
+                         [template.name for template in response.templates])
+
+        self.authorized_client.post(
+            reverse('posts:post_edit', kwargs={'post_id': self.post.id}),
+            data={'text': 'Исправленное сообщение', 'group': self.group.id},
+        )
+        self.assertEqual(Post.objects.get(id=post.id).version,
+                         post.version + 1)
+        response = self.guest_client.get(reverse_name)
+        self.assertContains(response, 'Исправленное сообщение')
+
     def test_create_post_with_group(self):
         """Проверка, что при создании поста указать группу,
            то этот пост появляется"""
@@ -224,22 +322,201 @@ class PostsPagesTests(TestCase):
         self.assertNotIn(post, response.context['page_obj'])
 
     def test_cache_index_page(self):
-        """Проверка работы кэша записей index.html"""
+        """Страница index берётся из кэша, пока не изменились посты."""
         reverse_name = reverse('posts:index')
         response = self.authorized_client.get(reverse_name)
         content = response.content
+        Post.objects.filter(id=self.post.id).update(text='Без сигналов')
+        response = self.authorized_client.get(reverse_name)
+        self.assertEqual(response.content, content)
+
         Post.objects.create(
             text="Новое тестовое сообщение",
             author=self.user,
         )
         response = self.authorized_client.get(reverse_name)
-        content_old = response.content
-        self.assertEqual(content_old, content)
-
-        cache.clear()
+        self.assertNotEqual(response.content, content)
+        self.assertContains(response, 'Новое тестовое сообщение')
+
+    def test_stale_page_is_served_while_rebuilding(self):
+        """Пока другой процесс перестраивает страницу,
+           отдаётся её устаревшая версия."""
+        reverse_name = reverse('posts:group_list',
+                               kwargs={'slug': self.group.slug})
+        content = self.guest_client.get(reverse_name).content
+        Post.objects.create(
+            text="Новое тестовое сообщение",
+            author=self.user,
+            group=self.group,
+        )
+        with mock.patch.object(cache, 'add', return_value=False):
+            response = self.guest_client.get(reverse_name)
+        self.assertEqual(response.content, content)
+        response = self.guest_client.get(reverse_name)
+        self.assertContains(response, 'Новое тестовое сообщение')
+
+    def test_shared_page_has_viewer_holes(self):
+        """Страница рендерится один раз на всех, а шапка, правка
+           и форма комментария заполняются для каждого зрителя."""
+        pages_names = (
+            reverse('posts:index'),
+            reverse('posts:post_detail', kwargs={'post_id': self.post.id}),
+        )
+        edit = reverse('posts:post_edit', kwargs={'post_id': self.post.id})
+        for reverse_name in pages_names:
+            with self.subTest(reverse_name=reverse_name):
+                response = self.authorized_client.get(reverse_name)
+                self.assertContains(response, edit)
+                self.assertContains(response, self.AUTHOR_NAME)
+                self.assertNotContains(response, '<!--hole:')
+                response = self.guest_client.get(reverse_name)
+                self.assertNotIn('includes/post.html',
+                                 [template.name
+                                  for template in response.templates])
+                self.assertNotContains(response, edit)
+                self.assertNotContains(response, 'Выйти')
+                self.assertNotContains(response, 'csrfmiddlewaretoken')
+        response = self.authorized_client.get(pages_names[1])
+        self.assertContains(response, 'csrfmiddlewaretoken')
+        self.assertIn('private', response['Cache-Control'])
+
+    def test_unchanged_pages_return_304(self):
+        """Неизменившиеся страницы отдаются как 304 без запросов
+           к базе, гостевые можно держать в общих кэшах."""
+        pages_names = (
+            reverse('posts:index'),
+            reverse('posts:profile', kwargs={'username': self.AUTHOR_NAME}),
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+        )
+        for reverse_name in pages_names:
+            with self.subTest(reverse_name=reverse_name):
+                response = self.guest_client.get(reverse_name)
+                self.assertIn('public', response['Cache-Control'])
+                self.assertIn('s-maxage', response['Cache-Control'])
+                with self.assertNumQueries(0):
+                    response = self.guest_client.get(
+                        reverse_name,
+                        HTTP_IF_NONE_MATCH=response['ETag'],
+                    )
+                self.assertEqual(response.status_code, 304)
+        # Last-Modified появляется через секунду после изменения.
+        now = time.time_ns()
+        with mock.patch('posts.page_cache.time.time_ns',
+                        return_value=now + 2 * 10 ** 9):
+            response = self.guest_client.get(pages_names[0])
+            self.assertEqual(
+                self.guest_client.get(
+                    pages_names[0],
+                    HTTP_IF_MODIFIED_SINCE=response['Last-Modified'],
+                ).status_code,
+                304)
+            Post.objects.create(text='Новое тестовое сообщение',
+                                author=self.user)
+            for header, value in (('HTTP_IF_NONE_MATCH', response['ETag']),
+                                  ('HTTP_IF_MODIFIED_SINCE',
+                                   response['Last-Modified'])):
+                with self.subTest(header=header):
+                    response_new = self.guest_client.get(pages_names[0],
+                                                         **{header: value})
+                    self.assertContains(response_new,
+                                        'Новое тестовое сообщение')
+
+    @override_settings(PAGE_GENERATION_TIMEOUT=20)
+    def test_local_cache_generations_expire(self):
+        """С кэшем в памяти процесса поколения живут недолго: сдвиг
+           в другом процессе виден не позже чем через таймаут."""
+        url = reverse('posts:index')
+        etag = self.guest_client.get(url)['ETag']
+        with mock.patch('django.core.cache.backends.locmem.time.time',
+                        return_value=time.time() + 21):
+            response = self.guest_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_post_detail_validators(self):
+        """Страница поста отдаётся как 304 (гостю - без запросов
+           к базе), пока к нему не добавили комментарий; страница
+           вошедшего - только для него."""
+        reverse_name = reverse('posts:post_detail',
+                               kwargs={'post_id': self.post.id})
         response = self.authorized_client.get(reverse_name)
-        content_new = response.content
-        self.assertNotEqual(content_old, content_new)
+        self.assertIn('private', response['Cache-Control'])
+        self.assertFalse(response.has_header('Last-Modified'))
+        etag = response['ETag']
+        guest_etag = self.guest_client.get(reverse_name)['ETag']
+        self.assertNotEqual(guest_etag, etag)
+        with self.assertNumQueries(0):
+            response = self.guest_client.get(reverse_name,
+                                             HTTP_IF_NONE_MATCH=guest_etag)
+        self.assertEqual(response.status_code, 304)
+        response = self.authorized_client.get(reverse_name,
+                                              HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        Comment.objects.create(text='Новый комментарий', post=self.post,
+                               author=self.user)
+        response = self.authorized_client.get(reverse_name,
+                                              HTTP_IF_NONE_MATCH=etag)
+        self.assertContains(response, 'Новый комментарий')
+
+    def test_post_scopes_follow_post_group_and_author(self):
+        """Закэшированные области страницы поста сбрасываются при
+           переносе поста, смене слага группы и имени автора."""
+        post = Post.objects.create(text='Пост без группы', author=self.user)
+        self.assertEqual(post_scopes(post.id),
+                         [author_scope(self.AUTHOR_NAME)])
+        post.group = self.group
+        post.save()
+        self.assertIn(group_scope(self.group.slug), post_scopes(post.id))
+        group = Group.objects.get(id=self.group.id)
+        group.slug = 'new-slug'
+        group.save()
+        self.assertIn(group_scope('new-slug'), post_scopes(post.id))
+        user = User.objects.get(id=self.user.id)
+        user.username = 'renamed'
+        user.save()
+        self.assertIn(author_scope('renamed'), post_scopes(post.id))
+
+    def test_renames_refresh_cached_pages(self):
+        """Смена имени автора и названия или слага группы сдвигает
+           поколения лент, где видны карточки их постов."""
+        for rename in ('username', 'title', 'slug'):
+            with self.subTest(rename=rename):
+                user = User.objects.get(id=self.user.id)
+                group = Group.objects.get(id=self.group.id)
+                pages_names = (
+                    reverse('posts:index'),
+                    reverse('posts:profile',
+                            kwargs={'username': user.username}),
+                    reverse('posts:group_list',
+                            kwargs={'slug': group.slug}),
+                )
+                etags = [self.guest_client.get(name)['ETag']
+                         for name in pages_names]
+                if rename == 'username':
+                    user.username = f'{user.username}-new'
+                    user.save()
+                else:
+                    setattr(group, rename, f'{getattr(group, rename)}-new')
+                    group.save()
+                for name, etag in zip(pages_names, etags):
+                    response = self.guest_client.get(
+                        name, HTTP_IF_NONE_MATCH=etag)
+                    self.assertNotEqual(response.status_code, 304, name)
+
+    def test_cards_show_new_author_and_group_names(self):
+        """Закэшированные карточки постов показывают новые имя
+           автора и название группы."""
+        url = reverse('posts:index')
+        self.guest_client.get(url)
+        user = User.objects.get(id=self.user.id)
+        user.first_name = 'Новое имя'
+        user.save()
+        group = Group.objects.get(id=self.group.id)
+        group.title = 'Новое название'
+        group.save()
+        response = self.guest_client.get(url)
+        self.assertContains(response, 'Новое имя')
+        self.assertContains(response, 'Новое название')
 
 
 class FollowTests(TestCase):
@@ -318,6 +595,34 @@ class FollowTests(TestCase):
             reverse('posts:profile', kwargs={'username': self.AUTHOR_NAME}))
         self.assertFalse(response.context.get('following'))
 
+    def test_index_cards_have_follow_buttons(self):
+        """В карточках главной кнопки подписки на авторов: подписки
+           зрителя берутся одним запросом, а после подписки
+           закэшированная страница обновляется."""
+        cache.clear()
+        url = reverse('posts:index')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.authorized_client.get(url)
+        follow_queries = [query for query in queries
+                          if 'posts_follow' in query['sql']]
+        self.assertEqual(len(follow_queries), 1)
+        unfollow_1 = reverse('posts:profile_unfollow',
+                             kwargs={'username': self.AUTHOR_NAME})
+        follow_2 = reverse('posts:profile_follow',
+                           kwargs={'username': self.AUTHOR_2_NAME})
+        self.assertContains(response, unfollow_1, count=2)
+        self.assertContains(response, follow_2, count=1)
+        self.assertNotContains(self.guest_client.get(url), follow_2)
+
+        self.authorized_client.get(follow_2)
+        response = self.authorized_client.get(url)
+        self.assertContains(
+            response,
+            reverse('posts:profile_unfollow',
+                    kwargs={'username': self.AUTHOR_2_NAME}),
+        )
+        self.assertNotContains(response, follow_2)
+
     def test_new_post_appears_in_desired_feed(self):
         """Новая запись пользователя появляется в ленте тех, кто
            на него подписан и не появляется в ленте тех, кто не подписан."""
@@ -340,3 +645,82 @@ class FollowTests(TestCase):
         response = self.second_client.get(reverse('posts:follow_index'))
         self.assertEqual(len(response.context['page_obj']),
                          posts_user_2_count)
+
+    def test_feed_is_materialized_on_write(self):
+        """Пост раскладывается в ленту при публикации, при подписке
+           ленту дополняют старые посты, при отписке они удаляются."""
+        post = Post.objects.create(
+            text='Тестовое сообщение 4',
+            author=self.author,
+        )
+        self.assertTrue(FeedEntry.objects.filter(
+            user=self.user, post=post).exists())
+        self.assertFalse(FeedEntry.objects.filter(
+            user=self.user_2, post=post).exists())
+
+        self.authorized_client.get(
+            reverse('posts:profile_follow',
+                    kwargs={'username': self.AUTHOR_2_NAME}))
+        self.assertEqual(
+            FeedEntry.objects.filter(user=self.user,
+                                     author=self.author_2).count(),
+            1,
+        )
+        self.authorized_client.get(
+            reverse('posts:profile_unfollow',
+                    kwargs={'username': self.AUTHOR_NAME}))
+        self.assertFalse(FeedEntry.objects.filter(
+            user=self.user, author=self.author).exists())
+        response = self.authorized_client.get(reverse('posts:follow_index'))
+        self.assertEqual(len(response.context['page_obj']), 1)
+
+    @override_settings(FEED_CELEBRITY_FOLLOWERS=1)
+    def test_celebrity_posts_are_read_on_demand(self):
+        """Посты популярных авторов не раскладываются,
+           но попадают в ленту при чтении."""
+        post = Post.objects.create(
+            text='Тестовое сообщение 4',
+            author=self.author,
+        )
+        self.assertFalse(FeedEntry.objects.filter(post=post).exists())
+        response = self.authorized_client.get(reverse('posts:follow_index'))
+        page = response.context['page_obj']
+        self.assertEqual(len(page), 3)
+        self.assertEqual(page[0], post)
+
+
+class ConcurrentLookupsTests(TransactionTestCase):
+    """Потоки пула не видят незавершённой транзакции TestCase,
+    поэтому данные здесь сохраняются по-настоящему."""
+
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username='author')
+        self.group = Group.objects.create(title='Тестовая группа',
+                                          slug='test-slug',
+                                          description='Тестовое описание')
+        self.post = Post.objects.create(text='Тестовое сообщение',
+                                        author=self.author, group=self.group)
+        Comment.objects.create(text='Тестовый комментарий', post=self.post,
+                               author=self.author)
+
+    def get_content(self, url, workers):
+        cache.clear()
+        with override_settings(POSTS_LOOKUP_WORKERS=workers):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response.content
+
+    def test_pages_match_sequential_lookups(self):
+        """Страницы с запросами в пуле потоков совпадают
+           с последовательными."""
+        pages_names = (
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile', kwargs={'username': 'author'}),
+            reverse('posts:post_detail', kwargs={'post_id': self.post.id}),
+        )
+        for reverse_name in pages_names:
+            with self.subTest(reverse_name=reverse_name):
+                content = self.get_content(reverse_name, 2)
+                self.assertIn('Тестовое сообщение'.encode(), content)
+                self.assertEqual(content, self.get_content(reverse_name, 0))
@@ -0,0 +1,153 @@
+import shutil
+import tempfile
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts import search, signals, write_queue
+from posts.models import Comment, FeedEntry, Follow, Post
+from users.models import Profile
+
+User = get_user_model()
+SPOOL_DIR = tempfile.mkdtemp()
+
+
+@override_settings(POSTS_WRITE_QUEUE_BROKER='spool',
+                   POSTS_WRITE_QUEUE_SPOOL_DIR=SPOOL_DIR)
+class WriteQueueTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.user = User.objects.create_user(username='follower')
+        cls.post = Post.objects.create(text='Тестовый пост',
+                                       author=cls.author)
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(SPOOL_DIR, ignore_errors=True)
+
+    def setUp(self):
+        write_queue._brokers.clear()
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def process(self):
+        call_command('process_write_queue', once=True, stdout=StringIO())
+
+    def test_follow_is_visible_before_it_is_applied(self):
+        """Подписка из очереди сразу видна подписчику, а счётчики
+        сдвигаются, когда её применит разборщик."""
+        profile = reverse('posts:profile', args=[self.author.username])
+        self.client.get(profile)
+        self.client.get(reverse('posts:profile_follow',
+                                args=[self.author.username]))
+        self.assertFalse(Follow.objects.exists())
+        self.assertTrue(self.client.get(profile).context['following'])
+
+        self.process()
+        self.assertTrue(Follow.objects.filter(user=self.user,
+                                              author=self.author).exists())
+        self.assertEqual(write_queue.pending_ops(self.user.id), [])
+        self.assertEqual(
+            Profile.objects.get(user=self.author).followers_count, 1)
+        self.assertTrue(self.client.get(profile).context['following'])
+
+    def test_follow_and_unfollow_collapse(self):
+        """Подписка и отписка в одной пачке не пишут ничего."""
+        for name in ('posts:profile_follow', 'posts:profile_unfollow'):
+            self.client.get(reverse(name, args=[self.author.username]))
+        with CaptureQueriesContext(connection) as queries:
+            self.process()
+        self.assertFalse(Follow.objects.exists())
+        self.assertFalse([query for query in queries
+                          if query['sql'].startswith('INSERT')])
+        self.assertEqual(
+            Profile.objects.get(user=self.author).followers_count, 0)
+
+    def test_comments_are_applied_in_one_batch(self):
+        """Комментарии видны автору до применения, вставляются одним
+        INSERT, сдвигают счётчик одним UPDATE и попадают в поиск."""
+        url = reverse('posts:add_comment', args=[self.post.id])
+        for number in range(5):
+            self.client.post(url, {'text': f'Комментарий {number}'})
+        self.assertFalse(Comment.objects.exists())
+        detail = reverse('posts:post_detail', args=[self.post.id])
+        response = self.client.get(detail)
+        self.assertEqual(len(response.context['pending_comments']), 5)
+        self.assertContains(response, 'Комментарий 4')
+
+        with CaptureQueriesContext(connection) as queries:
+            self.process()
+        self.assertEqual(Comment.objects.count(), 5)
+        self.assertEqual(Post.objects.get(id=self.post.id).comments_count, 5)
+        counter_updates = [query for query in queries
+                           if query['sql'].startswith('UPDATE "posts_post"')]
+        self.assertEqual(len(counter_updates), 1)
+        inserts = [query for query in queries
+                   if query['sql'].startswith('INSERT INTO "posts_comment"')]
+        self.assertEqual(len(inserts), 1)
+        for comment in Comment.objects.all():
+            with self.subTest(text=comment.text):
+                hits, _ = search.find(comment.text)
+                self.assertIn(comment, [hit.object for hit in hits])
+        response = self.client.get(detail)
+        self.assertEqual(response.context['pending_comments'], [])
+        self.assertContains(response, 'Комментарий 4', count=1)
+
+    def test_follows_are_applied_in_one_batch(self):
+        """Подписки пачки вставляются одним INSERT и сдвигают
+        счётчики и ленты, как поштучные."""
+        Post.objects.create(text='Пост второго автора', author=self.user)
+        reader = User.objects.create_user(username='reader')
+        ops = [write_queue.make_op(write_queue.FOLLOW, user.id, author.id)
+               for user, author in ((self.user, self.author),
+                                    (reader, self.author),
+                                    (reader, self.user))]
+        with CaptureQueriesContext(connection) as queries:
+            write_queue.apply_batch(ops)
+        inserts = [query for query in queries
+                   if query['sql'].startswith('INSERT INTO "posts_follow"')]
+        self.assertEqual(len(inserts), 1)
+        self.assertEqual(Follow.objects.count(), 3)
+        self.assertEqual(
+            Profile.objects.get(user=self.author).followers_count, 2)
+        self.assertEqual(Profile.objects.get(user=reader).following_count, 2)
+        self.assertEqual(FeedEntry.objects.filter(user=reader).count(), 2)
+
+    @override_settings(FEED_CELEBRITY_FOLLOWERS=3)
+    def test_batched_unfollows_cross_celebrity_threshold(self):
+        """Несколько отписок в пачке, уводящие автора ниже порога
+        "знаменитости", раскладывают его посты оставшимся подписчикам."""
+        followers = [User.objects.create_user(username=f'reader{number}')
+                     for number in range(3)]
+        for follower in followers:
+            Follow.objects.create(user=follower, author=self.author)
+        post = Post.objects.create(text='Пост знаменитости',
+                                   author=self.author)
+        self.assertFalse(FeedEntry.objects.filter(post=post).exists())
+        with signals.batched():
+            Follow.objects.filter(user__in=followers[:2]).delete()
+        self.assertEqual(
+            Profile.objects.get(user=self.author).followers_count, 1)
+        self.assertEqual(
+            list(FeedEntry.objects.filter(post=post)
+                                  .values_list('user_id', flat=True)),
+            [followers[2].id])
+
+    def test_in_process_broker_takes_batches(self):
+        """Очередь в памяти отдаёт пачки не больше max_items."""
+        broker = write_queue.InProcessBroker(start_worker=False)
+        for number in range(3):
+            broker.put(write_queue.make_op(write_queue.FOLLOW, 1, number))
+        self.assertEqual(len(broker.take(2, 0.01)), 2)
+        self.assertEqual(len(broker.take(2, 0.01)), 1)
+        self.assertEqual(broker.take(2, 0.01), [])
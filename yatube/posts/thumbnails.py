@@ -0,0 +1,80 @@
+import json
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from threading import Lock
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import F
+
+from . import page_cache
+from .models import Post
+from .renditions import init_worker, render_renditions
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = Lock()
+
+
+def save_renditions(post_id, image_name, renditions):
+    """Записывает варианты картинки в пост, если картинка за это
+    время не сменилась, и сбрасывает кэши страниц с постом."""
+    updated = Post.objects.filter(id=post_id, image=image_name).update(
+        thumbnails=json.dumps(renditions),
+        version=F('version') + 1,
+    )
+    post = Post.objects.filter(id=post_id).first()
+    if updated and post is not None:
+        page_cache.invalidate_post_pages(post)
+
+
+def generate(post_id, image_name):
+    try:
+        renditions = render_renditions(image_name)
+    except Exception:
+        logger.exception('Не удалось сделать миниатюры поста %s', post_id)
+        return
+    save_renditions(post_id, image_name, renditions)
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(
+                max_workers=settings.POSTS_THUMBNAIL_WORKERS,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=init_worker,
+            )
+        return _executor
+
+
+def _on_rendered(post_id, image_name, future):
+    try:
+        save_renditions(post_id, image_name, future.result())
+    except Exception:
+        logger.exception('Не удалось сделать миниатюры поста %s', post_id)
+    finally:
+        close_old_connections()
+
+
+def _submit(post_id, image_name):
+    future = get_executor().submit(render_renditions, image_name)
+    future.add_done_callback(
+        lambda done: _on_rendered(post_id, image_name, done))
+
+
+def schedule(post):
+    """Ставит генерацию миниатюр поста в пул процессов после фиксации
+    транзакции: иначе готовые миниатюры могут не найти пост.
+
+    При POSTS_THUMBNAIL_WORKERS = 0 (тесты) миниатюры делаются сразу
+    в текущем процессе.
+    """
+    image_name = post.image.name
+    if not settings.POSTS_THUMBNAIL_WORKERS:
+        generate(post.id, image_name)
+        return
+    transaction.on_commit(lambda: _submit(post.id, image_name))
@@ -0,0 +1,305 @@
+"""Потоковые выгрузка и загрузка пользователей, групп, постов,
+комментариев и подписок в NDJSON или CSV (команды yatube_export
+и yatube_import).
+
+Файлы читаются и пишутся построчно. Внешние ключи при загрузке
+переводятся картами id: пользователи и группы сопоставляются по имени
+и слагу, а посты и комментарии получают id со сдвигом на максимальный
+id в базе на момент начала загрузки, поэтому их карта - одно число.
+Каждая пачка вставляется одним INSERT с пропуском конфликтов, так что
+повтор уже вставленной пачки после прерывания ничего не портит.
+Сигналы при этом не срабатывают: счётчики, ленты и поисковый индекс
+yatube_import пересчитывает в конце.
+"""
+import csv
+import json
+import os
+from datetime import datetime
+
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Max
+
+from .models import Comment, Follow, Group, Post, User
+
+FORMATS = ('ndjson', 'csv')
+STATE_FILE = 'state.json'
+
+
+class Table:
+    def __init__(self, name, model, fields, natural_key=None,
+                 foreign_keys=None, keep_ids=False):
+        self.name = name
+        self.model = model
+        self.fields = fields
+        self.natural_key = natural_key
+        self.foreign_keys = foreign_keys or {}
+        self.keep_ids = keep_ids
+
+    def path(self, directory, file_format):
+        return os.path.join(directory, f'{self.name}.{file_format}')
+
+
+# Порядок важен: таблица загружается после тех, на которые ссылается.
+TABLES = (
+    Table('users', User, ('id', 'username', 'password', 'first_name',
+                          'last_name', 'email', 'is_staff', 'is_active',
+                          'is_superuser', 'last_login', 'date_joined'),
+          natural_key='username'),
+    Table('groups', Group, ('id', 'title', 'slug', 'description'),
+          natural_key='slug'),
+    Table('posts', Post, ('id', 'text', 'pub_date', 'author_id', 'group_id',
+                          'image', 'version'),
+          foreign_keys={'author_id': 'users', 'group_id': 'groups'},
+          keep_ids=True),
+    Table('comments', Comment, ('id', 'post_id', 'author_id', 'text',
+                                'created'),
+          foreign_keys={'post_id': 'posts', 'author_id': 'users'},
+          keep_ids=True),
+    Table('follows', Follow, ('id', 'user_id', 'author_id'),
+          foreign_keys={'user_id': 'users', 'author_id': 'users'}),
+)
+TABLES_BY_NAME = {table.name: table for table in TABLES}
+
+
+class OffsetMap:
+    """Карта id для таблиц, загружаемых с сохранением id: id в базе
+    равен исходному плюс сдвиг."""
+    def __init__(self, offset):
+        self.offset = offset
+
+    def __getitem__(self, pk):
+        return pk + self.offset
+
+
+def _dump_value(value, file_format):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if value is None and file_format == 'csv':
+        return ''
+    return value
+
+
+def write_rows(stream, file_format, fields, rows):
+    if file_format == 'csv':
+        writer = csv.writer(stream)
+        writer.writerow(fields)
+        for row in rows:
+            writer.writerow([_dump_value(value, 'csv') for value in row])
+        return
+    for row in rows:
+        stream.write(json.dumps(
+            dict(zip(fields, (_dump_value(value, 'ndjson')
+                              for value in row))),
+            ensure_ascii=False,
+        ))
+        stream.write('\n')
+
+
+def read_rows(stream, file_format):
+    if file_format == 'csv':
+        yield from csv.DictReader(stream)
+        return
+    for line in stream:
+        if line.strip():
+            yield json.loads(line)
+
+
+def export_table(table, directory, file_format, batch_size):
+    rows = (table.model.objects.order_by('pk')
+                               .values_list(*table.fields)
+                               .iterator(batch_size))
+    with open(table.path(directory, file_format), 'w', newline='',
+              encoding='utf-8') as stream:
+        write_rows(stream, file_format, table.fields, rows)
+
+
+INTEGER_TYPES = ('AutoField', 'BigAutoField', 'IntegerField',
+                 'BigIntegerField', 'PositiveIntegerField',
+                 'PositiveSmallIntegerField', 'SmallIntegerField')
+
+
+class RowLoader:
+    """Готовит строки файла к вставке одним INSERT на пачку в обход
+    моделей: значения приводятся к типам полей и переводятся картами
+    id, поля, которых нет в файле, получают значения по умолчанию.
+
+    Преобразование каждого поля выбирается один раз: на десятках
+    миллионов строк разбор строки - основная работа загрузки.
+    """
+    def __init__(self, table, id_maps):
+        self.table = table
+        self.connection = connection
+        meta = table.model._meta
+        fields = [field for field in meta.concrete_fields
+                  if table.keep_ids or not field.primary_key]
+        self.columns = []
+        for field in fields:
+            id_map = None
+            if field.primary_key:
+                id_map = id_maps[table.name]
+            elif field.attname in table.foreign_keys:
+                id_map = id_maps[table.foreign_keys[field.attname]]
+            self.columns.append(
+                (field, field.attname, self.get_converter(field), id_map)
+            )
+        ops = connection.ops
+        self.sql = '{} {} ({}) VALUES ({}){}'.format(
+            ops.insert_statement(ignore_conflicts=True),
+            ops.quote_name(meta.db_table),
+            ', '.join(ops.quote_name(field.column) for field in fields),
+            ', '.join(['%s'] * len(fields)),
+            ops.ignore_conflicts_suffix_sql(ignore_conflicts=True),
+        )
+
+    def get_converter(self, field):
+        target = field.target_field if field.is_relation else field
+        internal_type = target.get_internal_type()
+        if internal_type in INTEGER_TYPES:
+            return int
+        to_python = field.to_python
+        if internal_type == 'DateTimeField':
+            # Выгрузка пишет даты в ISO 8601, а fromisoformat разбирает
+            # их в разы быстрее регулярного выражения to_python.
+            def to_python(value):
+                try:
+                    return datetime.fromisoformat(value)
+                except (TypeError, ValueError):
+                    return field.to_python(value)
+
+        def convert(value):
+            return field.get_db_prep_save(to_python(value), self.connection)
+        return convert
+
+    def parse(self, row):
+        values = []
+        for field, name, convert, id_map in self.columns:
+            value = row.get(name, field)
+            if value is field:
+                value = field.get_db_prep_save(field.get_default(),
+                                               self.connection)
+            # В CSV нет null: пустая строка в null-поле - это None.
+            elif value is None or (value == '' and field.null):
+                value = None
+            else:
+                value = convert(value)
+                if id_map is not None:
+                    value = id_map[value]
+            values.append(value)
+        return values
+
+    def insert(self, batch):
+        with transaction.atomic(), self.connection.cursor() as cursor:
+            cursor.executemany(self.sql, batch)
+
+
+def build_natural_map(table, directory, file_format, batch_size):
+    """Карта исходный id -> id в базе по естественному ключу."""
+    natural = {}
+    with open(table.path(directory, file_format), newline='',
+              encoding='utf-8') as stream:
+        for row in read_rows(stream, file_format):
+            natural[row[table.natural_key]] = int(row['id'])
+    id_map = {}
+    keys = list(natural)
+    for start in range(0, len(keys), batch_size):
+        found = table.model.objects.filter(**{
+            f'{table.natural_key}__in': keys[start:start + batch_size]
+        }).values_list(table.natural_key, 'pk')
+        id_map.update((natural[key], pk) for key, pk in found)
+    return id_map
+
+
+class ImportState:
+    """Состояние загрузки в каталоге state_dir: параметры и сдвиги id
+    в state.json, число загруженных строк каждого процесса в файле
+    <таблица>.<процесс>, готовые таблицы - в <таблица>.done."""
+    def __init__(self, state_dir):
+        self.state_dir = state_dir
+
+    def _path(self, name):
+        return os.path.join(self.state_dir, name)
+
+    def load(self):
+        try:
+            with open(self._path(STATE_FILE)) as stream:
+                return json.load(stream)
+        except FileNotFoundError:
+            return None
+
+    def save(self, state):
+        os.makedirs(self.state_dir, exist_ok=True)
+        self._write(STATE_FILE, json.dumps(state))
+
+    def _write(self, name, content):
+        # Запись через временный файл: прерывание не оставит
+        # наполовину записанную отметку.
+        temporary = self._path(name + '.tmp')
+        with open(temporary, 'w') as stream:
+            stream.write(content)
+        os.replace(temporary, self._path(name))
+
+    def done_rows(self, table, worker):
+        try:
+            with open(self._path(f'{table}.{worker}')) as stream:
+                return int(stream.read())
+        except FileNotFoundError:
+            return 0
+
+    def mark_rows(self, table, worker, count):
+        self._write(f'{table}.{worker}', str(count))
+
+    def is_done(self, table):
+        return os.path.exists(self._path(f'{table}.done'))
+
+    def mark_done(self, table):
+        self._write(f'{table}.done', '')
+
+
+def import_part(table_name, directory, file_format, state_dir, id_maps,
+                worker, workers, batch_size):
+    """Загружает строки таблицы с номерами, дающими остаток worker
+    при делении на workers, пачками по batch_size. После каждой пачки
+    число загруженных строк сохраняется, и повторный запуск начинает
+    с первой незагруженной пачки."""
+    table = TABLES_BY_NAME[table_name]
+    loader = RowLoader(table, id_maps)
+    state = ImportState(state_dir)
+    skip = state.done_rows(table_name, worker)
+    count, batch = 0, []
+
+    def flush():
+        loader.insert(batch)
+        state.mark_rows(table_name, worker, count)
+        batch.clear()
+
+    with open(table.path(directory, file_format), newline='',
+              encoding='utf-8') as stream:
+        for number, row in enumerate(read_rows(stream, file_format)):
+            if number % workers != worker:
+                continue
+            count += 1
+            if count <= skip:
+                continue
+            batch.append(loader.parse(row))
+            if len(batch) >= batch_size:
+                flush()
+        if batch:
+            flush()
+    return count
+
+
+def get_offsets():
+    return {
+        table.name: table.model.objects.aggregate(top=Max('pk'))['top'] or 0
+        for table in TABLES if table.keep_ids
+    }
+
+
+def reset_sequences():
+    """После вставки с явными id сдвигает счётчики id в базе
+    (в PostgreSQL; у SQLite список команд пуст)."""
+    models = [table.model for table in TABLES if table.keep_ids]
+    with connection.cursor() as cursor:
+        for sql in connection.ops.sequence_reset_sql(no_style(), models):
+            cursor.execute(sql)
@@ -1,9 +1,183 @@
-from django.core.paginator import Paginator
+import base64
+import binascii
+import math
+
+from django.core.paginator import Page, Paginator
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+from .models import Comment
 
 NUMBER_OF_SHOWN_POSTS = 10
+NUMBER_OF_SHOWN_COMMENTS = 20
+CURSOR_NEXT = 'n'
+CURSOR_PREVIOUS = 'p'
+CURSOR_SEPARATOR = '|'
+
+
+def encode_cursor(direction, date, pk):
+    """Упаковывает ключ (дата, id) в непрозрачный токен для URL.
+    Вместо даты может быть число - например, рейтинг поста."""
+    value = date.isoformat() if hasattr(date, 'isoformat') else repr(date)
+    raw = CURSOR_SEPARATOR.join((direction, value, str(pk)))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token, parse=parse_datetime):
+    """Распаковывает токен, первое поле ключа разбирает parse.
+    Возвращает None, если токен испорчен."""
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode()).decode()
+        direction, date, pk = raw.split(CURSOR_SEPARATOR)
+        date = parse(date)
+        pk = int(pk)
+    except (binascii.Error, UnicodeError, ValueError):
+        return None
+    if direction not in (CURSOR_NEXT, CURSOR_PREVIOUS) or date is None:
+        return None
+    return direction, date, pk
+
+
+def keyset_slice(queryset, fields, date, pk, backwards, limit):
+    """Срез queryset из limit объектов, идущих после ключа (date, pk)
+    в порядке убывания полей fields (или возрастания при backwards)."""
+    date_field, id_field = fields
+    sign = '' if backwards else '-'
+    queryset = queryset.order_by(f'{sign}{date_field}', f'{sign}{id_field}')
+    if date is not None:
+        lookup = 'gt' if backwards else 'lt'
+        # Лишнее с точки зрения логики условие date_field <= date
+        # позволяет базе начать чтение индекса сразу с нужного места.
+        queryset = queryset.filter(
+            Q(**{f'{date_field}__{lookup}': date})
+            | Q(**{date_field: date, f'{id_field}__{lookup}': pk}),
+            **{f'{date_field}__{lookup}e': date},
+        )
+    return queryset[:limit]
+
+
+class CursorPaginator(Paginator):
+    """Пагинатор по ключу (дата, id) вместо COUNT и OFFSET.
+
+    Каждая страница - один запрос с LIMIT per_page + 1 по индексу,
+    поэтому её стоимость не зависит от глубины. Номеров страниц нет:
+    number равен 2, если есть предыдущая страница, и num_pages
+    подобран так, чтобы has_next()/has_previous() у Page были верны.
+    """
+    date_field = 'pub_date'
+    id_field = 'id'
+    parse_key = staticmethod(parse_datetime)
+
+    def __init__(self, object_list, per_page, **kwargs):
+        super().__init__(
+            object_list.order_by(f'-{self.date_field}', f'-{self.id_field}'),
+            per_page,
+            **kwargs,
+        )
+        self._has_next = False
+        self._has_previous = False
+
+    def get_key(self, obj):
+        return getattr(obj, self.date_field), getattr(obj, self.id_field)
+
+    @property
+    def num_pages(self):
+        return 1 + self._has_previous + self._has_next
+
+    def get_page(self, cursor):
+        """Возвращает страницу по токену, для пустого или
+        испорченного токена - первую страницу."""
+        key = decode_cursor(cursor, self.parse_key) if cursor else None
+        if key is None:
+            return self.build_page(*self.fetch(None, None), backwards=False)
+        direction, date, pk = key
+        backwards = direction == CURSOR_PREVIOUS
+        return self.build_page(*self.fetch(date, pk, backwards), backwards)
+
+    def fetch(self, date, pk, backwards=False):
+        """Достаёт per_page + 1 объектов после ключа (date, pk)."""
+        queryset = keyset_slice(
+            self.object_list, (self.date_field, self.id_field),
+            date, pk, backwards, self.per_page + 1,
+        )
+        return list(queryset), date is not None
+
+    def build_page(self, objects, has_key, backwards):
+        has_more = len(objects) > self.per_page
+        objects = objects[:self.per_page]
+        if backwards:
+            objects.reverse()
+            self._has_previous, self._has_next = has_more, has_key
+        else:
+            self._has_previous, self._has_next = has_key, has_more
+        page = Page(objects, 1 + self._has_previous, self)
+        attach_cursors(page, self)
+        return page
+
+
+class CommentPaginator(CursorPaginator):
+    """Комментарии поста от новых к старым по ключу (created, id)."""
+    date_field = 'created'
+
+
+def parse_score(value):
+    """Рейтинг из курсора; nan и бесконечности - испорченный токен."""
+    score = float(value)
+    if not math.isfinite(score):
+        raise ValueError(value)
+    return score
+
+
+class HotPaginator(CursorPaginator):
+    """Посты по убыванию рейтинга горячей ленты, ключ (hot_score, id)."""
+    date_field = 'hot_score'
+    parse_key = staticmethod(parse_score)
+
+
+def attach_cursors(page, paginator):
+    """Добавляет странице токены next_cursor и previous_cursor."""
+    page.next_cursor = page.previous_cursor = None
+    if page.has_next() and len(page):
+        page.next_cursor = encode_cursor(
+            CURSOR_NEXT, *paginator.get_key(page[len(page) - 1])
+        )
+    if page.has_previous() and len(page):
+        page.previous_cursor = encode_cursor(
+            CURSOR_PREVIOUS, *paginator.get_key(page[0])
+        )
+    return page
 
 
 def get_paginator_posts(request, post_list):
-    paginator = Paginator(post_list, NUMBER_OF_SHOWN_POSTS)
+    """Страница постов по курсору из ?cursor=.
+
+    Старые ссылки вида ?page=N продолжают работать через обычный
+    Paginator, но их страницы тоже получают курсоры, так что дальше
+    навигация идёт уже без OFFSET.
+    """
+    paginator = CursorPaginator(post_list, NUMBER_OF_SHOWN_POSTS)
     page_number = request.GET.get('page')
-    return paginator.get_page(page_number)
+    if page_number is not None and 'cursor' not in request.GET:
+        legacy = Paginator(paginator.object_list, NUMBER_OF_SHOWN_POSTS)
+        return attach_cursors(legacy.get_page(page_number), paginator)
+    return paginator.get_page(request.GET.get('cursor'))
+
+
+def get_hot_page(request, post_list):
+    """Страница горячей ленты по курсору из ?cursor=."""
+    paginator = HotPaginator(post_list, NUMBER_OF_SHOWN_POSTS)
+    return paginator.get_page(request.GET.get('cursor'))
+
+
+def get_comments_page(request, post_id):
+    """Страница комментариев поста по курсору из ?cursor=. Достаются
+    только поля, которые показывает шаблон, и имя автора."""
+    comments = (
+        Comment.objects.select_related('author')
+                       .only('id', 'post', 'author', 'text', 'created',
+                             'author__username')
+                       .filter(post_id=post_id)
+    )
+    paginator = CommentPaginator(comments, NUMBER_OF_SHOWN_COMMENTS)
+    return paginator.get_page(request.GET.get('cursor'))
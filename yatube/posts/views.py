@@ -1,14 +1,23 @@
 from django.shortcuts import get_object_or_404, redirect, render
 from django.contrib.auth.decorators import login_required
-from django.http import Http404
-from django.views.decorators.cache import cache_page
+from django.http import Http404, JsonResponse
+from django.urls import reverse
 
+from core.routers import primary_db
+
+from .concurrency import run_concurrently
+from .feed import get_feed_page
+from .hot import HOT_SCOPE
 from .forms import PostForm, CommentForm
-from .models import Group, Post, User, Comment, Follow
-from .utilities import get_paginator_posts
+from . import write_queue
+from .models import Group, Post, User
+from .search import find
+from .page_cache import (GLOBAL_SCOPE, author_scope,
+                         cache_page_by_generation, group_scope, post_scopes)
+from .utilities import get_comments_page, get_hot_page, get_paginator_posts
 
 
-@cache_page(20, key_prefix='index_page')
+@cache_page_by_generation(lambda: [GLOBAL_SCOPE])
 def index(request):
     context = {
         'title': 'Последние обновления на сайте',
@@ -20,56 +29,98 @@ def index(request):
     return render(request, 'posts/index.html', context)
 
 
+@cache_page_by_generation(lambda: [GLOBAL_SCOPE, HOT_SCOPE])
+def hot(request):
+    context = {
+        'title': 'Популярные записи',
+        'page_obj': get_hot_page(
+            request,
+            Post.objects.select_related('author', 'group')
+        ),
+    }
+    return render(request, 'posts/hot.html', context)
+
+
+@cache_page_by_generation(lambda slug: [group_scope(slug)])
 def group_posts(request, slug):
-    group = get_object_or_404(
-        Group.objects.select_related(),
-        slug=slug
+    group, page_obj = run_concurrently(
+        lambda: get_object_or_404(Group, slug=slug),
+        lambda: get_paginator_posts(
+            request,
+            Post.objects.select_related('author', 'group')
+                        .filter(group__slug=slug)
+        ),
     )
     context = {
         'group': group,
-        'page_obj': get_paginator_posts(
-            request,
-            group.posts.select_related('author')
-        ),
+        'page_obj': page_obj,
     }
     return render(request, 'posts/group_list.html', context)
 
 
+@cache_page_by_generation(lambda username: [author_scope(username)])
 def profile(request, username):
-    author = get_object_or_404(
-        User.objects.select_related(),
-        username=username
+    author, page_obj = run_concurrently(
+        lambda: get_object_or_404(
+            User.objects.select_related('profile'),
+            username=username
+        ),
+        lambda: get_paginator_posts(
+            request,
+            Post.objects.select_related('author', 'group')
+                        .filter(author__username=username),
+        ),
     )
-    following = (request.user.is_authenticated
-                 and author.following.filter(user=request.user))
     context = {
         'author': author,
-        'following': following,
-        'page_obj': get_paginator_posts(
-            request,
-            author.posts.select_related('group'),
-        ),
+        'page_obj': page_obj,
     }
     return render(request, 'posts/profile.html', context)
 
 
+@cache_page_by_generation(post_scopes)
 def post_detail(request, post_id):
-    post = get_object_or_404(
-        Post.objects.select_related('author', 'group'),
-        id=post_id
+    post, comments = run_concurrently(
+        lambda: get_object_or_404(
+            Post.objects.select_related('author__profile', 'group'),
+            id=post_id
+        ),
+        lambda: get_comments_page(request, post_id),
     )
-    form = CommentForm(request.POST or None)
-    comments = (Comment.objects
-                       .select_related('post', 'author')
-                       .filter(post_id=post.id))
     context = {
         'post': post,
-        'form': form,
         'comments': comments,
     }
     return render(request, 'posts/post_detail.html', context)
 
 
+def post_comments(request, post_id):
+    """Следующая страница комментариев для подгрузки на странице поста:
+    HTML-фрагмент или JSON при ?format=json."""
+    comments = get_comments_page(request, post_id)
+    if request.GET.get('format') == 'json':
+        return JsonResponse(
+            {
+                'comments': [
+                    {
+                        'id': comment.id,
+                        'author': comment.author.username,
+                        'text': comment.text,
+                        'created': comment.created.isoformat(),
+                    }
+                    for comment in comments
+                ],
+                'next_cursor': comments.next_cursor,
+            },
+            json_dumps_params={'ensure_ascii': False},
+        )
+    context = {
+        'post_id': post_id,
+        'comments': comments,
+    }
+    return render(request, 'includes/comments.html', context)
+
+
 @login_required
 def post_create(request):
     form = PostForm(request.POST or None, files=request.FILES or None,)
@@ -115,48 +166,81 @@ def add_comment(request, post_id):
     )
     form = CommentForm(request.POST or None)
     if form.is_valid():
-        comment = form.save(commit=False)
-        comment.author = request.user
-        comment.post = post
-        comment.save()
+        write_queue.add_comment(request.user, post, form.cleaned_data['text'])
     return redirect('posts:post_detail', post_id=post_id)
 
 
 @login_required
 def follow_index(request):
     context = {
-        'page_obj': get_paginator_posts(
-            request,
-            Post.objects.select_related('author', 'group').filter(
-                author_id__in=Follow.objects.filter(user=request.user)
-                                    .values_list('author', flat=True))
-        ),
+        'page_obj': get_feed_page(request, request.user),
     }
     return render(request, 'posts/follow.html', context)
 
 
 @login_required
+@primary_db
 def profile_follow(request, username):
     author = get_object_or_404(
         User.objects.select_related(),
         username=username
     )
     if author != request.user:
-        Follow.objects.get_or_create(
-            user=request.user,
-            author=author,
-        )
+        write_queue.follow(request.user, author)
     return redirect('posts:profile', username=username)
 
 
 @login_required
+@primary_db
 def profile_unfollow(request, username):
     author = get_object_or_404(
         User.objects.select_related(),
         username=username
     )
-    Follow.objects.filter(
-        user=request.user,
-        author=author,
-    ).delete()
+    write_queue.unfollow(request.user, author)
     return redirect('posts:profile', username=username)
+
+
+def search(request):
+    query = request.GET.get('q', '').strip()
+    hits, next_cursor = find(query, request.GET.get('cursor'))
+    context = {
+        'query': query,
+        'hits': hits,
+        'next_cursor': next_cursor,
+    }
+    return render(request, 'posts/search.html', context)
+
+
+def search_hit_as_dict(hit):
+    if hit.kind == 'group':
+        return {
+            'kind': hit.kind,
+            'id': hit.object.id,
+            'score': hit.score,
+            'title': hit.object.title,
+            'description': hit.object.description,
+            'url': reverse('posts:group_list', args=[hit.object.slug]),
+        }
+    post_id = hit.object.id if hit.kind == 'post' else hit.object.post_id
+    return {
+        'kind': hit.kind,
+        'id': hit.object.id,
+        'score': hit.score,
+        'text': hit.object.text,
+        'author': hit.object.author.username,
+        'url': reverse('posts:post_detail', args=[post_id]),
+    }
+
+
+def search_api(request):
+    query = request.GET.get('q', '').strip()
+    hits, next_cursor = find(query, request.GET.get('cursor'))
+    return JsonResponse(
+        {
+            'query': query,
+            'results': [search_hit_as_dict(hit) for hit in hits],
+            'next_cursor': next_cursor,
+        },
+        json_dumps_params={'ensure_ascii': False},
+    )
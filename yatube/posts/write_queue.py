@@ -0,0 +1,374 @@
+"""Отложенная запись подписок, отписок и комментариев пачками.
+
+Во время всплесков (вирусный пост) каждая подписка и каждый
+комментарий - отдельная транзакция. С POSTS_WRITE_QUEUE_BROKER запросы
+только кладут операцию в очередь, а разборщик применяет накопленное
+одной транзакцией раз в POSTS_WRITE_QUEUE_INTERVAL_MS или по
+POSTS_WRITE_QUEUE_BATCH_SIZE операций. Подписка и отписка одной пары
+в пачке схлопываются в последнюю, счётчики сдвигаются одним UPDATE
+на строку (signals.batched).
+
+Брокеры:
+    'inprocess' - очередь в памяти процесса сайта и фоновый поток;
+    'spool' - файлы в каталоге POSTS_WRITE_QUEUE_SPOOL_DIR, разбирает
+    команда process_write_queue. Это локальная замена внешнего брокера
+    (Redis, RabbitMQ): подключается любой класс с методами put, take
+    и ack по пути в POSTS_WRITE_QUEUE_BROKER.
+Без брокера операции выполняются сразу, как раньше.
+
+Пока операция в очереди, её автор видит её как выполненную: операции
+лежат в кэше (pending_ops), набор подписок и комментарии поста
+подмешивают их при чтении.
+"""
+import json
+import logging
+import os
+import queue
+import threading
+import time
+import uuid
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections, transaction
+from django.db.models import Q
+from django.utils.module_loading import import_string
+
+from . import page_cache, search, signals
+from .models import Comment, Follow, Post, User
+
+FOLLOW = 'follow'
+UNFOLLOW = 'unfollow'
+COMMENT = 'comment'
+PENDING_LOCK_TIMEOUT = 5
+
+logger = logging.getLogger(__name__)
+
+
+def make_op(kind, user_id, target_id, text=''):
+    """Операция очереди: target - автор для подписок, пост для
+    комментария."""
+    return {'id': uuid.uuid4().hex, 'kind': kind, 'user': user_id,
+            'target': target_id, 'text': text, 'time': time.time()}
+
+
+def _collapse_follows(ops):
+    """{(подписчик, автор): нужна ли подписка} по последней операции."""
+    wanted = {}
+    for op in ops:
+        if op['kind'] in (FOLLOW, UNFOLLOW) and op['user'] != op['target']:
+            wanted[op['user'], op['target']] = op['kind'] == FOLLOW
+    return wanted
+
+
+def _pairs_filter(pairs):
+    query = Q()
+    for user_id, author_id in pairs:
+        query |= Q(user_id=user_id, author_id=author_id)
+    return query
+
+
+def _fill_comment_ids(comments):
+    """SQLite не возвращает ключи строк из bulk_create: они находятся
+    по посту, автору и времени создания, совпавшие - по порядку
+    вставки."""
+    rows = (Comment.objects.filter(created__in={comment.created
+                                                for comment in comments})
+                           .order_by('id')
+                           .values_list('id', 'post_id', 'author_id',
+                                        'created'))
+    ids = defaultdict(list)
+    for pk, *key in rows:
+        ids[tuple(key)].append(pk)
+    for comment in comments:
+        comment.pk = ids[
+            comment.post_id, comment.author_id, comment.created].pop(0)
+
+
+def apply_batch(ops):
+    """Применяет операции одной транзакцией. Операции с удалёнными
+    пользователями и постами пропускаются. Новые подписки
+    и комментарии вставляются bulk_create, который не шлёт post_save,
+    поэтому их последствия передаются пачке (signals.batched) здесь."""
+    wanted = _collapse_follows(ops)
+    comments = [op for op in ops if op['kind'] == COMMENT]
+    user_ids = {op['user'] for op in ops} | {author for _, author in wanted}
+    with transaction.atomic(), signals.batched() as batch:
+        users = set(User.objects.filter(id__in=user_ids)
+                                .values_list('id', flat=True))
+        posts = set(Post.objects.filter(
+            id__in={op['target'] for op in comments}
+        ).values_list('id', flat=True))
+        wanted = {pair: follow for pair, follow in wanted.items()
+                  if set(pair) <= users}
+        existing = set()
+        if wanted:
+            existing = set(Follow.objects.filter(_pairs_filter(wanted))
+                                         .values_list('user_id', 'author_id'))
+        added = Follow.objects.bulk_create(
+            [Follow(user_id=user_id, author_id=author_id)
+             for (user_id, author_id), follow in wanted.items()
+             if follow and (user_id, author_id) not in existing]
+        )
+        for follow in added:
+            batch.add_follow(follow, 1)
+        removed = [pair for pair, follow in wanted.items()
+                   if not follow and pair in existing]
+        if removed:
+            Follow.objects.filter(_pairs_filter(removed)).delete()
+        added = Comment.objects.bulk_create(
+            [Comment(post_id=op['target'], author_id=op['user'],
+                     text=op['text'])
+             for op in comments
+             if op['user'] in users and op['target'] in posts]
+        )
+        if added and added[0].pk is None:
+            _fill_comment_ids(added)
+        for comment in added:
+            batch.add_comment(comment)
+            search.index_object(comment)
+    forget_pending(ops)
+
+
+def apply_ops(ops):
+    """apply_batch с откатом на поштучное применение: ошибка одной
+    операции не теряет всю пачку."""
+    try:
+        apply_batch(ops)
+    except Exception:
+        logger.exception('Пачка из %s операций не применилась', len(ops))
+        for op in ops:
+            try:
+                apply_batch([op])
+            except Exception:
+                logger.exception('Операция %s не применилась', op)
+                forget_pending([op])
+
+
+def _pending_key(user_id):
+    return f'write_queue:pending:{user_id}'
+
+
+class _PendingLock:
+    """Блокировка списка операций пользователя в кэше: список
+    меняют и запросы, и разборщик."""
+
+    def __init__(self, user_id):
+        self.key = f'{_pending_key(user_id)}:lock'
+
+    def __enter__(self):
+        for _ in range(100):
+            if cache.add(self.key, True, PENDING_LOCK_TIMEOUT):
+                return self
+            time.sleep(0.005)
+        # Блокировку держат слишком долго: лучше изредка потерять
+        # отметку, чем подвесить запрос.
+        return self
+
+    def __exit__(self, *exc_info):
+        cache.delete(self.key)
+
+
+def pending_ops(user_id):
+    """Операции пользователя, ещё не применённые разборщиком."""
+    if not settings.POSTS_WRITE_QUEUE_BROKER or user_id is None:
+        return []
+    return list(cache.get(_pending_key(user_id), {}).values())
+
+
+def remember_pending(op):
+    key = _pending_key(op['user'])
+    with _PendingLock(op['user']):
+        pending = cache.get(key, {})
+        pending[op['id']] = op
+        cache.set(key, pending, settings.POSTS_WRITE_QUEUE_PENDING_TIMEOUT)
+
+
+def forget_pending(ops):
+    by_user = {}
+    for op in ops:
+        by_user.setdefault(op['user'], []).append(op['id'])
+    for user_id, ids in by_user.items():
+        key = _pending_key(user_id)
+        with _PendingLock(user_id):
+            pending = cache.get(key)
+            if pending is None:
+                continue
+            for op_id in ids:
+                pending.pop(op_id, None)
+            if pending:
+                cache.set(key, pending,
+                          settings.POSTS_WRITE_QUEUE_PENDING_TIMEOUT)
+            else:
+                cache.delete(key)
+
+
+def pending_follows(user_id):
+    """{автор: подписан ли} по операциям в очереди, по порядку."""
+    ops = sorted(pending_ops(user_id), key=lambda op: op['time'])
+    return {author: follow
+            for (_, author), follow in _collapse_follows(ops).items()}
+
+
+def pending_comments(user_id, post_id):
+    """Комментарии пользователя к посту, ещё лежащие в очереди,
+    от новых к старым."""
+    return sorted(
+        (op for op in pending_ops(user_id)
+         if op['kind'] == COMMENT and op['target'] == post_id),
+        key=lambda op: op['time'], reverse=True,
+    )
+
+
+class InProcessBroker:
+    """Очередь в памяти процесса сайта; пачки применяет фоновый поток.
+    При падении процесса неприменённые операции теряются."""
+
+    def __init__(self, start_worker=True):
+        self.queue = queue.Queue()
+        self.start_worker = start_worker
+        self.worker = None
+        self.lock = threading.Lock()
+
+    def put(self, op):
+        if self.start_worker and self.worker is None:
+            with self.lock:
+                if self.worker is None:
+                    self.worker = threading.Thread(
+                        target=self.run, name='posts-write-queue',
+                        daemon=True)
+                    self.worker.start()
+        self.queue.put(op)
+
+    def take(self, max_items, timeout):
+        """Ждёт первую операцию до timeout секунд, потом добирает
+        пачку до max_items, пока не выйдет то же время."""
+        try:
+            ops = [self.queue.get(timeout=timeout)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + timeout
+        while len(ops) < max_items:
+            left = deadline - time.monotonic()
+            if left <= 0:
+                break
+            try:
+                ops.append(self.queue.get(timeout=left))
+            except queue.Empty:
+                break
+        return ops
+
+    def ack(self, ops):
+        pass
+
+    def run(self):
+        while True:
+            process_once(self)
+
+
+class SpoolBroker:
+    """Очередь из файлов: каждая операция - отдельный JSON-файл,
+    записанный через временный файл. Разборщик (один!) берёт самые
+    старые файлы и удаляет их после применения."""
+
+    def __init__(self, directory=None):
+        self.directory = directory or settings.POSTS_WRITE_QUEUE_SPOOL_DIR
+        os.makedirs(self.directory, exist_ok=True)
+
+    def put(self, op):
+        name = f'{time.time_ns():020d}-{op["id"]}.json'
+        temporary = os.path.join(self.directory, f'.{name}.tmp')
+        with open(temporary, 'w') as stream:
+            json.dump(op, stream, ensure_ascii=False)
+        os.replace(temporary, os.path.join(self.directory, name))
+
+    def _names(self):
+        return sorted(name for name in os.listdir(self.directory)
+                      if name.endswith('.json'))
+
+    def take(self, max_items, timeout):
+        deadline = time.monotonic() + timeout
+        names = self._names()
+        while len(names) < max_items and time.monotonic() < deadline:
+            time.sleep(min(0.01, timeout))
+            names = self._names()
+        ops = []
+        for name in names[:max_items]:
+            with open(os.path.join(self.directory, name)) as stream:
+                op = json.load(stream)
+            op['spool_name'] = name
+            ops.append(op)
+        return ops
+
+    def ack(self, ops):
+        for op in ops:
+            os.remove(os.path.join(self.directory, op['spool_name']))
+
+
+BROKERS = {
+    'inprocess': InProcessBroker,
+    'spool': SpoolBroker,
+}
+
+
+_brokers = {}
+_brokers_lock = threading.Lock()
+
+
+def get_broker():
+    """Брокер из POSTS_WRITE_QUEUE_BROKER, один на процесс; None,
+    если очередь выключена."""
+    name = settings.POSTS_WRITE_QUEUE_BROKER
+    if not name:
+        return None
+    with _brokers_lock:
+        if name not in _brokers:
+            _brokers[name] = (BROKERS.get(name) or import_string(name))()
+        return _brokers[name]
+
+
+def process_once(broker):
+    """Берёт и применяет одну пачку. Возвращает число операций."""
+    ops = broker.take(settings.POSTS_WRITE_QUEUE_BATCH_SIZE,
+                      settings.POSTS_WRITE_QUEUE_INTERVAL_MS / 1000)
+    if not ops:
+        return 0
+    try:
+        apply_ops(ops)
+        broker.ack(ops)
+    finally:
+        close_old_connections()
+    return len(ops)
+
+
+def submit(op):
+    """Ставит операцию в очередь. Возвращает False, если очередь
+    выключена и операцию надо выполнить сразу."""
+    broker = get_broker()
+    if broker is None:
+        return False
+    remember_pending(op)
+    broker.put(op)
+    # Закэшированные страницы автора операции должны показать её сразу.
+    page_cache.bump(page_cache.viewer_scope(op['user']))
+    return True
+
+
+def follow(user, author):
+    """Возвращает подписку или None, если она ушла в очередь."""
+    if not submit(make_op(FOLLOW, user.id, author.id)):
+        return Follow.objects.get_or_create(user=user, author=author)[0]
+    return None
+
+
+def unfollow(user, author):
+    if not submit(make_op(UNFOLLOW, user.id, author.id)):
+        Follow.objects.filter(user=user, author=author).delete()
+
+
+def add_comment(user, post, text):
+    """Возвращает комментарий или None, если он ушёл в очередь."""
+    if not submit(make_op(COMMENT, user.id, post.id, text)):
+        return Comment.objects.create(post=post, author=user, text=text)
+    return None
@@ -0,0 +1,15 @@
+// Кнопка "Показать ещё" подгружает следующую страницу комментариев
+// фрагментом и встаёт на своё место уже с новым курсором.
+document.addEventListener('click', function (event) {
+  var link = event.target.closest('[data-more-comments]');
+  if (!link) {
+    return;
+  }
+  event.preventDefault();
+  fetch(link.dataset.moreComments)
+    .then(function (response) { return response.text(); })
+    .then(function (html) {
+      link.insertAdjacentHTML('afterend', html);
+      link.remove();
+    });
+});
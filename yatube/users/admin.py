@@ -0,0 +1,13 @@
+from django.contrib import admin
+
+from .models import Profile
+
+
+class ProfileAdmin(admin.ModelAdmin):
+    list_display = ('pk', 'user', 'posts_count',
+                    'followers_count', 'following_count')
+    search_fields = ('user__username', )
+    readonly_fields = ('posts_count', 'followers_count', 'following_count')
+
+
+admin.site.register(Profile, ProfileAdmin)
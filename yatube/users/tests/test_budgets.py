@@ -0,0 +1,55 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from core.budgets import Budget, url_names
+from users import urls
+
+User = get_user_model()
+
+# Бюджеты страниц: SQL-запросов, мс на SQL, мс на отрисовку.
+BUDGETS = {
+    'users:signup': (2, 50, 300),
+    'users:login': (2, 50, 300),
+    'users:logout': (4, 50, 300),
+    'users:password_change': (2, 50, 300),
+    'users:password_change_done': (2, 50, 300),
+    'users:password_reset': (2, 50, 300),
+    'users:password_reset_done': (2, 50, 300),
+    'users:password_reset_confirm': (3, 50, 300),
+    'users:password_reset_complete': (2, 50, 300),
+}
+
+
+class UsersBudgetTests(TestCase):
+    """Каждая страница пользователей укладывается в свой бюджет."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.user)
+        cache.clear()
+
+    def test_every_url_has_budget(self):
+        """Для каждого адреса users.urls объявлен бюджет."""
+        self.assertEqual(set(BUDGETS), url_names(urls))
+
+    def test_pages_fit_budgets(self):
+        """Страницы не выходят за бюджет запросов и времени.
+        Выход - последним: после него клиент не авторизован."""
+        kwargs = {
+            'users:password_reset_confirm': {
+                'uidb64': 'MQ', 'token': 'set-password'},
+        }
+        names = sorted(BUDGETS, key=lambda name: name == 'users:logout')
+        for name in names:
+            with self.subTest(view=name):
+                url = reverse(name, kwargs=kwargs.get(name))
+                with Budget(name, *BUDGETS[name]):
+                    response = self.client.get(url)
+                self.assertLess(response.status_code, 400)
@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/2.2/ref/settings/
 """
 
 import os
+import sys
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -55,11 +56,14 @@ INSTALLED_APPS = [
     'users.apps.UsersConfig',
     'core.apps.CoreConfig',
     'about.apps.AboutConfig',
+    'api.apps.ApiConfig',
     'sorl.thumbnail',
 #    'debug_toolbar',
 ]
 
 MIDDLEWARE = [
+    'core.middleware.MetricsMiddleware',
+    'core.routers.ReplicaMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -95,13 +99,56 @@ WSGI_APPLICATION = 'yatube.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/2.2/ref/settings/#databases
 
+# PRAGMA для каждого соединения с SQLite (core.sqlite): WAL - чтение
+# не ждёт записи, synchronous=normal - без fsync на каждый коммит
+# (в WAL это безопасно для целостности), busy_timeout - ждать
+# блокировку до 5 с, а не падать; mmap и cache_size ускоряют чтение.
+SQLITE_PRAGMAS = {
+    'journal_mode': 'wal',
+    'synchronous': 'normal',
+    'busy_timeout': 5000,
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -64 * 1024,  # в КиБ
+    'temp_store': 'memory',
+}
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        # Соединение живёт между запросами, а не открывается на каждый.
+        'CONN_MAX_AGE': int(os.environ.get('YATUBE_DB_CONN_MAX_AGE', 60)),
+        'PRAGMAS': SQLITE_PRAGMAS,
     }
 }
 
+# Реплики только для чтения (core.routers): пути к копиям базы SQLite
+# через запятую в YATUBE_DB_REPLICAS, например файлы, которые
+# обновляет команда sync_replicas. Без реплик всё идёт в default.
+DATABASE_REPLICAS = []
+for number, path in enumerate(
+    filter(None, os.environ.get('YATUBE_DB_REPLICAS', '').split(',')),
+    start=1,
+):
+    DATABASES[f'replica_{number}'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': f'file:{path}?mode=ro',
+        'CONN_MAX_AGE': DATABASES['default']['CONN_MAX_AGE'],
+        # Режим журнала и синхронизацию задаёт тот, кто пишет.
+        'PRAGMAS': {
+            name: value for name, value in SQLITE_PRAGMAS.items()
+            if name not in ('journal_mode', 'synchronous')
+        },
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(f'replica_{number}')
+
+DATABASE_ROUTERS = ['core.routers.ReplicaRouter']
+
+# После записи пользователь столько секунд читает из основной базы.
+REPLICA_STICKY_COOKIE = 'db_primary'
+REPLICA_STICKY_SECONDS = 10
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
@@ -157,11 +204,35 @@ LOGIN_REDIRECT_URL = 'posts:index'
 
 CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
 
-CACHES = {
-    'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+# Без YATUBE_CACHE_BACKEND у каждого процесса свой кэш в памяти.
+# В продакшене задаётся общий для всех процессов бэкенд, например
+# django.core.cache.backends.memcached.PyLibMCCache,
+# django_redis.cache.RedisCache или
+# django.core.cache.backends.filebased.FileBasedCache,
+# и адрес YATUBE_CACHE_LOCATION; перед ним ставится локальный LRU.
+CACHE_SHARED_BACKEND = os.environ.get('YATUBE_CACHE_BACKEND')
+
+if CACHE_SHARED_BACKEND:
+    CACHES = {
+        'default': {
+            'BACKEND': 'core.cache.TieredCache',
+            'OPTIONS': {
+                'SHARED': {
+                    'BACKEND': CACHE_SHARED_BACKEND,
+                    'LOCATION': os.environ.get('YATUBE_CACHE_LOCATION', ''),
+                },
+                'LOCAL_MAX_ENTRIES': 1000,
+                'LOCAL_TIMEOUT': 2,
+                'COMPRESS_MIN_LENGTH': 1024,
+            },
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
     }
-}
 
 LOGGING = {
     'version': 1,
@@ -178,9 +249,103 @@ LOGGING = {
         }
     },
     'loggers': {
+        # Каждый SQL-запрос в консоль - только по YATUBE_LOG_SQL:
+        # это дорого, а для цифр есть /internal/metrics/.
         'django.db.backends': {
-            'level': 'DEBUG',
+            'level': 'DEBUG' if os.environ.get('YATUBE_LOG_SQL') else 'INFO',
             'handlers': ['console'],
         }
     }
 }
+
+# Лента подписок раскладывается подписчикам при публикации поста.
+# Посты авторов, у которых подписчиков не меньше этого порога,
+# в ленту не раскладываются и подмешиваются при чтении.
+FEED_CELEBRITY_FOLLOWERS = 1000
+FEED_BATCH_SIZE = 500
+
+# Сколько живёт в кэше отрендеренная карточка поста.
+POST_CARD_CACHE_TIMEOUT = 60 * 60
+
+# Сколько живёт в кэше набор подписок пользователя (posts.follows).
+FOLLOW_SET_CACHE_TIMEOUT = 60 * 60
+
+# Страницы постов живут в кэше, пока не сдвинется поколение
+# их области (см. posts.page_cache); блокировка не даёт нескольким
+# процессам одновременно перестраивать одну и ту же страницу.
+# Без общего кэша у каждого процесса свои поколения и копии страниц
+# и сдвиг в одном процессе не виден остальным: тогда и страницы,
+# и поколения живут 20 секунд, как при прежнем cache_page.
+PAGE_CACHE_TIMEOUT = 60 * 60 * 24 if CACHE_SHARED_BACKEND else 20
+PAGE_GENERATION_TIMEOUT = None if CACHE_SHARED_BACKEND else 20
+PAGE_CACHE_LOCK_TIMEOUT = 10
+# Сколько секунд общие кэши (CDN, обратный прокси) могут отдавать
+# гостевую страницу без перепроверки; браузеры перепроверяют всегда
+# и получают 304, пока поколения областей страницы не сдвинулись.
+PAGE_SHARED_MAX_AGE = int(os.environ.get('YATUBE_PAGE_SHARED_MAX_AGE', 30))
+
+# Размер пула потоков для независимых запросов одной страницы
+# (posts.concurrency). 0 - запросы выполняются последовательно.
+POSTS_LOOKUP_WORKERS = int(os.environ.get('YATUBE_LOOKUP_WORKERS', 0))
+
+# Миниатюры картинок постов делаются заранее, при сохранении поста
+# (posts.thumbnails), в пуле из POSTS_THUMBNAIL_WORKERS процессов,
+# вне запроса. 0 - миниатюры делаются сразу в процессе запроса: до
+# 12 кодирований на сохранение, поэтому так только под тестами.
+# Каждый вариант нарезается в ширинах widths с пропорциями geometry и в
+# форматах formats (avif - если его умеет Pillow); sizes - подсказка
+# браузеру, какой ширины будет картинка на странице.
+POST_IMAGE_RENDITIONS = {
+    'card': {
+        'geometry': '960x339',
+        'upscale': True,
+        'widths': (320, 480, 640, 960),
+        'formats': ('avif', 'webp', 'jpeg'),
+        'sizes': '(max-width: 1000px) 100vw, 960px',
+    },
+}
+POST_IMAGE_QUALITY = {'avif': 50, 'webp': 75, 'jpeg': 80}
+TESTING = sys.argv[1:2] == ['test'] or 'pytest' in sys.modules
+POSTS_THUMBNAIL_WORKERS = int(os.environ.get('YATUBE_THUMBNAIL_WORKERS',
+                                             0 if TESTING else 2))
+
+# Метрики запросов (core.metrics): доля запросов с подробными
+# замерами, адреса, с которых доступен /internal/metrics/, и токен,
+# который Prometheus передаёт в Authorization: Bearer (bearer_token).
+# Без токена страница метрик выключена.
+METRICS_SAMPLE_RATE = float(os.environ.get('YATUBE_METRICS_SAMPLE_RATE',
+                                           0.05))
+METRICS_ALLOWED_IPS = ['127.0.0.1', '::1']
+METRICS_TOKEN = os.environ.get('YATUBE_METRICS_TOKEN', '')
+
+# Очередь записи подписок и комментариев (posts.write_queue):
+# '' - писать сразу, 'inprocess' - очередь в памяти процесса,
+# 'spool' - файлы в POSTS_WRITE_QUEUE_SPOOL_DIR для команды
+# process_write_queue, или путь к классу внешнего брокера.
+POSTS_WRITE_QUEUE_BROKER = os.environ.get('YATUBE_WRITE_QUEUE', '')
+POSTS_WRITE_QUEUE_BATCH_SIZE = 200
+POSTS_WRITE_QUEUE_INTERVAL_MS = 50
+POSTS_WRITE_QUEUE_SPOOL_DIR = os.path.join(BASE_DIR, 'write_queue')
+# Сколько операция из очереди видна её автору, если разборщик
+# так её и не применил.
+POSTS_WRITE_QUEUE_PENDING_TIMEOUT = 10 * 60
+
+# Поиск по постам, комментариям и группам (posts.search): 'fts5' -
+# таблица SQLite FTS5, 'inverted' - обратный индекс в SearchPosting,
+# 'auto' - FTS5, если она есть в базе.
+POSTS_SEARCH_BACKEND = os.environ.get('YATUBE_SEARCH_BACKEND', 'auto')
+
+# Статистика групп (posts.group_stats): окно в часах, размер списка
+# популярных групп, сколько секунд итоги окна живут в кэше и сколько
+# часов хранятся корзины (их чистит команда rebuild_group_stats).
+GROUP_STATS_WINDOW_HOURS = 24
+GROUP_TRENDING_SIZE = 5
+GROUP_STATS_CACHE_TIMEOUT = 60
+GROUP_STATS_RETENTION_HOURS = 24 * 7
+
+# Горячая лента (posts.hot): период полураспада рейтинга, как часто
+# его гасит команда decay_hot_scores и ниже какого значения рейтинг
+# обнуляется.
+HOT_HALF_LIFE_HOURS = 12
+HOT_DECAY_INTERVAL_MINUTES = 60
+HOT_SCORE_FLOOR = 0.01